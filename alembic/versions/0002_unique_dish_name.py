@@ -0,0 +1,17 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0002_unique_dish_name"
+down_revision = "0001_init"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Bulk ingest merges with INSERT ... ON CONFLICT (lower(name)), which needs a unique
+    # index on that expression. Existing duplicate names must be merged before upgrading.
+    op.execute("DROP INDEX IF EXISTS ix_dishes_name_lower")
+    op.execute("CREATE UNIQUE INDEX ux_dishes_name_lower ON dishes (lower(name))")
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ux_dishes_name_lower")
+    op.execute("CREATE INDEX ix_dishes_name_lower ON dishes (lower(name))")
@@ -0,0 +1,23 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0003_catalog_state"
+down_revision = "0002_unique_dish_name"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Single-row catalog version. Writers (ingest_seed, embed_dishes) bump it after each
+    # commit that changes dishes, nutrients or vectors; the API polls it to drop cached labels.
+    op.create_table(
+        "catalog_state",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("version", sa.BigInteger, nullable=False, server_default=sa.text("0")),
+        sa.Column("updated_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.CheckConstraint("id = 1", name="ck_catalog_state_single_row"),
+    )
+    op.execute("INSERT INTO catalog_state (id, version) VALUES (1, 0)")
+
+def downgrade():
+    op.drop_table("catalog_state")
@@ -0,0 +1,20 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0004_name_search_indexes"
+down_revision = "0003_catalog_state"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Exact alias matches are written as aliases @> ARRAY[name], which a GIN index on the
+    # array serves; ANY(aliases) cannot use an index. Trigram GIN on lower(name) serves
+    # the typo-tolerant % / similarity() lookups used when the in-process lexical index
+    # is unavailable.
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_dishes_aliases_gin ON dishes USING gin (aliases)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_dishes_name_trgm ON dishes USING gin (lower(name) gin_trgm_ops)")
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_dishes_name_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_dishes_aliases_gin")
@@ -0,0 +1,29 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0005_compact_embeddings"
+down_revision = "0004_name_search_indexes"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Compact copies of embeddings.vector for the first-pass search (EMBEDDING_PRECISION):
+    # halfvec is half the size, bit(384) a 32nd. The float32 column stays for re-ranking.
+    # Columns are filled by embed_dishes (--requantize for existing vectors). Needs
+    # pgvector >= 0.7.
+    op.execute("ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS vector_half halfvec(384)")
+    op.execute("ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS vector_bits bit(384)")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_embeddings_vector_half ON embeddings "
+        "USING hnsw (vector_half halfvec_cosine_ops)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_embeddings_vector_bits ON embeddings "
+        "USING hnsw (vector_bits bit_hamming_ops)"
+    )
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_embeddings_vector_bits")
+    op.execute("DROP INDEX IF EXISTS ix_embeddings_vector_half")
+    op.execute("ALTER TABLE embeddings DROP COLUMN IF EXISTS vector_bits")
+    op.execute("ALTER TABLE embeddings DROP COLUMN IF EXISTS vector_half")
@@ -0,0 +1,22 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0006_hnsw_cosine_index"
+down_revision = "0005_compact_embeddings"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 0001 built ivfflat with vector_l2_ops and lists=100 on an empty table: untrained
+    # centroids, and an operator class the cosine (<=>) queries cannot use. HNSW needs no
+    # training, so it is correct from the first insert. To switch to ivfflat or rebuild
+    # after a bulk ingest, use scripts/ann_index.py.
+    op.execute("DROP INDEX IF EXISTS ix_embeddings_vector")
+    op.execute(
+        "CREATE INDEX ix_embeddings_vector ON embeddings "
+        "USING hnsw (vector vector_cosine_ops) WITH (m = 16, ef_construction = 64)"
+    )
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_embeddings_vector")
+    op.execute("CREATE INDEX ix_embeddings_vector ON embeddings USING ivfflat (vector vector_l2_ops) WITH (lists=100)")
@@ -0,0 +1,98 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0007_catalog_changes"
+down_revision = "0006_hnsw_cosine_index"
+branch_labels = None
+depends_on = None
+
+# table -> columns whose changes matter to the API; other columns (notes, source,
+# the compact vector copies) can change without invalidating anything
+WATCHED = {
+    "dishes": ("name", "cuisine", "aliases", "macro_priors"),
+    "nutrients": ("kcal", "protein_g", "carbs_g", "fat_g", "fiber_g", "sugar_g", "sodium_mg"),
+    "embeddings": ("vector",),
+}
+
+# keep in step with app.db.models.CATALOG_CHANGE_RETENTION
+RETENTION = 1000
+
+RECORD = """
+CREATE FUNCTION catalog_changes_{table}() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    v bigint;
+BEGIN
+    -- the row lock holds catalog writers back until this one commits, so every change
+    -- recorded here belongs to the version its BUMP_CATALOG_VERSION publishes
+    SELECT version + 1 INTO v FROM catalog_state WHERE id = 1 FOR UPDATE;
+    IF TG_OP = 'TRUNCATE' THEN
+        INSERT INTO catalog_changes (version, dish_id, source, op) VALUES (v, NULL, TG_TABLE_NAME, 'T');
+    ELSIF TG_OP = 'INSERT' THEN
+        INSERT INTO catalog_changes (version, dish_id, source, op)
+        SELECT v, n.dish_id, TG_TABLE_NAME, 'I' FROM new_rows n;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO catalog_changes (version, dish_id, source, op)
+        SELECT v, o.dish_id, TG_TABLE_NAME, 'D' FROM old_rows o;
+    ELSE
+        INSERT INTO catalog_changes (version, dish_id, source, op)
+        SELECT v, n.dish_id, TG_TABLE_NAME, 'U'
+          FROM new_rows n JOIN old_rows o ON o.dish_id = n.dish_id
+         WHERE ({new_cols}) IS DISTINCT FROM ({old_cols});
+    END IF;
+    RETURN NULL;
+END $$
+"""
+
+NOTIFY = f"""
+CREATE FUNCTION catalog_state_notify() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('catalog_changed', NEW.version::text);
+    DELETE FROM catalog_changes WHERE version <= NEW.version - {RETENTION};
+    RETURN NULL;
+END $$
+"""
+
+
+def upgrade():
+    # Change feed for in-process indexes and caches. Statement triggers on the catalog
+    # tables record which dishes changed, stamped with the version the writer's
+    # BUMP_CATALOG_VERSION will publish; the bump itself NOTIFYs catalog_changed (sent on
+    # commit) and prunes changes older than RETENTION versions. A TRUNCATE is recorded as
+    # a NULL dish_id: everything changed.
+    op.execute("""
+        CREATE TABLE catalog_changes (
+            id bigserial PRIMARY KEY,
+            version bigint NOT NULL,
+            dish_id uuid,
+            source text NOT NULL,
+            op char(1) NOT NULL
+        )
+    """)
+    op.execute("CREATE INDEX ix_catalog_changes_version ON catalog_changes (version)")
+    for table, cols in WATCHED.items():
+        op.execute(RECORD.format(
+            table=table,
+            new_cols=", ".join(f"n.{c}" for c in cols),
+            old_cols=", ".join(f"o.{c}" for c in cols),
+        ))
+        fn = f"catalog_changes_{table}()"
+        op.execute(f"CREATE TRIGGER {table}_changes_insert AFTER INSERT ON {table} "
+                   f"REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION {fn}")
+        op.execute(f"CREATE TRIGGER {table}_changes_update AFTER UPDATE ON {table} "
+                   f"REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION {fn}")
+        op.execute(f"CREATE TRIGGER {table}_changes_delete AFTER DELETE ON {table} "
+                   f"REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION {fn}")
+        op.execute(f"CREATE TRIGGER {table}_changes_truncate AFTER TRUNCATE ON {table} "
+                   f"FOR EACH STATEMENT EXECUTE FUNCTION {fn}")
+    op.execute(NOTIFY)
+    op.execute("CREATE TRIGGER catalog_state_notify AFTER UPDATE OF version ON catalog_state "
+               "FOR EACH ROW EXECUTE FUNCTION catalog_state_notify()")
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS catalog_state_notify ON catalog_state")
+    op.execute("DROP FUNCTION IF EXISTS catalog_state_notify()")
+    for table in WATCHED:
+        for event in ("insert", "update", "delete", "truncate"):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_changes_{event} ON {table}")
+        op.execute(f"DROP FUNCTION IF EXISTS catalog_changes_{table}()")
+    op.execute("DROP TABLE IF EXISTS catalog_changes")
@@ -0,0 +1,61 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0008_dish_style"
+down_revision = "0007_catalog_changes"
+branch_labels = None
+depends_on = None
+
+# 0007's dishes trigger function, watching style as well
+RECORD = """
+CREATE OR REPLACE FUNCTION catalog_changes_dishes() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    v bigint;
+BEGIN
+    SELECT version + 1 INTO v FROM catalog_state WHERE id = 1 FOR UPDATE;
+    IF TG_OP = 'TRUNCATE' THEN
+        INSERT INTO catalog_changes (version, dish_id, source, op) VALUES (v, NULL, TG_TABLE_NAME, 'T');
+    ELSIF TG_OP = 'INSERT' THEN
+        INSERT INTO catalog_changes (version, dish_id, source, op)
+        SELECT v, n.dish_id, TG_TABLE_NAME, 'I' FROM new_rows n;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO catalog_changes (version, dish_id, source, op)
+        SELECT v, o.dish_id, TG_TABLE_NAME, 'D' FROM old_rows o;
+    ELSE
+        INSERT INTO catalog_changes (version, dish_id, source, op)
+        SELECT v, n.dish_id, TG_TABLE_NAME, 'U'
+          FROM new_rows n JOIN old_rows o ON o.dish_id = n.dish_id
+         WHERE ({new_cols}) IS DISTINCT FROM ({old_cols});
+    END IF;
+    RETURN NULL;
+END $$
+"""
+
+
+# partitions.normalize_facet in SQL
+NORMALIZED_CUISINE = r"NULLIF(lower(regexp_replace(btrim(cuisine), '\s+', ' ', 'g')), '')"
+
+
+def _record(cols):
+    return RECORD.format(new_cols=", ".join(f"n.{c}" for c in cols), old_cols=", ".join(f"o.{c}" for c in cols))
+
+
+def upgrade():
+    # Serving style ("restaurant", "home", "street food", ...) next to cuisine, both
+    # filterable by search and labels and both stored as filters compare them
+    # (partitions.normalize_facet: lowercased, single-spaced); existing cuisines are
+    # normalized here. The btree indexes serve the filter on its own and the join of
+    # nearest-neighbour scans back to dishes; an HNSW scan with a selective
+    # filter keeps walking the graph (iterative scans, pgvector >= 0.8, see ann_index)
+    # rather than needing one partial vector index per cuisine.
+    op.execute("ALTER TABLE dishes ADD COLUMN IF NOT EXISTS style text")
+    op.execute(f"UPDATE dishes SET cuisine = {NORMALIZED_CUISINE} WHERE cuisine IS DISTINCT FROM {NORMALIZED_CUISINE}")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_dishes_cuisine_style ON dishes (cuisine, style)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_dishes_style ON dishes (style)")
+    op.execute(_record(("name", "cuisine", "style", "aliases", "macro_priors")))
+
+def downgrade():
+    op.execute(_record(("name", "cuisine", "aliases", "macro_priors")))
+    op.execute("DROP INDEX IF EXISTS ix_dishes_style")
+    op.execute("DROP INDEX IF EXISTS ix_dishes_cuisine_style")
+    op.execute("ALTER TABLE dishes DROP COLUMN IF EXISTS style")
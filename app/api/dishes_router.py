@@ -1,19 +1,50 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List
+import logging
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from app.schemas.label import Candidate
-from app.services.retrieval_service import retrieve_candidates
+from app.services.partitions import search_filter
+from app.services.retrieval_service import asearch_candidates
+from app.services.search_stream import MAX_K, search_stream
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+class NDJSONResponse(StreamingResponse):
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope, receive, send):
+        # StreamingResponse would also wait on receive() for a disconnect, racing the
+        # endpoint for the request body it is still streaming in; a gone client shows up
+        # as an error from the body stream or from send instead
+        await self.stream_response(send)
 
 @router.get("/search", response_model=List[Candidate])
-def search_dishes(q: str = Query(..., min_length=1), k: int = Query(10, ge=1, le=50)):
+async def search_dishes(
+    q: str = Query(..., min_length=1),
+    k: int = Query(10, ge=1, le=50),
+    cuisine: Optional[str] = None,
+    style: Optional[str] = None,
+):
     try:
-        candidates = retrieve_candidates(q, k)
-        # Return just the candidates (first item in each tuple)
-        return [c for c, _ in candidates] if candidates else []
-    except Exception as e:
-        # For development, print more details
-        import traceback
-        traceback.print_exc()
-        # Return empty list instead of error during development
-        return []
+        # search responses carry no nutrients, so skip building them
+        return await asearch_candidates(q, k, search_filter(cuisine, style))
+    except Exception:
+        # an empty 200 would read as "no matching dishes"
+        logger.exception("search failed for %r", q)
+        raise HTTPException(status_code=503, detail="search is unavailable")
+
+@router.post("/search/batch", response_class=NDJSONResponse)
+async def search_dishes_batch(
+    request: Request,
+    k: int = Query(10, ge=1, le=MAX_K),
+    cuisine: Optional[str] = None,
+    style: Optional[str] = None,
+):
+    """NDJSON in, NDJSON out: one query per line, as a JSON string or {"q": ..., "k": ...}.
+
+    Results stream back as each chunk of queries is retrieved, in input order. ``cuisine``
+    and ``style`` filter every line that does not set its own.
+    """
+    return NDJSONResponse(search_stream(request.stream(), k, search_filter(cuisine, style)))
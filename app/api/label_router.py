@@ -1,70 +1,38 @@
+import logging
+from typing import List
 from fastapi import APIRouter, HTTPException
-from app.schemas.label import LabelRequest, LabelResponse, Nutrients, Candidate
-from app.services.retrieval_service import retrieve_candidates
-from app.services.scaling_service import scale_nutrients
-from app.services.mixture_service import blend_candidates
+from app.schemas.label import LabelRequest, LabelResponse
+from app.services.audit_log import audit_labels
+from app.services.label_service import alabel_batch, fallback_response
+from app.utils.metrics import REGISTRY
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+LABEL_ERRORS = REGISTRY.counter("label_errors", "Label requests answered with the error fallback.", labels=("route",))
 
 @router.post("", response_model=LabelResponse)
-def create_label(req: LabelRequest):
+async def create_label(req: LabelRequest):
     try:
-        # For development, create a fallback response when no candidates are found
-        # Use default nutrients as a placeholder
-        fallback_nutrients = Nutrients(
-            calories=req.calories,
-            protein_g=req.calories * 0.05,
-            carbs_g=req.calories * 0.10,
-            fat_g=req.calories * 0.03,
-            fiber_g=req.calories * 0.01,
-            sugar_g=req.calories * 0.02,
-            sodium_mg=req.calories * 1.6
-        )
-        
-        cands = retrieve_candidates(req.dish_name, req.top_k)
-        
-        if not cands:
-            # Use fallback during development
-            fallback_candidate = Candidate(dish_id="fallback", name=req.dish_name, sim=0.5, weight=1.0)
-            return LabelResponse(
-                nutrients=fallback_nutrients,
-                confidence=0.5,
-                assumptions="Fallback response - no matching dishes found.",
-                candidates=[fallback_candidate]
-            )
-            
-        # pick best (first)
-        best_cand, base_nut = cands[0]
-        scaled = scale_nutrients(base_nut, req.calories)
-        blended = blend_candidates(cands if req.use_mixture else [cands[0]])
-        assumptions = "MVP scaling from a canonical profile; values are approximate."
-        confidence = min(1.0, max(0.0, best_cand.sim))  # placeholder
-        return LabelResponse(
-            nutrients=scaled,
-            confidence=confidence,
-            assumptions=assumptions,
-            candidates=blended
-        )
+        # a single label is a batch of one, so both endpoints share the NNLS blend path
+        resp = (await alabel_batch([req]))[0]
     except Exception as e:
-        # Print full stack trace for debugging
-        import traceback
-        traceback.print_exc()
-        
+        logger.exception("label failed for %r", req.dish_name)
+        LABEL_ERRORS.inc(1.0, "/label")
+
         # Return fallback response during development
-        fallback_candidate = Candidate(dish_id="error", name=req.dish_name, sim=0.5, weight=1.0)
-        fallback_nutrients = Nutrients(
-            calories=req.calories,
-            protein_g=req.calories * 0.05,
-            carbs_g=req.calories * 0.10,
-            fat_g=req.calories * 0.03,
-            fiber_g=req.calories * 0.01,
-            sugar_g=req.calories * 0.02,
-            sodium_mg=req.calories * 1.6
-        )
-        
-        return LabelResponse(
-            nutrients=fallback_nutrients,
-            confidence=0.5,
-            assumptions=f"Error processing request: {str(e)}",
-            candidates=[fallback_candidate]
-        )
+        resp = fallback_response(req, "error", f"Error processing request: {str(e)}")
+    await audit_labels([req], [resp])
+    return resp
+
+@router.post("/batch", response_model=List[LabelResponse])
+async def create_labels(reqs: List[LabelRequest]):
+    try:
+        resps = await alabel_batch(reqs)
+    except Exception as e:
+        logger.exception("batch label failed for %d requests", len(reqs))
+        LABEL_ERRORS.inc(1.0, "/label/batch")
+
+        resps = [fallback_response(r, "error", f"Error processing request: {str(e)}") for r in reqs]
+    await audit_labels(reqs, resps)
+    return resps
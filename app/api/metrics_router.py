@@ -0,0 +1,28 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.db.session import pool_status
+from app.services.audit_log import get_audit_logger
+from app.services.label_cache import get_label_cache
+from app.utils.embeddings import get_cache
+from app.utils.metrics import REGISTRY
+
+router = APIRouter()
+
+def _numeric(stats: dict) -> dict:
+    return {(k,): v for k, v in stats.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+
+def _pool_gauge() -> dict:
+    return {(name, state): v for name, s in pool_status().items() for state, v in s.items()}
+
+REGISTRY.gauge("db_pool_connections", "Pool connections by state.", _pool_gauge, labels=("engine", "state"))
+REGISTRY.gauge("embedding_cache", "Query embedding cache counters.", lambda: _numeric(get_cache().stats()), labels=("stat",))
+def _audit_depth() -> dict:
+    audit = get_audit_logger()
+    return {(): audit.depth()} if audit is not None else {}
+
+REGISTRY.gauge("audit_queue_depth", "Audit records waiting to be written.", _audit_depth)
+REGISTRY.gauge("label_cache", "Label cache counters.", lambda: _numeric(get_label_cache().stats()), labels=("stat",))
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
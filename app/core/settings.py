@@ -7,6 +7,106 @@ class Settings(BaseSettings):
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
     TOP_K: int = 5
     SIM_THRESHOLD: float = 0.45
+    # "pgvector" queries Postgres per request; "numpy" searches an in-process snapshot
+    RETRIEVAL_BACKEND: str = "pgvector"
+    VECTOR_INDEX_PATH: str = "data/vector_index"
+    # first-pass search precision: "float32" (exact), or compact "halfvec", "int8" or
+    # "binary" codes whose best RERANK_FACTOR * k rows are re-ranked with float32 vectors;
+    # pgvector supports float32, halfvec and binary (int8 is in-process only)
+    EMBEDDING_PRECISION: str = "float32"
+    RERANK_FACTOR: int = 4
+    # pgvector ANN index (scripts/ann_index.py builds it): per-session ivfflat.probes and
+    # hnsw.ef_search are derived from the target recall unless pinned to a value > 0
+    VECTOR_INDEX_METHOD: str = "hnsw"
+    VECTOR_TARGET_RECALL: float = 0.95
+    VECTOR_IVFFLAT_PROBES: int = 0
+    VECTOR_HNSW_EF_SEARCH: int = 0
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCTION: int = 64
+    # cuisine/style-filtered scans keep walking the index until LIMIT rows pass the
+    # filter (pgvector >= 0.8: relaxed_order, or strict_order on hnsw only; "off"
+    # disables). Without them filtered queries search this many times wider instead.
+    VECTOR_ITERATIVE_SCAN: str = "relaxed_order"
+    VECTOR_FILTER_OVERFETCH: int = 10
+    # micro-batching of query encodes: flush at this many texts or after this wait
+    EMBED_BATCH_MAX_SIZE: int = 32
+    EMBED_BATCH_MAX_WAIT_MS: float = 3.0
+    # query embedding cache: in-process LRU bounded in bytes, backed by a sqlite file
+    # shared by all workers on the host (empty path disables the disk tier)
+    EMBED_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    EMBED_CACHE_PATH: str = "data/embedding_cache.sqlite3"
+    # multi-worker mode: API workers send encodes to `python -m scripts.embedding_server`
+    # on this Unix socket instead of each loading the model (empty = encode in-process)
+    EMBED_SERVER_SOCKET: str = ""
+    EMBED_SERVER_TIMEOUT_S: float = 30.0
+    # encoder runtime for EMBEDDING_MODEL: "torch", "onnx" (ONNX Runtime, needs
+    # sentence-transformers[onnx]; EMBEDDING_ONNX_FILE picks an export inside the model repo,
+    # e.g. onnx/model_qint8_avx512_vnni.onnx) or "int8" (torch dynamic int8 Linear layers, CPU).
+    # EMBED_WARMUP loads and runs it in the background at startup; GET /ready answers 503 until then
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_ONNX_FILE: str = ""
+    EMBED_WARMUP: bool = True
+    # CPU-bound encode work awaited from async routes runs on this many dedicated threads
+    EMBED_EXECUTOR_WORKERS: int = 2
+    # connection pools and psycopg statement cache. Each engine has its own pool: the async
+    # one serves the routes (DB_POOL_SIZE + DB_MAX_OVERFLOW connections at most), the sync one
+    # the catalog watcher and feed, startup and scripts (DB_SYNC_*). Statements are
+    # server-side prepared after DB_PREPARE_THRESHOLD executions and up to DB_PREPARED_MAX of
+    # them are kept per connection. Connections idle for DB_PING_IDLE_S are pinged on
+    # checkout; busy ones are not
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_SYNC_POOL_SIZE: int = 5
+    DB_SYNC_MAX_OVERFLOW: int = 5
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_PREPARE_THRESHOLD: int = 5
+    DB_PREPARED_MAX: int = 100
+    DB_PING_IDLE_S: float = 30.0
+    # catalog_state.version is polled at most this often; in-process derived state (label
+    # cache, lexical index) is dropped or rebuilt when it changes
+    CATALOG_VERSION_CHECK_S: float = 5.0
+    # catalog change feed (migration 0007): in-process indexes and caches apply only the
+    # dishes changed since the version they were built at. LISTEN wakes the watcher on each
+    # commit and polling stays as the fallback. Past CATALOG_DELTA_MAX_ROWS changed dishes
+    # the numpy snapshot is rebuilt instead. With the feed off a numpy snapshot is never
+    # refreshed from the database.
+    CATALOG_FEED: bool = True
+    CATALOG_LISTEN: bool = True
+    CATALOG_DELTA_MAX_ROWS: int = 50_000
+    # label cache: per-kcal blended profiles keyed by (normalized name, top_k, use_mixture);
+    # entries expire after the TTL (0 = never) and are dropped when the catalog version changes
+    LABEL_CACHE_MAX_ENTRIES: int = 50_000
+    LABEL_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    LABEL_CACHE_TTL_S: float = 3600.0
+    # concurrent /label and /dishes/search work for the same key (label cache key, or
+    # normalized query and k) runs once and is shared by every request waiting on it
+    SINGLE_FLIGHT: bool = True
+    # POST /dishes/search/batch: NDJSON queries are retrieved this many at a time; longer
+    # lines are answered with an error instead of being buffered
+    SEARCH_BATCH_CHUNK: int = 256
+    SEARCH_BATCH_MAX_LINE_BYTES: int = 4096
+    # lexical index over names and aliases: exact normalized hits skip the model and the DB;
+    # trigram matches at or above the threshold are fused into vector similarity as
+    # sim + LEXICAL_WEIGHT * trigram_sim * (1 - sim)
+    LEXICAL_INDEX: bool = True
+    LEXICAL_FUZZY_THRESHOLD: float = 0.45
+    LEXICAL_WEIGHT: float = 0.8
+    # write-behind audit log: served labels are queued and COPYed into audit_logs in batches;
+    # a full queue either drops, blocks the request up to AUDIT_BLOCK_TIMEOUT_MS, or spills
+    # records to AUDIT_SPILL_PATH for later replay
+    AUDIT_LOG_ENABLED: bool = True
+    AUDIT_QUEUE_MAX: int = 10_000
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL_MS: float = 200.0
+    AUDIT_QUEUE_FULL_POLICY: str = "spill"
+    AUDIT_BLOCK_TIMEOUT_MS: float = 50.0
+    AUDIT_SPILL_PATH: str = "data/audit_spill.jsonl"
+    # opt-in sampling profiler: requests slower than PROFILE_SLOW_MS (0 = off) dump the
+    # stacks sampled while they ran to PROFILE_DIR as folded stacks for flamegraphs
+    PROFILE_SLOW_MS: float = 0.0
+    PROFILE_INTERVAL_MS: float = 5.0
+    PROFILE_DIR: str = "data/profiles"
     CORS_ORIGINS: List[AnyHttpUrl] = []
 
     class Config:
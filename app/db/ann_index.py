@@ -0,0 +1,202 @@
+# pgvector ANN index parameters: build options from the row count, and query-time
+# probes / ef_search from VECTOR_TARGET_RECALL.
+#
+# ivfflat trains its centroids at build time, so an index built on an empty or much
+# smaller table searches badly; rebuild it (scripts/ann_index.py reindex) after a bulk
+# ingest. HNSW needs no training but costs more memory and build time.
+import logging
+import math
+from typing import Dict, NamedTuple, Optional
+
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+METHODS = ("hnsw", "ivfflat")
+
+# column -> operator class; all cosine except bits, which are compared by Hamming distance
+OPCLASSES = {
+    "vector": "vector_cosine_ops",
+    "vector_half": "halfvec_cosine_ops",
+    "vector_bits": "bit_hamming_ops",
+}
+
+# EMBEDDING_PRECISION -> column its first pass orders by (int8 is numpy-only)
+PRECISION_COLUMNS = {"float32": "vector", "halfvec": "vector_half", "binary": "vector_bits"}
+
+# recall -> (hnsw.ef_search, share of ivfflat lists to probe); rough defaults for 384-d
+# sentence embeddings, interpolated linearly. `scripts/ann_index.py sweep` measures the
+# real curve for a catalog; pin the result with VECTOR_HNSW_EF_SEARCH / VECTOR_IVFFLAT_PROBES.
+RECALL_TABLE = (
+    (0.80, 16, 0.01),
+    (0.90, 32, 0.03),
+    (0.95, 64, 0.06),
+    (0.98, 128, 0.12),
+    (0.99, 200, 0.20),
+    (1.00, 400, 1.00),
+)
+
+INDEX_META_QUERY = """
+    SELECT am.amname, c.reloptions
+      FROM pg_class c
+      JOIN pg_am am ON am.oid = c.relam
+     WHERE c.relname = %s
+"""
+
+PGVECTOR_VERSION_QUERY = "SELECT extversion FROM pg_extension WHERE extname = 'vector'"
+
+# index method -> iterative_scan modes it accepts
+ITERATIVE_SCAN_MODES = {"hnsw": ("relaxed_order", "strict_order"), "ivfflat": ("relaxed_order",)}
+
+
+class AnnParams(NamedTuple):
+    method: Optional[str]  # None when the column has no ANN index
+    lists: int
+    probes: int
+    ef_search: int
+    iterative: bool = False  # filtered scans continue past ef_search / probes
+
+
+def index_name(column: str) -> str:
+    return f"ix_embeddings_{column}"
+
+
+def ivfflat_lists(rows: int) -> int:
+    """pgvector's guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond."""
+    if rows <= 1_000_000:
+        return max(1, rows // 1000)
+    return int(math.sqrt(rows))
+
+
+def _interpolate(recall: float, col: int) -> float:
+    recall = min(max(recall, RECALL_TABLE[0][0]), 1.0)
+    for lo, hi in zip(RECALL_TABLE, RECALL_TABLE[1:]):
+        if recall <= hi[0]:
+            t = (recall - lo[0]) / (hi[0] - lo[0])
+            return lo[col] + t * (hi[col] - lo[col])
+    return RECALL_TABLE[-1][col]
+
+
+def hnsw_ef_search(target_recall: float, limit: int = 0) -> int:
+    if settings.VECTOR_HNSW_EF_SEARCH > 0:
+        ef = settings.VECTOR_HNSW_EF_SEARCH
+    else:
+        ef = int(round(_interpolate(target_recall, 1)))
+    # hnsw returns at most ef_search rows, so it must cover the LIMIT
+    return min(1000, max(ef, limit))
+
+
+def ivfflat_probes(lists: int, target_recall: float) -> int:
+    if settings.VECTOR_IVFFLAT_PROBES > 0:
+        return min(lists, settings.VECTOR_IVFFLAT_PROBES)
+    return max(1, min(lists, math.ceil(lists * _interpolate(target_recall, 2))))
+
+
+def supports_iterative_scan(extversion: Optional[str]) -> bool:
+    try:
+        return tuple(int(p) for p in (extversion or "").split(".")[:2]) >= (0, 8)
+    except ValueError:
+        return False
+
+
+def iterative_scan_mode(method: Optional[str]) -> Optional[str]:
+    """VECTOR_ITERATIVE_SCAN if ``method`` accepts it, else None (scans stop at ef_search / probes)."""
+    mode = settings.VECTOR_ITERATIVE_SCAN
+    if method is None or mode == "off":
+        return None
+    if mode not in ITERATIVE_SCAN_MODES[method]:
+        logger.warning("%s does not support iterative_scan = %s; filtered searches over-fetch instead",
+                       method, mode)
+        return None
+    return mode
+
+
+def create_index_sql(column: str, method: str, rows: int, name: Optional[str] = None,
+                     lists: Optional[int] = None, concurrently: bool = True) -> str:
+    if method not in METHODS:
+        raise ValueError(f"index method must be one of {METHODS}, got {method!r}")
+    if method == "hnsw":
+        opts = f"m = {settings.HNSW_M}, ef_construction = {settings.HNSW_EF_CONSTRUCTION}"
+    else:
+        opts = f"lists = {lists or ivfflat_lists(rows)}"
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}{name or index_name(column)} ON embeddings "
+        f"USING {method} ({column} {OPCLASSES[column]}) WITH ({opts})"
+    )
+
+
+def parse_index_meta(row) -> AnnParams:
+    if row is None:
+        return AnnParams(None, 0, 0, 0)
+    method, reloptions = row
+    opts = dict(o.split("=", 1) for o in reloptions or [])
+    if method == "ivfflat":
+        lists = int(opts.get("lists", 100))
+        return AnnParams(method, lists, ivfflat_probes(lists, settings.VECTOR_TARGET_RECALL), 0)
+    if method == "hnsw":
+        return AnnParams(method, 0, 0, hnsw_ef_search(settings.VECTOR_TARGET_RECALL, settings.TOP_K))
+    return AnnParams(None, 0, 0, 0)
+
+
+# query-time parameters of the index in use, as last read by a new connection
+current = AnnParams(None, 0, 0, 0)
+
+
+def tune_connection(dbapi_connection, connection_record) -> None:
+    """Connect listener: read the index in use and set probes / ef_search for the session.
+
+    Without iterative scans a filtered query sees only the ef_search (or probed) nearest
+    rows and returns fewer than LIMIT when the filter is selective; ``query_params``
+    widens those queries instead.
+    """
+    global current
+    column = PRECISION_COLUMNS.get(settings.EMBEDDING_PRECISION, "vector")
+    try:
+        cur = dbapi_connection.cursor()
+        cur.execute(INDEX_META_QUERY, (index_name(column),))
+        params = parse_index_meta(cur.fetchone())
+        if params.method == "ivfflat":
+            cur.execute(f"SET ivfflat.probes = {params.probes}")
+        elif params.method == "hnsw":
+            cur.execute(f"SET hnsw.ef_search = {params.ef_search}")
+        cur.close()
+        # commit so the pool's reset-on-return rollback keeps the session settings
+        dbapi_connection.commit()
+    except Exception:
+        logger.warning("could not tune ANN query parameters", exc_info=True)
+        dbapi_connection.rollback()
+        return
+    mode = iterative_scan_mode(params.method)
+    if mode is not None:
+        try:
+            cur = dbapi_connection.cursor()
+            cur.execute(PGVECTOR_VERSION_QUERY)
+            row = cur.fetchone()
+            if supports_iterative_scan(row[0] if row else None):
+                cur.execute(f"SET {params.method}.iterative_scan = {mode}")
+                params = params._replace(iterative=True)
+            cur.close()
+            dbapi_connection.commit()
+        except Exception:
+            logger.warning("could not enable iterative index scans", exc_info=True)
+            dbapi_connection.rollback()
+            params = params._replace(iterative=False)
+    current = params
+
+
+def query_params(limit: int, filtered: bool = False) -> Optional[Dict[str, str]]:
+    """set_config values a query needs beyond the session defaults, or None.
+
+    A filtered query on an index without iterative scans searches
+    VECTOR_FILTER_OVERFETCH times as wide, so a selective filter still leaves LIMIT rows.
+    """
+    widen = filtered and not current.iterative
+    if current.method == "hnsw":
+        want = limit * settings.VECTOR_FILTER_OVERFETCH if widen else limit
+        if want > current.ef_search:
+            return {"name": "hnsw.ef_search", "value": str(hnsw_ef_search(settings.VECTOR_TARGET_RECALL, want))}
+    elif current.method == "ivfflat" and widen:
+        probes = min(current.lists, current.probes * settings.VECTOR_FILTER_OVERFETCH)
+        if probes > current.probes:
+            return {"name": "ivfflat.probes", "value": str(probes)}
+    return None
@@ -1,7 +1,7 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID, ARRAY, JSONB
-from pgvector.sqlalchemy import Vector
-from sqlalchemy import ForeignKey, Text, Float, TIMESTAMP, text
+from pgvector.sqlalchemy import BIT, HALFVEC, Vector
+from sqlalchemy import BigInteger, ForeignKey, Integer, Text, Float, TIMESTAMP, text
 
 class Base(DeclarativeBase):
     pass
@@ -12,6 +12,8 @@ class Dish(Base):
     dish_id: Mapped[UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
     name: Mapped[str] = mapped_column(Text, nullable=False)
     cuisine: Mapped[str] = mapped_column(Text, nullable=True)
+    # serving style, e.g. "restaurant" or "home" (migration 0008)
+    style: Mapped[str] = mapped_column(Text, nullable=True)
     aliases: Mapped[list[str]] = mapped_column(ARRAY(Text), nullable=True)
     macro_priors: Mapped[dict] = mapped_column(JSONB, nullable=True)
     notes: Mapped[str] = mapped_column(Text, nullable=True)
@@ -41,12 +43,18 @@ class Nutrients(Base):
     def __repr__(self) -> str:
         return f"<Nutrients(dish_id={self.dish_id}, kcal={self.kcal})>"
 
+# nutrient columns in the order used by in-process arrays; kcal always comes first
+NUTRIENT_FIELDS = ("kcal", "protein_g", "carbs_g", "fat_g", "fiber_g", "sugar_g", "sodium_mg")
+
 class Embedding(Base):
     __tablename__ = "embeddings"
 
     dish_id: Mapped[UUID] = mapped_column(ForeignKey("dishes.dish_id", ondelete="CASCADE"), primary_key=True)
     text: Mapped[str] = mapped_column(Text, nullable=False)
     vector: Mapped[Vector] = mapped_column(Vector(384), nullable=True)
+    # compact first-pass copies of vector (migration 0005), filled per EMBEDDING_PRECISION
+    vector_half: Mapped[HALFVEC] = mapped_column(HALFVEC(384), nullable=True)
+    vector_bits: Mapped[BIT] = mapped_column(BIT(384), nullable=True)
 
     dish: Mapped[Dish] = relationship(back_populates="embedding")
 
@@ -65,4 +73,36 @@ class AuditLog(Base):
     created_at: Mapped[str] = mapped_column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
 
     def __repr__(self) -> str:
-        return f"<AuditLog(id={self.id}, query_text={self.query_text})>"
\ No newline at end of file
+        return f"<AuditLog(id={self.id}, query_text={self.query_text})>"
+
+
+class CatalogState(Base):
+    __tablename__ = "catalog_state"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default=text("0"))
+    updated_at: Mapped[str] = mapped_column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<CatalogState(version={self.version})>"
+
+class CatalogChange(Base):
+    """One changed dish per row, filled by the triggers of migration 0007."""
+    __tablename__ = "catalog_changes"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    dish_id: Mapped[UUID] = mapped_column(UUID(as_uuid=True), nullable=True)  # NULL: the table was truncated
+    source: Mapped[str] = mapped_column(Text, nullable=False)
+    op: Mapped[str] = mapped_column(Text, nullable=False)  # I, U, D or T
+
+    def __repr__(self) -> str:
+        return f"<CatalogChange(version={self.version}, dish_id={self.dish_id}, op={self.op})>"
+
+# run in the same transaction as any write to dishes, nutrients or embeddings; the
+# catalog_state trigger (migration 0007) NOTIFYs CATALOG_CHANNEL when it commits
+BUMP_CATALOG_VERSION = "UPDATE catalog_state SET version = version + 1, updated_at = now() WHERE id = 1"
+CATALOG_VERSION = "SELECT version FROM catalog_state WHERE id = 1"
+CATALOG_CHANNEL = "catalog_changed"
+# versions of catalog_changes kept; a reader further behind reloads everything
+CATALOG_CHANGE_RETENTION = 1000
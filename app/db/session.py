@@ -1,7 +1,80 @@
-from sqlalchemy import create_engine, text
+import time
+from typing import cast
+
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import QueuePool
 from app.core.settings import settings
+from app.db.ann_index import tune_connection
+from app.utils.metrics import REGISTRY
+
+_pool_args = dict(
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    connect_args={"prepare_threshold": settings.DB_PREPARE_THRESHOLD},
+)
+
+# separate pools: a process opens at most the sum of both engines' size + overflow
+engine = create_engine(settings.DATABASE_URL, future=True, pool_size=settings.DB_SYNC_POOL_SIZE,
+                       max_overflow=settings.DB_SYNC_MAX_OVERFLOW, **_pool_args)
+async_engine = create_async_engine(settings.DATABASE_URL, pool_size=settings.DB_POOL_SIZE,
+                                   max_overflow=settings.DB_MAX_OVERFLOW, **_pool_args)
+
+def _set_prepared_max(dbapi_connection, connection_record):
+    conn = getattr(dbapi_connection, "driver_connection", dbapi_connection)
+    conn.prepared_max = settings.DB_PREPARED_MAX
+
+event.listen(engine, "connect", _set_prepared_max)
+event.listen(async_engine.sync_engine, "connect", _set_prepared_max)
+event.listen(engine, "connect", tune_connection)
+event.listen(async_engine.sync_engine, "connect", tune_connection)
+
+def _checked_in(dbapi_connection, connection_record):
+    connection_record.info["checked_in"] = time.monotonic()
+
+def _ping_idle(dialect):
+    # pool_pre_ping costs a round trip on every checkout; only connections idle for
+    # DB_PING_IDLE_S are pinged, busy ones are checked by the query itself
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_in = connection_record.info.get("checked_in")
+        if checked_in is None or time.monotonic() - checked_in < settings.DB_PING_IDLE_S:
+            return
+        try:
+            alive = dialect.do_ping(dbapi_connection)
+        except Exception:
+            alive = False
+        if not alive:
+            # the pool discards this connection and hands out a fresh one
+            raise exc.DisconnectionError()
+    return checkout
+
+for _pool_owner in (engine, async_engine.sync_engine):
+    event.listen(_pool_owner, "checkin", _checked_in)
+    event.listen(_pool_owner, "checkout", _ping_idle(_pool_owner.dialect))
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True, future=True)
+POOL_CHECKOUTS = REGISTRY.counter("db_pool_checkouts", "Connections handed out by the pool.", labels=("engine",))
+POOL_CONNECTS = REGISTRY.counter("db_pool_connects", "New physical connections opened.", labels=("engine",))
+
+for _name, _pool_owner in (("sync", engine), ("async", async_engine.sync_engine)):
+    event.listen(_pool_owner, "checkout", lambda *a, _n=_name: POOL_CHECKOUTS.inc(1.0, _n))
+    event.listen(_pool_owner, "connect", lambda *a, _n=_name: POOL_CONNECTS.inc(1.0, _n))
+
+def psycopg_dsn() -> str:
+    """DATABASE_URL for a plain psycopg connection, outside the pools."""
+    return make_url(settings.DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+
+def pool_status() -> dict:
+    out = {}
+    for name, pool in (("sync", engine.pool), ("async", async_engine.pool)):
+        pool = cast(QueuePool, pool)
+        out[name] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+        }
+    return out
 
 def ping_db() -> bool:
     try:
@@ -10,3 +83,11 @@ def ping_db() -> bool:
         return True
     except Exception:
         return False
+
+async def aping_db() -> bool:
+    try:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        return False
@@ -1,12 +1,112 @@
-from fastapi import FastAPI
-from app.db.session import ping_db
-from app.api import dishes_router, label_router
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+from fastapi import FastAPI, Response
+from app.core.settings import settings
+from app.db.session import aping_db, async_engine
+from app.api import dishes_router, label_router, metrics_router
+from app.services.audit_log import close_audit_logger
+from app.services.catalog import CatalogListener, get_watcher, refresh_catalog
+from app.services.catalog_feed import get_feed
+from app.services.label_cache import get_label_cache
+from app.services.label_service import LABEL_FLIGHTS
+from app.services.lexical_index import get_lexical_index, load_lexical_index, refresh_lexical_index
+from app.services.retrieval_service import SEARCH_FLIGHTS
+from app.services.vector_index import load_index
+from app.utils.embeddings import get_batcher, get_cache, warm_up
+from app.utils.metrics import TimingMiddleware
+from app.utils.profiler import SlowRequestProfiler
 
-app = FastAPI(title="Nutrition Label API", version="0.1.0")
+
+logger = logging.getLogger(__name__)
+
+# /ready answers 503 until the encoder has been loaded and run (EMBED_WARMUP)
+_warm = threading.Event()
+_startup: Dict[str, Any] = {"warmup_s": None, "warmup_error": None}
+
+
+def _warm_up() -> None:
+    backoff = 1.0
+    while True:
+        try:
+            _startup["warmup_s"] = warm_up()
+            _startup["warmup_error"] = None
+            _warm.set()
+            return
+        except Exception as e:
+            logger.exception("encoder warm-up failed; retrying in %.0fs", backoff)
+            _startup["warmup_error"] = str(e)
+            time.sleep(backoff)
+            backoff = min(60.0, backoff * 2)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.EMBED_WARMUP:
+        # started first so the model loads while the indexes below are mapped
+        threading.Thread(target=_warm_up, name="encoder-warmup", daemon=True).start()
+    else:
+        _warm.set()
+    if settings.RETRIEVAL_BACKEND == "numpy":
+        load_index()
+    if settings.LEXICAL_INDEX:
+        refresh_catalog()
+        watcher = get_watcher()
+        load_lexical_index(watcher.version)
+        if not settings.CATALOG_FEED:
+            watcher.listen(refresh_lexical_index)
+    listener = None
+    if settings.CATALOG_FEED:
+        # starts from the versions the indexes above were built at
+        get_feed()
+        get_label_cache()
+        if settings.CATALOG_LISTEN:
+            listener = CatalogListener(get_watcher())
+            listener.start()
+    yield
+    if listener is not None:
+        listener.stop()
+    # flush queued audit records before the pools go away
+    await asyncio.to_thread(close_audit_logger)
+    await async_engine.dispose()
+
+
+app = FastAPI(title="Nutrition Label API", version="0.1.0", lifespan=lifespan)
 
 app.include_router(dishes_router.router, prefix="/dishes", tags=["dishes"])
 app.include_router(label_router.router, prefix="/label", tags=["label"])
+app.include_router(metrics_router.router, tags=["metrics"])
+
+profiler = None
+if settings.PROFILE_SLOW_MS > 0:
+    profiler = SlowRequestProfiler(settings.PROFILE_SLOW_MS, settings.PROFILE_INTERVAL_MS, settings.PROFILE_DIR)
+    profiler.start()
+app.add_middleware(TimingMiddleware, on_finish=profiler.on_finish if profiler else None)
 
 @app.get("/health")
-def health():
-    return {"ok": True, "db": ping_db()}
+async def health():
+    return {"ok": True, "db": await aping_db()}
+
+@app.get("/ready")
+def ready(response: Response):
+    if not _warm.is_set():
+        response.status_code = 503
+    return {"ready": _warm.is_set(), **_startup}
+
+@app.get("/stats")
+def stats():
+    return {
+        "embedding_batches": get_batcher().stats.snapshot(),
+        "embedding_cache": get_cache().stats(),
+        "label_cache": get_label_cache().stats(),
+        "single_flight": {"label": LABEL_FLIGHTS.stats(), "search": SEARCH_FLIGHTS.stats()},
+        "catalog": {
+            "version": get_watcher().version,
+            "poll_errors": get_watcher().errors,
+            "lexical_index_dishes": len(get_lexical_index() or ()),
+            "feed": get_feed().stats() if settings.CATALOG_FEED else None,
+        },
+    }
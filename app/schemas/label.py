@@ -5,6 +5,7 @@ class LabelRequest(BaseModel):
     dish_name: str
     calories: float = Field(gt=0)
     prefer_restaurant_style: bool = False
+    cuisine: Optional[str] = None
     top_k: int = 5
     use_mixture: bool = True
 
@@ -0,0 +1,361 @@
+"""Write-behind audit log for served labels.
+
+Request handlers only append a small tuple to a bounded in-memory queue; a background
+thread serializes queued records and COPYs them into ``audit_logs`` in batches, flushing
+at ``batch_size`` records or every ``flush_interval_ms``. When the queue is full the
+configured policy applies:
+
+  drop  -- discard the record and count it
+  block -- wait up to ``block_timeout_ms`` for space, then drop
+  spill -- append the record to a local JSON-lines file that the writer replays later
+           (from the event loop, on a worker thread)
+
+Batches that fail to reach the database are spilled too, so a database outage loses
+nothing as long as the disk has room. ``close`` drains the queue before returning.
+
+Every worker process shares the spill file: appends and the move aside hold an flock on
+``<spill_path>.lock``, and a replay holds ``<spill_path>.replay.lock`` throughout, so only
+one process at a time reads, writes back and removes the file set aside.
+"""
+import asyncio
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import fcntl
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.settings import settings
+from app.schemas.label import LabelRequest, LabelResponse
+from app.utils.metrics import REGISTRY
+
+if TYPE_CHECKING:
+    import psycopg
+
+logger = logging.getLogger(__name__)
+
+COPY_SQL = (
+    "COPY audit_logs (query_text, target_calories, chosen_dishes, final_label, confidence, created_at) "
+    "FROM STDIN"
+)
+
+POLICIES = ("drop", "block", "spill")
+
+AUDIT_RECORDS = REGISTRY.counter("audit_records", "Audit records by outcome.", labels=("outcome",))
+AUDIT_FLUSH_SECONDS = REGISTRY.histogram("audit_flush_seconds", "Time to COPY one audit batch.")
+
+# (query_text, target_calories, response, unix time); serialized on the writer thread
+Pending = Tuple[str, float, LabelResponse, float]
+# (query_text, target_calories, chosen_dishes json, final_label json, confidence, created_at)
+Row = Tuple[str, float, str, str, float, datetime]
+
+
+def to_row(rec: Pending) -> Row:
+    query_text, calories, resp, ts = rec
+    chosen = [c.model_dump() for c in resp.candidates]
+    final = {"nutrients": resp.nutrients.model_dump(), "assumptions": resp.assumptions}
+    return (query_text, calories, json.dumps(chosen), json.dumps(final), resp.confidence,
+            datetime.fromtimestamp(ts, tz=timezone.utc))
+
+
+def _row_to_json(row: Row) -> str:
+    return json.dumps(list(row[:5]) + [row[5].isoformat()])
+
+
+def _row_from_json(line: str) -> Row:
+    q, cal, chosen, final, conf, ts = json.loads(line)
+    return q, cal, chosen, final, conf, datetime.fromisoformat(ts)
+
+
+@contextmanager
+def _flock(path: str, blocking: bool = True) -> Iterator[bool]:
+    """Hold an exclusive flock on ``path``; yields False if ``blocking`` is off and it is taken."""
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    with open(path, "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+
+class PsycopgWriter:
+    """COPYs rows over one lazily (re)opened psycopg connection."""
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._conn: Optional["psycopg.Connection"] = None
+
+    def __call__(self, rows: Sequence[Row]) -> None:
+        import psycopg
+
+        conn = self._conn
+        if conn is None or conn.closed:
+            conn = self._conn = psycopg.connect(self.dsn)
+        try:
+            with conn.cursor() as cur:
+                with cur.copy(COPY_SQL) as copy:
+                    for row in rows:
+                        copy.write_row(row)
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+
+
+class AuditLogger:
+    def __init__(
+        self,
+        write_batch: Callable[[Sequence[Row]], None],
+        max_queue: int = 10_000,
+        batch_size: int = 500,
+        flush_interval_ms: float = 200.0,
+        policy: str = "spill",
+        block_timeout_ms: float = 50.0,
+        spill_path: str = "data/audit_spill.jsonl",
+        replay_interval_s: float = 5.0,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"audit queue policy must be one of {POLICIES}, got {policy!r}")
+        self.write_batch = write_batch
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_s = flush_interval_ms / 1000.0
+        self.policy = policy
+        self.block_timeout_s = block_timeout_ms / 1000.0
+        self.spill_path = spill_path
+        self.replay_interval_s = replay_interval_s
+        self._queue: "queue.Queue[Optional[Pending]]" = queue.Queue(maxsize=max(1, max_queue))
+        self._spill_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self._next_replay = 0.0
+
+    # --- request side ------------------------------------------------------------------
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    t = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                    t.start()
+                    self._thread = t
+
+    def submit(self, query_text: str, calories: float, resp: LabelResponse) -> bool:
+        """Queue one record; returns False if it was dropped. Only ``block`` ever waits."""
+        if self._closed:
+            AUDIT_RECORDS.inc(1.0, "dropped")
+            return False
+        self._ensure_started()
+        rec = (query_text, calories, resp, time.time())
+        try:
+            self._queue.put_nowait(rec)
+        except queue.Full:
+            if self.policy == "block":
+                try:
+                    self._queue.put(rec, timeout=self.block_timeout_s)
+                except queue.Full:
+                    AUDIT_RECORDS.inc(1.0, "dropped")
+                    return False
+            elif self.policy == "spill":
+                self._spill([to_row(rec)])
+                return True
+            else:
+                AUDIT_RECORDS.inc(1.0, "dropped")
+                return False
+        AUDIT_RECORDS.inc(1.0, "enqueued")
+        return True
+
+    async def asubmit(self, query_text: str, calories: float, resp: LabelResponse) -> bool:
+        """``submit`` for the event loop; neither ``block`` nor ``spill`` holds it.
+
+        ``block`` waits by sleeping and ``spill`` appends to the file on a worker thread.
+        """
+        if self.policy == "drop":
+            return self.submit(query_text, calories, resp)
+        if self._closed:
+            AUDIT_RECORDS.inc(1.0, "dropped")
+            return False
+        self._ensure_started()
+        rec = (query_text, calories, resp, time.time())
+        if self.policy == "spill":
+            try:
+                self._queue.put_nowait(rec)
+            except queue.Full:
+                await asyncio.to_thread(self._spill, [to_row(rec)])
+                return True
+            AUDIT_RECORDS.inc(1.0, "enqueued")
+            return True
+        deadline = time.monotonic() + self.block_timeout_s
+        while True:
+            try:
+                self._queue.put_nowait(rec)
+                AUDIT_RECORDS.inc(1.0, "enqueued")
+                return True
+            except queue.Full:
+                if time.monotonic() >= deadline:
+                    AUDIT_RECORDS.inc(1.0, "dropped")
+                    return False
+                await asyncio.sleep(0.001)
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    # --- writer side -------------------------------------------------------------------
+
+    def _spill(self, rows: Sequence[Row]) -> None:
+        with self._spill_lock, _flock(self.spill_path + ".lock"):
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.writelines(_row_to_json(r) + "\n" for r in rows)
+        AUDIT_RECORDS.inc(float(len(rows)), "spilled")
+
+    def _write(self, rows: List[Row]) -> bool:
+        t0 = time.perf_counter()
+        try:
+            self.write_batch(rows)
+        except Exception:
+            logger.exception("audit flush of %d records failed; spilling to %s", len(rows), self.spill_path)
+            self._spill(rows)
+            return False
+        AUDIT_FLUSH_SECONDS.observe(time.perf_counter() - t0)
+        AUDIT_RECORDS.inc(float(len(rows)), "written")
+        return True
+
+    def _replay(self) -> None:
+        """Move the spill file aside and write it back in batches; keep it if the DB is still down.
+
+        A replay already running in another worker is left to finish; this one returns.
+        """
+        replay = self.spill_path + ".replay"
+        with _flock(replay + ".lock", blocking=False) as held:
+            if held:
+                self._replay_locked(replay)
+
+    def _replay_locked(self, replay: str) -> None:
+        while True:
+            if not os.path.exists(replay):
+                with self._spill_lock, _flock(self.spill_path + ".lock"):
+                    if not os.path.exists(self.spill_path):
+                        return
+                    os.replace(self.spill_path, replay)
+            with open(replay, encoding="utf-8") as f:
+                rows = [_row_from_json(line) for line in f if line.strip()]
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                try:
+                    self.write_batch(batch)
+                except Exception:
+                    # rewrite what is left so nothing is written twice on the next attempt
+                    with open(replay + ".tmp", "w", encoding="utf-8") as f:
+                        f.writelines(_row_to_json(r) + "\n" for r in rows[start:])
+                    os.replace(replay + ".tmp", replay)
+                    return
+                AUDIT_RECORDS.inc(float(len(batch)), "replayed")
+            os.remove(replay)
+
+    def _collect(self, first: Pending) -> Tuple[List[Pending], bool]:
+        batch, stop = [first], False
+        deadline = time.monotonic() + self.flush_interval_s
+        while len(batch) < self.batch_size:
+            try:
+                rec = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if rec is None:
+                stop = True
+                break
+            batch.append(rec)
+        return batch, stop
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            try:
+                first = self._queue.get(timeout=self.replay_interval_s)
+            except queue.Empty:
+                pass
+            else:
+                if first is None:
+                    stop = True
+                else:
+                    batch, stop = self._collect(first)
+                    self._write([to_row(r) for r in batch])
+            if time.monotonic() >= self._next_replay and self._queue.qsize() < self.batch_size:
+                self._next_replay = time.monotonic() + self.replay_interval_s
+                try:
+                    self._replay()
+                except Exception:
+                    logger.exception("audit spill replay failed")
+        # drain whatever was queued before close()
+        rest = []
+        while True:
+            try:
+                rec = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if rec is not None:
+                rest.append(rec)
+        for start in range(0, len(rest), self.batch_size):
+            self._write([to_row(r) for r in rest[start:start + self.batch_size]])
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Stop accepting records and flush everything queued."""
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+        close = getattr(self.write_batch, "close", None)
+        if close is not None:
+            close()
+
+
+_audit: Optional[AuditLogger] = None
+_audit_lock = threading.Lock()
+
+def get_audit_logger() -> Optional[AuditLogger]:
+    global _audit
+    if not settings.AUDIT_LOG_ENABLED:
+        return None
+    if _audit is None:
+        with _audit_lock:
+            if _audit is None:
+                from app.db.session import psycopg_dsn
+
+                _audit = AuditLogger(
+                    PsycopgWriter(psycopg_dsn()),
+                    max_queue=settings.AUDIT_QUEUE_MAX,
+                    batch_size=settings.AUDIT_BATCH_SIZE,
+                    flush_interval_ms=settings.AUDIT_FLUSH_INTERVAL_MS,
+                    policy=settings.AUDIT_QUEUE_FULL_POLICY,
+                    block_timeout_ms=settings.AUDIT_BLOCK_TIMEOUT_MS,
+                    spill_path=settings.AUDIT_SPILL_PATH,
+                )
+    return _audit
+
+async def audit_labels(reqs: Sequence[LabelRequest], resps: Sequence[LabelResponse]) -> None:
+    """Record served labels, error fallbacks included; never fails the request."""
+    audit = get_audit_logger()
+    if audit is None:
+        return
+    try:
+        for req, resp in zip(reqs, resps):
+            await audit.asubmit(req.dish_name, req.calories, resp)
+    except Exception:
+        logger.exception("auditing %d labels failed", len(resps))
+
+def close_audit_logger() -> None:
+    global _audit
+    if _audit is not None:
+        _audit.close()
+        _audit = None
@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+from typing import Callable, Hashable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import text
+from app.core.settings import settings
+from app.db.models import CATALOG_CHANGE_RETENTION, CATALOG_CHANNEL, CATALOG_VERSION
+from app.db.session import async_engine, engine, psycopg_dsn
+from app.services.vector_index import get_index
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION_QUERY = text(CATALOG_VERSION)
+
+CHANGES_QUERY = text("""
+    SELECT DISTINCT dish_id, source, op
+      FROM catalog_changes
+     WHERE version > :since AND version <= :until
+""")
+
+
+def _snapshot_only() -> bool:
+    # without the change feed a numpy snapshot never changes, so it is its own version
+    return settings.RETRIEVAL_BACKEND == "numpy" and not settings.CATALOG_FEED
+
+
+def catalog_version():
+    """Version of the catalog retrieval reads from, or None if it cannot be determined."""
+    if _snapshot_only():
+        # the loaded snapshot is the catalog; a rebuilt snapshot is a new object
+        return f"snapshot-{id(get_index()):x}"
+    try:
+        with engine.connect() as conn:
+            return conn.execute(CATALOG_VERSION_QUERY).scalar()
+    except Exception:
+        return None
+
+
+async def acatalog_version():
+    if _snapshot_only():
+        return catalog_version()
+    try:
+        async with async_engine.connect() as conn:
+            return (await conn.execute(CATALOG_VERSION_QUERY)).scalar()
+    except Exception:
+        return None
+
+
+class CatalogWatcher:
+    """Polls the catalog version at most every ``check_s`` and tells listeners about changes.
+
+    Derived in-process state (label cache, lexical index) registers a listener instead of
+    polling on its own. ``claim`` lets exactly one concurrent caller run each poll.
+    """
+
+    def __init__(self, check_s: float):
+        self.check_s = check_s
+        self.version: Optional[Hashable] = None
+        self.errors = 0
+        self._checked_at = float("-inf")
+        self._listeners: List[Callable[[Hashable], None]] = []
+        self._lock = threading.Lock()
+
+    def listen(self, fn: Callable[[Hashable], None]) -> None:
+        self._listeners.append(fn)
+
+    def claim(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < self.check_s:
+                return False
+            self._checked_at = now
+            return True
+
+    def update(self, version: Optional[Hashable]) -> None:
+        if version is None:
+            self.errors += 1
+            return
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+        for fn in self._listeners:
+            fn(version)
+
+
+_watcher: Optional[CatalogWatcher] = None
+_watcher_lock = threading.Lock()
+
+def get_watcher() -> CatalogWatcher:
+    global _watcher
+    if _watcher is None:
+        with _watcher_lock:
+            if _watcher is None:
+                _watcher = CatalogWatcher(settings.CATALOG_VERSION_CHECK_S)
+    return _watcher
+
+def refresh_catalog() -> None:
+    watcher = get_watcher()
+    if watcher.claim():
+        watcher.update(catalog_version())
+
+async def arefresh_catalog() -> None:
+    watcher = get_watcher()
+    if watcher.claim():
+        watcher.update(await acatalog_version())
+
+
+class ChangeSet(NamedTuple):
+    """Dishes changed between two catalog versions, from catalog_changes (migration 0007)."""
+    since: Optional[int]
+    until: int
+    dish_ids: Tuple[str, ...]
+    # everything may have changed (no base version, a TRUNCATE, or changes already pruned)
+    full: bool
+    # only nutrient values of existing dishes changed, so no query's candidates did
+    nutrients_only: bool
+
+
+def full_change(since: Optional[int], until: int) -> ChangeSet:
+    return ChangeSet(since, until, (), True, False)
+
+
+def parse_changes(since: Optional[int], until: int, rows) -> ChangeSet:
+    if any(r.dish_id is None for r in rows):
+        return full_change(since, until)
+    ids = tuple(sorted({str(r.dish_id) for r in rows}))
+    return ChangeSet(since, until, ids, False, all(r.source == "nutrients" and r.op == "U" for r in rows))
+
+
+def fetch_changes(since: Optional[int], until: int) -> ChangeSet:
+    if not isinstance(since, int) or not isinstance(until, int) or until < since \
+            or until - since > CATALOG_CHANGE_RETENTION:
+        return full_change(since, until)
+    with engine.connect() as conn:
+        rows = conn.execute(CHANGES_QUERY, {"since": since, "until": until}).fetchall()
+    return parse_changes(since, until, rows)
+
+
+class CatalogListener:
+    """LISTENs on CATALOG_CHANNEL and hands each committed version to the watcher at once.
+
+    Runs on its own connection outside the pools and reconnects with backoff; polling
+    keeps working whenever it is down.
+    """
+
+    def __init__(self, watcher: CatalogWatcher, timeout_s: float = 1.0):
+        self.watcher = watcher
+        self.timeout_s = timeout_s
+        self.notifications = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="catalog-listen", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5 * self.timeout_s)
+
+    def _run(self) -> None:
+        import psycopg
+
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(psycopg_dsn(), autocommit=True) as conn:
+                    conn.execute(f"LISTEN {CATALOG_CHANNEL}")
+                    backoff = 1.0
+                    # anything committed before LISTEN took effect is picked up by a poll
+                    row = conn.execute(CATALOG_VERSION).fetchone()
+                    if row is not None:
+                        self.watcher.update(row[0])
+                    while not self._stop.is_set():
+                        for note in conn.notifies(timeout=self.timeout_s):
+                            self.notifications += 1
+                            self.watcher.update(int(note.payload))
+            except Exception:
+                logger.warning("catalog LISTEN connection failed; retrying in %.0fs", backoff, exc_info=True)
+                self._stop.wait(backoff)
+                backoff = min(60.0, backoff * 2)
@@ -0,0 +1,254 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.settings import settings
+from app.services import lexical_index, vector_index
+from app.services.catalog import ChangeSet, fetch_changes, full_change, get_watcher
+from app.services.lexical_index import LEXICAL_ROWS_QUERY, LexicalIndex
+from app.services.partitions import SearchFilter
+from app.services.vector_index import SNAPSHOT_ROWS_QUERY, VectorIndex
+
+logger = logging.getLogger(__name__)
+
+
+def _dead(base, dead: np.ndarray, dish_ids) -> np.ndarray:
+    return np.union1d(dead, base.rows_of(dish_ids)).astype(np.int64)
+
+
+def _is_dead(dead: np.ndarray, row: int) -> bool:
+    j = int(np.searchsorted(dead, row))
+    return j < len(dead) and dead[j] == row
+
+
+class PatchedVectorIndex:
+    """A snapshot plus the dishes changed since it was built.
+
+    Changed and deleted dishes are masked out of ``base``; the current rows of those still
+    in the catalog form a small ``delta`` index searched alongside it. Rows from
+    ``len(base)`` on refer to the delta. Every change makes a new object, so a request
+    holding the previous one keeps a consistent view.
+    """
+
+    def __init__(self, base: VectorIndex, dead: np.ndarray, rows: Dict[str, object],
+                 catalog_version: Optional[int] = None):
+        self.base = base
+        self.dead = dead
+        self.rows = rows  # dish_id -> current row, for every changed dish still present
+        self.delta = VectorIndex.from_rows(list(rows.values()))
+        self.catalog_version = catalog_version
+        self.path = base.path
+        self._n = len(base)
+
+    def __len__(self) -> int:
+        return self._n - len(self.dead) + len(self.delta)
+
+    def hit(self, i: int, sim: float):
+        return self.base.hit(i, sim) if i < self._n else self.delta.hit(i - self._n, sim)
+
+    def lookup(self, name: str) -> List[int]:
+        rows = [i for i in self.base.lookup(name) if not _is_dead(self.dead, i)]
+        return rows + [self._n + i for i in self.delta.lookup(name)]
+
+    def matches(self, i: int, where: SearchFilter) -> bool:
+        return self.base.matches(i, where) if i < self._n else self.delta.matches(i - self._n, where)
+
+    def search_batch(self, queries: np.ndarray, k: int, where: Optional[SearchFilter] = None):
+        top, sims = self.base.search_batch(queries, k, exclude=self.dead, where=where)
+        if len(self.delta):
+            dtop, dsims = self.delta.search_batch(queries, k, where=where)
+            sims = np.concatenate([np.where(top >= 0, sims, -np.inf), np.where(dtop >= 0, dsims, -np.inf)], axis=1)
+            top = np.concatenate([top, np.where(dtop >= 0, dtop + self._n, -1)], axis=1)
+            order = np.argsort(-sims, axis=1, kind="stable")[:, :k]
+            top, sims = np.take_along_axis(top, order, axis=1), np.take_along_axis(sims, order, axis=1)
+            top[~np.isfinite(sims)] = -1
+        return top, sims
+
+
+class PatchedLexicalIndex:
+    """A LexicalIndex plus changed dishes, laid out like PatchedVectorIndex."""
+
+    def __init__(self, base: LexicalIndex, dead: np.ndarray, rows: Dict[str, object], version=None):
+        self.base = base
+        self.dead = dead
+        self.rows = rows
+        self.delta = LexicalIndex.from_rows(list(rows.values()))
+        self.version = version
+        self._n = len(base)
+
+    def __len__(self) -> int:
+        return self._n - len(self.dead) + len(self.delta)
+
+    def hit(self, i: int, sim: float):
+        return self.base.hit(i, sim) if i < self._n else self.delta.hit(i - self._n, sim)
+
+    def lookup(self, name: str) -> List[int]:
+        rows = [i for i in self.base.lookup(name) if not _is_dead(self.dead, i)]
+        return rows + [self._n + i for i in self.delta.lookup(name)]
+
+    def fuzzy(self, name: str, limit: int, threshold: float):
+        want = limit
+        while True:
+            got = self.base.fuzzy(name, want, threshold)
+            live = [(i, s) for i, s in got if not _is_dead(self.dead, i)]
+            # ask again for more when masked rows pushed live ones past the limit
+            if len(live) >= limit or len(got) < want:
+                break
+            want *= 2
+        live += [(self._n + i, s) for i, s in self.delta.fuzzy(name, limit, threshold)]
+        live.sort(key=lambda t: -t[1])
+        return live[:limit]
+
+
+def patch(index, dish_ids, rows, version=None):
+    """``index`` (plain or already patched) with ``dish_ids`` replaced by ``rows``.
+
+    ``rows`` holds the current row of each of those dishes still in the catalog; the
+    others were deleted. The cost is in the number of changed dishes, not the catalog.
+    """
+    if isinstance(index, (PatchedVectorIndex, PatchedLexicalIndex)):
+        base, dead, current = index.base, index.dead, dict(index.rows)
+    else:
+        base, dead, current = index, np.empty(0, dtype=np.int64), {}
+    for dish_id in dish_ids:
+        current.pop(dish_id, None)
+    current.update((str(r.dish_id), r) for r in rows)
+    dead = _dead(base, dead, dish_ids)
+    if isinstance(base, VectorIndex):
+        return PatchedVectorIndex(base, dead, current, version)
+    return PatchedLexicalIndex(base, dead, current, version)
+
+
+class CatalogFeed:
+    """Brings in-process catalog state up to each version the CatalogWatcher reports.
+
+    Registered as a watcher listener. In a background thread it reads which dishes changed
+    (catalog_changes), patches the numpy index and the lexical index with just those rows,
+    swaps them in, and only then tells its own listeners (the label cache). Too many
+    changes, or a gap the change log no longer covers, rebuild instead.
+    """
+
+    def __init__(self, max_rows: int, retry_s: float = 1.0):
+        self.max_rows = max_rows
+        self.retry_s = retry_s
+        self.version: Optional[int] = self._built_at()
+        self.applied = 0
+        self.patched = 0
+        self.rebuilt = 0
+        self.errors = 0
+        self.last_ms = 0.0
+        self._wanted: Optional[int] = None
+        self._running = False
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[ChangeSet], None]] = []
+
+    @staticmethod
+    def _built_at() -> Optional[int]:
+        if settings.RETRIEVAL_BACKEND == "numpy" and vector_index._index is not None:
+            return vector_index._index.catalog_version
+        lexical = lexical_index._lexical
+        return lexical.version if lexical is not None and isinstance(lexical.version, int) else None
+
+    def listen(self, fn: Callable[[ChangeSet], None]) -> None:
+        self._listeners.append(fn)
+
+    def update(self, version) -> None:
+        """CatalogWatcher listener."""
+        if not isinstance(version, int):
+            return
+        with self._lock:
+            self._wanted = version
+            if self._running or version == self.version:
+                return
+            self._running = True
+        threading.Thread(target=self._run, name="catalog-feed", daemon=True).start()
+
+    def _run(self) -> None:
+        backoff = self.retry_s
+        while True:
+            with self._lock:
+                wanted = self._wanted
+                if wanted is None or wanted == self.version:
+                    self._running = False
+                    return
+            try:
+                self.apply(fetch_changes(self.version, wanted))
+                backoff = self.retry_s
+            except Exception:
+                # retried from the same base (up to the newest version by then), so indexes
+                # and caches do not stay stale until the catalog happens to change again
+                self.errors += 1
+                logger.exception("applying catalog changes up to version %s failed; retrying in %.1fs",
+                                 wanted, backoff)
+                time.sleep(backoff)
+                backoff = min(60.0, backoff * 2)
+
+    def apply(self, changes: ChangeSet) -> None:
+        t0 = time.perf_counter()
+        if not changes.full and len(changes.dish_ids) > self.max_rows:
+            changes = full_change(changes.since, changes.until)
+        if changes.dish_ids or changes.full:
+            self._apply_indexes(changes)
+        self.version = changes.until
+        self.applied += 1
+        self.last_ms = 1000 * (time.perf_counter() - t0)
+        for fn in self._listeners:
+            fn(changes)
+
+    def _apply_indexes(self, changes: ChangeSet) -> None:
+        from app.db.session import engine
+
+        numpy = settings.RETRIEVAL_BACKEND == "numpy"
+        index = vector_index._index if numpy else None
+        lexical = lexical_index._lexical
+        ids = {"ids": list(changes.dish_ids)}
+        if changes.full:
+            self.rebuilt += 1
+            if index is not None:
+                vector_index.load_index(rebuild=True, min_version=changes.until)
+            if lexical is not None:
+                lexical_index._lexical = lexical_index.build_lexical_index(changes.until)
+            return
+        self.patched += 1
+        rows = None
+        if index is not None:
+            with engine.connect() as conn:
+                rows = conn.execute(SNAPSHOT_ROWS_QUERY, ids).fetchall()
+            new_index = patch(index, changes.dish_ids, rows, changes.until)
+        if lexical is not None:
+            if rows is None:
+                with engine.connect() as conn:
+                    rows = conn.execute(LEXICAL_ROWS_QUERY, ids).fetchall()
+            new_lexical = patch(lexical, changes.dish_ids, rows, changes.until)
+        # both swaps before the label cache moves on; a request reads each global once
+        if index is not None:
+            vector_index._index = new_index
+        if lexical is not None:
+            lexical_index._lexical = new_lexical
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "applied": self.applied,
+            "patched": self.patched,
+            "rebuilt": self.rebuilt,
+            "errors": self.errors,
+            "last_apply_ms": self.last_ms,
+        }
+
+
+_feed: Optional[CatalogFeed] = None
+_feed_lock = threading.Lock()
+
+
+def get_feed() -> CatalogFeed:
+    global _feed
+    if _feed is None:
+        with _feed_lock:
+            if _feed is None:
+                _feed = CatalogFeed(settings.CATALOG_DELTA_MAX_ROWS)
+                get_watcher().listen(_feed.update)
+    return _feed
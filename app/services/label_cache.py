@@ -0,0 +1,175 @@
+from collections import OrderedDict
+import threading
+import time
+from typing import Hashable, NamedTuple, Optional, Tuple
+import numpy as np
+from app.core.settings import settings
+from app.services.catalog import get_watcher
+from app.services.partitions import SearchFilter
+from app.utils.embedding_cache import normalize_query
+
+
+class CachedLabel(NamedTuple):
+    """Everything about a label except the calorie target.
+
+    ``profile`` is the blended nutrient row at its own kcal (None when nothing matched);
+    the response for any target is that row rescaled, as scale_nutrient_matrix does.
+    """
+    profile: Optional[np.ndarray]
+    confidence: float
+    candidates: Tuple[Tuple[str, str, float, float], ...]  # (dish_id, name, sim, weight)
+    compute_s: float
+
+
+def label_key(dish_name: str, top_k: int, use_mixture: bool,
+              where: Optional[SearchFilter] = None) -> Tuple[str, int, bool, Optional[SearchFilter]]:
+    return normalize_query(dish_name), top_k, use_mixture, where
+
+
+class LabelCache:
+    """LRU of CachedLabel bounded by entries and bytes, with a TTL and a catalog version.
+
+    Entries are dropped wholesale when ``set_version`` sees a new catalog version; the
+    shared singleton gets versions from the CatalogWatcher, or from the CatalogFeed with
+    CATALOG_FEED on, where ``apply_changes`` keeps entries a change cannot have affected.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_s: float = 0.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.version: Optional[Hashable] = None
+        self._lru: "OrderedDict[tuple, Tuple[CachedLabel, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.saved_s = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    @staticmethod
+    def _size(key: tuple, entry: CachedLabel) -> int:
+        n = 200 + len(key[0]) + (entry.profile.nbytes if entry.profile is not None else 0)
+        return n + sum(96 + len(c[0]) + len(c[1]) for c in entry.candidates)
+
+    def get(self, key: tuple) -> Optional[CachedLabel]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            item = self._lru.get(key)
+            if item is not None and self.ttl_s > 0 and now - item[1] > self.ttl_s:
+                self._drop(key)
+                self.expired += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._lru.move_to_end(key)
+            self.hits += 1
+            self.saved_s += item[0].compute_s
+            return item[0]
+
+    def put(self, key: tuple, entry: CachedLabel, version: Optional[Hashable] = None) -> None:
+        """Store ``entry``; ``version`` is the catalog version it was computed against."""
+        if not self.enabled:
+            return
+        size = self._size(key, entry)
+        with self._lock:
+            if version != self.version:
+                return  # computed against a catalog that has since changed
+            if key in self._lru:
+                self._drop(key)
+            self._lru[key] = (entry, time.monotonic(), size)
+            self._bytes += size
+            while self._lru and (len(self._lru) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._lru)))
+                self.evictions += 1
+
+    def _drop(self, key: tuple) -> None:
+        _, _, size = self._lru.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._lru:
+                self.invalidations += 1
+            self._lru.clear()
+            self._bytes = 0
+
+    def set_version(self, version: Optional[Hashable]) -> None:
+        """Record the current catalog version; a change empties the cache."""
+        if version != self.version:
+            self.clear()
+            with self._lock:
+                self.version = version
+
+    def apply_changes(self, changes) -> None:
+        """Move to ``changes.until`` (a catalog.ChangeSet), dropping only the entries it affects.
+
+        A change to nutrient values alone cannot change which dishes a query retrieves, so
+        only labels blended from those dishes go. Anything else (names, aliases, vectors,
+        added or removed dishes) can reorder any query's candidates and empties the cache.
+        """
+        if changes.full or not changes.nutrients_only:
+            self.set_version(changes.until)
+            return
+        changed = set(changes.dish_ids)
+        with self._lock:
+            stale = [key for key, (entry, _, _) in self._lru.items()
+                     if any(str(c[0]) in changed for c in entry.candidates)]
+            for key in stale:
+                self._drop(key)
+            self.invalidations += len(stale)
+            self.version = changes.until
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, nbytes = len(self._lru), self._bytes
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "catalog_version": self.version if isinstance(self.version, (int, str)) else None,
+            "saved_ms": 1000 * self.saved_s,
+            "entries": entries,
+            "bytes": nbytes,
+        }
+
+
+_label_cache: Optional[LabelCache] = None
+_label_cache_lock = threading.Lock()
+
+def get_label_cache() -> LabelCache:
+    global _label_cache
+    if _label_cache is None:
+        with _label_cache_lock:
+            if _label_cache is None:
+                _label_cache = LabelCache(
+                    max_entries=settings.LABEL_CACHE_MAX_ENTRIES,
+                    max_bytes=settings.LABEL_CACHE_MAX_BYTES,
+                    ttl_s=settings.LABEL_CACHE_TTL_S,
+                )
+                if settings.CATALOG_FEED:
+                    from app.services.catalog_feed import get_feed
+
+                    # versions arrive after the indexes were updated, so entries put in
+                    # between were computed against the old catalog and are refused
+                    feed = get_feed()
+                    _label_cache.set_version(feed.version)
+                    feed.listen(_label_cache.apply_changes)
+                else:
+                    watcher = get_watcher()
+                    _label_cache.set_version(watcher.version)
+                    watcher.listen(_label_cache.set_version)
+    return _label_cache
@@ -0,0 +1,233 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from app.schemas.label import Candidate, LabelRequest, LabelResponse, Nutrients
+from app.services.mixture_service import PRIOR_MACROS, blend_density_batch, mixture_weights_density
+from app.services.label_cache import CachedLabel, LabelCache, get_label_cache, label_key
+from app.services.catalog import arefresh_catalog, refresh_catalog
+from app.services.partitions import RESTAURANT_STYLE, search_filter
+from app.services.retrieval_service import aretrieve_hits_batch, retrieve_hits_batch
+from app.services.scaling_service import scale_nutrient_matrix
+from app.db.models import NUTRIENT_FIELDS
+from app.utils.metrics import timed
+from app.utils.single_flight import SingleFlight
+
+ASSUMPTIONS = (
+    "Scaled from a similarity-weighted blend of similar dishes' profiles, fitted to their macro priors "
+    "where known; values are approximate."
+)
+
+# async batches larger than this are assembled on a worker thread instead of the event loop
+ASYNC_INLINE_MAX = 64
+
+LABEL_FLIGHTS = SingleFlight("label")
+
+# Placeholder macro split per kcal (in NUTRIENT_FIELDS order) used when no matching dish is found
+FALLBACK_PER_KCAL = np.array([1.0, 0.05, 0.10, 0.03, 0.01, 0.02, 1.6])
+
+
+def fallback_nutrients(calories: float) -> Nutrients:
+    return _nutrients(FALLBACK_PER_KCAL * calories)
+
+
+def fallback_response(req: LabelRequest, dish_id: str, assumptions: str) -> LabelResponse:
+    return LabelResponse(
+        nutrients=fallback_nutrients(req.calories),
+        confidence=0.5,
+        assumptions=assumptions,
+        candidates=[Candidate(dish_id=dish_id, name=req.dish_name, sim=0.5, weight=1.0)],
+    )
+
+
+def _nutrients(row: np.ndarray) -> Nutrients:
+    calories, *vals = row.tolist()
+    return Nutrients(calories=calories, **{f: None if v != v else float(v) for f, v in zip(NUTRIENT_FIELDS[1:], vals)})
+
+
+def _where(r):
+    # a preferred style gives way to every style when none of its dishes match well
+    style = RESTAURANT_STYLE if getattr(r, "prefer_restaurant_style", False) else None
+    return search_filter(getattr(r, "cuisine", None), style, strict=False)
+
+
+def _lookup(reqs: List[LabelRequest], cache: LabelCache):
+    """Cached entries per request, plus the request indices of each missing key."""
+    entries: List[Optional[CachedLabel]] = [None] * len(reqs)
+    misses: Dict[tuple, List[int]] = {}
+    for i, r in enumerate(reqs):
+        if not r.dish_name:
+            continue
+        key = label_key(r.dish_name, r.top_k, r.use_mixture, _where(r))
+        entry = cache.get(key)
+        if entry is None:
+            misses.setdefault(key, []).append(i)
+        else:
+            entries[i] = entry
+    return entries, misses
+
+
+def label_batch(reqs: List[LabelRequest]) -> List[LabelResponse]:
+    """Label many requests at once; results are in request order.
+
+    Requests answered by the label cache are only rescaled. The remaining distinct
+    (name, top_k, use_mixture, filter) keys are embedded in one encode call and
+    retrieved in one pass; mixture weighting and blending then run as array operations
+    over the (keys x candidates) grid.
+    """
+    return _render(reqs, label_entries(reqs))
+
+
+def label_entries(reqs) -> List[Optional[CachedLabel]]:
+    """The CachedLabel behind each request of ``label_batch``, before rescaling.
+
+    ``reqs`` only need ``dish_name``, ``top_k`` and ``use_mixture`` (``cuisine`` and
+    ``prefer_restaurant_style`` are optional); bulk jobs pass plain
+    tuples and scale the profiles themselves rather than building response models.
+    """
+    refresh_catalog()
+    cache = get_label_cache()
+    version = cache.version
+    with timed("label_cache"):
+        entries, misses = _lookup(reqs, cache)
+    keys = list(misses)
+    t0 = time.perf_counter()
+    hits = retrieve_hits_batch([k[0] for k in keys], [k[1] for k in keys], wheres=[k[3] for k in keys]) if keys else []
+    return _fill(entries, misses, keys, _store(keys, hits, t0, cache, version))
+
+
+async def alabel_batch(reqs: List[LabelRequest]) -> List[LabelResponse]:
+    await arefresh_catalog()
+    cache = get_label_cache()
+    version = cache.version
+    with timed("label_cache"):
+        entries, misses = _lookup(reqs, cache)
+    keys = list(misses)
+    if keys:
+        # misses already being computed for a concurrent request are awaited, not recomputed
+        flights = await LABEL_FLIGHTS.do_many(
+            [(version, k) for k in keys],
+            lambda missing: _acompute([k for _, k in missing], cache, version),
+        )
+        _fill(entries, misses, keys, flights)
+    if len(reqs) > ASYNC_INLINE_MAX:
+        return await asyncio.to_thread(_render, reqs, entries)
+    return _render(reqs, entries)
+
+
+async def _acompute(keys: List[tuple], cache: LabelCache, version) -> List[CachedLabel]:
+    t0 = time.perf_counter()
+    hits = await aretrieve_hits_batch([k[0] for k in keys], [k[1] for k in keys], wheres=[k[3] for k in keys])
+    if len(keys) > ASYNC_INLINE_MAX:
+        return await asyncio.to_thread(_store, keys, hits, t0, cache, version)
+    return _store(keys, hits, t0, cache, version)
+
+
+def _store(keys, hits, t0, cache, version) -> List[CachedLabel]:
+    out = _blend(keys, hits, t0)
+    for key, entry in zip(keys, out):
+        cache.put(key, entry, version)
+    return out
+
+
+def _fill(entries, misses, keys, computed) -> List[Optional[CachedLabel]]:
+    for key, entry in zip(keys, computed):
+        for i in misses[key]:
+            entries[i] = entry
+    return entries
+
+
+def _gather(hits, b: int, width: int):
+    """(B, K) sims and kcal, (B, K, 6) densities and (B, K, 3) priors for a hits grid.
+
+    Hits reference rows of a few NutrientMatrix snapshots, so each matrix is gathered
+    with one fancy index instead of copying values hit by hit.
+    """
+    sims = np.zeros((b, width))
+    kcal = np.zeros((b, width))
+    dens = np.full((b, width, len(NUTRIENT_FIELDS) - 1), np.nan)
+    priors = np.full((b, width, len(PRIOR_MACROS)), np.nan)
+    found = np.zeros((b, width), dtype=bool)
+    groups: Dict[int, tuple] = {}
+    for i, h in enumerate(hits):
+        for j, (_, _, sim, matrix, row) in enumerate(h):
+            sims[i, j] = sim
+            found[i, j] = True
+            g = groups.get(id(matrix))
+            if g is None:
+                g = groups[id(matrix)] = (matrix, [], [], [])
+            g[1].append(i)
+            g[2].append(j)
+            g[3].append(row)
+    for matrix, ii, jj, rows in groups.values():
+        kcal[ii, jj] = matrix.kcal[rows]
+        dens[ii, jj] = matrix.density[rows, 1:]
+        priors[ii, jj] = matrix.priors[rows]
+    return sims, np.nan_to_num(kcal, nan=0.0), dens, priors, found
+
+
+def _blend(keys: List[tuple], hits, t0: float) -> List[CachedLabel]:
+    b = len(keys)
+    if not b:
+        return []
+    width = max((len(h) for h in hits), default=0)
+    sims, kcal, dens, priors, found = _gather(hits, b, width)
+    has_hits = found[:, 0] if width else np.zeros(b, dtype=bool)
+
+    # without use_mixture only the best (first) candidate takes part in the blend
+    mix = found.copy()
+    single = np.array([not k[2] for k in keys], dtype=bool)
+    if width > 1:
+        mix[single, 1:] = False
+
+    blended = np.full((b, len(NUTRIENT_FIELDS)), np.nan)
+    weights = np.zeros((b, width))
+    if has_hits.any():
+        weights[has_hits] = mixture_weights_density(dens[has_hits], sims[has_hits], mix[has_hits], priors[has_hits])
+        blended[has_hits] = blend_density_batch(kcal[has_hits], dens[has_hits], weights[has_hits])
+    confidence = np.clip(sims[:, 0], 0.0, 1.0) if width else np.zeros(b)
+
+    # the cost of computing a key, charged to the cache as latency saved on each later hit
+    compute_s = (time.perf_counter() - t0) / b
+    out = []
+    for i, h in enumerate(hits):
+        if not has_hits[i]:
+            out.append(CachedLabel(None, 0.0, (), compute_s))
+            continue
+        candidates = tuple(
+            (str(dish_id), str(name), min(1.0, max(0.0, float(sim))), float(weights[i, j]))
+            for j, (dish_id, name, sim, _, _) in enumerate(h)
+            if mix[i, j]
+        )
+        profile = blended[i].copy()
+        profile.setflags(write=False)
+        out.append(CachedLabel(profile, float(confidence[i]), candidates, compute_s))
+    return out
+
+
+def _render(reqs: List[LabelRequest], entries: List[Optional[CachedLabel]]) -> List[LabelResponse]:
+    """Scale each entry's profile to its request's calorie target."""
+    rows, profiles = [], []
+    for i, e in enumerate(entries):
+        if e is not None and e.profile is not None:
+            rows.append(i)
+            profiles.append(e.profile)
+    scaled = {}
+    if rows:
+        calories = np.array([reqs[i].calories for i in rows], dtype=np.float64)
+        scaled = dict(zip(rows, scale_nutrient_matrix(np.stack(profiles), calories)))
+
+    with timed("build"):
+        out = []
+        for i, req in enumerate(reqs):
+            entry = entries[i]
+            if entry is None or i not in scaled:
+                out.append(fallback_response(req, "fallback", "Fallback response - no matching dishes found."))
+                continue
+            out.append(LabelResponse(
+                nutrients=_nutrients(scaled[i]),
+                confidence=entry.confidence,
+                assumptions=ASSUMPTIONS,
+                candidates=[Candidate(dish_id=d, name=n, sim=sim, weight=w) for d, n, sim, w in entry.candidates],
+            ))
+    return out
@@ -0,0 +1,253 @@
+import logging
+import os
+import re
+import threading
+from typing import Dict, Hashable, List, Literal, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from app.core.settings import settings
+from app.services.nutrient_matrix import NutrientMatrix
+from app.utils.embedding_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_QUERY = text("""
+    SELECT d.dish_id, d.name, d.aliases, d.macro_priors,
+           n.kcal, n.protein_g, n.carbs_g, n.fat_g, n.fiber_g, n.sugar_g, n.sodium_mg
+      FROM dishes d
+      JOIN nutrients n ON n.dish_id = d.dish_id
+     ORDER BY d.dish_id
+""")
+
+LEXICAL_ROWS_QUERY = text("""
+    SELECT d.dish_id, d.name, d.aliases, d.macro_priors,
+           n.kcal, n.protein_g, n.carbs_g, n.fat_g, n.fiber_g, n.sugar_g, n.sodium_mg
+      FROM dishes d
+      JOIN nutrients n ON n.dish_id = d.dish_id
+     WHERE d.dish_id = ANY(CAST(:ids AS uuid[]))
+     ORDER BY d.dish_id
+""")
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def trigrams(s: str) -> Set[str]:
+    """Character trigrams as pg_trgm computes them: per word, padded '  word '."""
+    out: Set[str] = set()
+    for word in _WORD.findall(s.lower()):
+        padded = "  " + word + " "
+        out.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return out
+
+
+class LexicalIndex:
+    """Exact and trigram lookups over dish names and aliases.
+
+    Every name and alias is a key (normalized like query embeddings). Exact lookups are a
+    binary search over the sorted keys. Fuzzy lookups count shared trigrams through an
+    inverted index and score keys with pg_trgm's similarity, |shared| / |union|. The
+    nutrient matrix is kept alongside so a hit needs no database round trip.
+
+    Keys, postings and their offsets are flat arrays, so the index can be saved with the
+    vector snapshot and memory-mapped by every worker instead of rebuilt in each.
+    """
+
+    ARRAYS = ("keys", "key_offsets", "key_rows", "grams", "gram_offsets", "gram_keys", "sizes")
+
+    def __init__(self, dish_ids, names, aliases: List[List[str]], matrix: NutrientMatrix,
+                 version: Optional[Hashable] = None):
+        exact: Dict[str, List[int]] = {}
+        for i, name in enumerate(names):
+            for k in [str(name)] + list(aliases[i] or []):
+                k = normalize_query(k)
+                if not k:
+                    continue
+                rows = exact.setdefault(k, [])
+                if i not in rows:
+                    rows.append(i)
+        keys = sorted(exact)
+        postings: Dict[str, List[int]] = {}
+        sizes = np.zeros(len(keys), dtype=np.int32)
+        for kid, k in enumerate(keys):
+            key_grams = trigrams(k)
+            sizes[kid] = len(key_grams)
+            for g in key_grams:
+                postings.setdefault(g, []).append(kid)
+        grams = sorted(postings)
+        arrays = {
+            "keys": np.asarray(keys, dtype=str),
+            "key_offsets": _offsets(exact[k] for k in keys),
+            "key_rows": np.asarray([r for k in keys for r in exact[k]], dtype=np.int32),
+            "grams": np.asarray(grams, dtype=str),
+            "gram_offsets": _offsets(postings[g] for g in grams),
+            "gram_keys": np.asarray([kid for g in grams for kid in postings[g]], dtype=np.int32),
+            "sizes": sizes,
+        }
+        self._init(dish_ids, names, matrix, arrays, version)
+
+    def _init(self, dish_ids, names, matrix: NutrientMatrix, arrays: Dict[str, np.ndarray],
+              version: Optional[Hashable]) -> None:
+        self.dish_ids = dish_ids
+        self.names = names
+        self.matrix = matrix
+        self.version = version
+        self.arrays = arrays
+        self._keys = arrays["keys"]
+        self._key_offsets = arrays["key_offsets"]
+        self._key_rows = arrays["key_rows"]
+        self._grams = arrays["grams"]
+        self._gram_offsets = arrays["gram_offsets"]
+        self._gram_keys = arrays["gram_keys"]
+        self._sizes = arrays["sizes"]
+        self._id_order: Optional[Tuple[Optional[np.ndarray]]] = None
+
+    def __len__(self) -> int:
+        return len(self.dish_ids)
+
+    @classmethod
+    def from_rows(cls, rows, version: Optional[Hashable] = None) -> "LexicalIndex":
+        rows = list(rows)
+        return cls(
+            np.asarray([str(r.dish_id) for r in rows], dtype=str),
+            np.asarray([r.name for r in rows], dtype=str),
+            [list(r.aliases or []) for r in rows],
+            NutrientMatrix.from_rows(rows),
+            version,
+        )
+
+    @classmethod
+    def from_vector_index(cls, index, version: Optional[Hashable] = None) -> "LexicalIndex":
+        return cls(index.dish_ids, index.names, index.aliases, index.matrix, version)
+
+    @classmethod
+    def from_db(cls, engine, version: Optional[Hashable] = None) -> "LexicalIndex":
+        with engine.connect() as conn:
+            rows = conn.execution_options(stream_results=True, yield_per=10_000).execute(LEXICAL_QUERY)
+            return cls.from_rows(rows, version)
+
+    def save(self, path: str) -> None:
+        from app.services.vector_index import save_arrays
+
+        save_arrays(path, {f"{name}.npy": self.arrays[name] for name in self.ARRAYS})
+
+    @classmethod
+    def load(cls, path: str, index, version: Optional[Hashable] = None, mmap: bool = True) -> "LexicalIndex":
+        """Map arrays saved with ``index``'s snapshot; rows refer to that index."""
+        mode: Optional[Literal["r"]] = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in cls.ARRAYS}
+        lexical = cls.__new__(cls)
+        lexical._init(index.dish_ids, index.names, index.matrix, arrays, version)
+        return lexical
+
+    def hit(self, i: int, sim: float):
+        return str(self.dish_ids[i]), str(self.names[i]), sim, self.matrix, i
+
+    def rows_of(self, dish_ids) -> np.ndarray:
+        from app.services.vector_index import find_rows, id_order
+
+        if self._id_order is None:
+            self._id_order = (id_order(self.dish_ids),)
+        return find_rows(self.dish_ids, self._id_order[0], dish_ids)
+
+    def _find(self, sorted_keys: np.ndarray, key: str) -> int:
+        j = int(np.searchsorted(sorted_keys, key))
+        return j if j < len(sorted_keys) and sorted_keys[j] == key else -1
+
+    def _rows(self, kid: int) -> np.ndarray:
+        return self._key_rows[self._key_offsets[kid]:self._key_offsets[kid + 1]]
+
+    def lookup(self, name: str) -> List[int]:
+        kid = self._find(self._keys, normalize_query(name))
+        return [] if kid < 0 else self._rows(kid).tolist()
+
+    def fuzzy(self, name: str, limit: int, threshold: float) -> List[Tuple[int, float]]:
+        """Rows whose name or alias has trigram similarity >= threshold, best first."""
+        q = trigrams(normalize_query(name))
+        lists = []
+        for g in q:
+            j = self._find(self._grams, g)
+            if j >= 0:
+                lists.append(self._gram_keys[self._gram_offsets[j]:self._gram_offsets[j + 1]])
+        if not lists or limit <= 0:
+            return []
+        kids, shared = np.unique(np.concatenate(lists), return_counts=True)
+        sims = shared / (len(q) + self._sizes[kids] - shared)
+        keep = sims >= threshold
+        kids, sims = kids[keep], sims[keep]
+        best: Dict[int, float] = {}
+        for j in np.argsort(-sims, kind="stable"):
+            for row in self._rows(kids[j]).tolist():
+                if row not in best:
+                    best[row] = float(sims[j])
+            if len(best) >= limit:
+                break
+        return list(best.items())[:limit]
+
+
+def _offsets(groups) -> np.ndarray:
+    return np.concatenate([[0], np.cumsum([len(g) for g in groups])]).astype(np.int64)
+
+
+_lexical: Optional[LexicalIndex] = None
+_wanted_version: Optional[Hashable] = None
+_rebuild_lock = threading.Lock()
+_rebuilding = False
+
+
+def build_lexical_index(version: Optional[Hashable] = None) -> LexicalIndex:
+    if settings.RETRIEVAL_BACKEND == "numpy":
+        from app.services.vector_index import get_index, snapshot_lock, snapshot_version
+
+        index = get_index()
+        # written with the snapshot; older snapshots without it are indexed in process
+        if index.path and os.path.exists(os.path.join(index.path, "lexical", "sizes.npy")):
+            with snapshot_lock(index.path):
+                # rows refer to the mapped index only if nobody rebuilt the snapshot since
+                if snapshot_version(index.path) == index.catalog_version:
+                    return LexicalIndex.load(os.path.join(index.path, "lexical"), index, version)
+        return LexicalIndex.from_vector_index(index, version)
+    from app.db.session import engine
+
+    return LexicalIndex.from_db(engine, version)
+
+
+def load_lexical_index(version: Optional[Hashable] = None) -> Optional[LexicalIndex]:
+    """Build and install the shared index; on failure retrieval keeps using the database."""
+    global _lexical
+    try:
+        _lexical = build_lexical_index(version)
+    except Exception:
+        logger.exception("lexical index build failed")
+    return _lexical
+
+
+def refresh_lexical_index(version: Hashable) -> None:
+    """CatalogWatcher listener: rebuild in the background, keep serving the old index meanwhile."""
+    global _wanted_version, _rebuilding
+    with _rebuild_lock:
+        _wanted_version = version
+        if _rebuilding or (_lexical is not None and _lexical.version == version):
+            return
+        _rebuilding = True
+    threading.Thread(target=_rebuild, name="lexical-rebuild", daemon=True).start()
+
+
+def _rebuild() -> None:
+    global _rebuilding
+    while True:
+        with _rebuild_lock:
+            wanted = _wanted_version
+            if _lexical is not None and _lexical.version == wanted:
+                _rebuilding = False
+                return
+        index = load_lexical_index(wanted)
+        if index is None or index.version != wanted:
+            with _rebuild_lock:
+                _rebuilding = False
+            return  # build failed; the next version change retries
+
+
+def get_lexical_index() -> Optional[LexicalIndex]:
+    return _lexical if settings.LEXICAL_INDEX else None
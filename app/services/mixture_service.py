@@ -1,14 +1,193 @@
-# Placeholder NNLS mixture; will be implemented later
-from typing import List, Tuple
-from app.schemas.label import Candidate, Nutrients
-
-def blend_candidates(cands: List[Tuple[Candidate, Nutrients]]) -> List[Candidate]:
-    # For MVP, just return candidates with equal weights
-    if not cands:
-        return []
-    w = 1.0 / len(cands)
-    out = []
-    for c, _ in cands:
-        c.weight = w
-        out.append(c)
+# Mixture weights over candidate nutrient profiles.
+#
+# Each candidate is reduced to a per-kcal density profile and weighted by similarity.
+# When the dishes carry `macro_priors`, the weights are instead fitted by NNLS so the
+# blend's protein/carbs/fat per kcal reproduce the similarity-weighted prior split, with a
+# ridge toward the similarity weights. The fit uses a batched active-set (block principal
+# pivoting) solver, so a whole batch of requests shares each linear-algebra call instead
+# of looping over scipy.optimize.nnls.
+#
+# `macro_priors` holds energy fractions, e.g. {"protein": 0.25, "carbs": 0.45, "fat": 0.30}
+# (percentages such as 25 are accepted too).
+from typing import Optional
+import numpy as np
+from app.db.models import NUTRIENT_FIELDS
+from app.utils.metrics import timed_fn
+
+PRIOR_MACROS = ("protein", "carbs", "fat")
+KCAL_PER_G = np.array([4.0, 4.0, 9.0])
+PRIOR_COLUMNS = [NUTRIENT_FIELDS.index(f) - 1 for f in ("protein_g", "carbs_g", "fat_g")]
+SUM_WEIGHT = 10.0  # weight of the "weights sum to one" row relative to a nutrient row
+RIDGE = 0.05  # pull toward similarity-proportional weights; makes the fit unique when K > 3
+
+
+def parse_macro_priors(priors) -> np.ndarray:
+    """Convert a macro_priors JSON object to grams per kcal of (protein, carbs, fat); NaN if absent."""
+    out = np.full(len(PRIOR_MACROS), np.nan)
+    if not isinstance(priors, dict):
+        return out
+    for i, key in enumerate(PRIOR_MACROS):
+        v = priors.get(key)
+        if isinstance(v, (int, float)) and v >= 0:
+            frac = v / 100.0 if v > 1 else float(v)
+            out[i] = frac / KCAL_PER_G[i]
+    return out
+
+
+def _solve_passive(G: np.ndarray, c: np.ndarray, P: np.ndarray) -> np.ndarray:
+    # Solve G[P,P] z[P] = c[P] for every problem at once. The passive columns are gathered
+    # into a dense (batch x width x width) system, width being the largest passive set, and
+    # padding slots are turned into identity rows.
+    b, n = P.shape
+    z = np.zeros((b, n))
+    width = int(P.sum(axis=1).max())
+    if width == 0:
+        return z
+    idx = np.argsort(~P, axis=1, kind="stable")[:, :width]
+    valid = np.take_along_axis(P, idx, axis=1)
+    Gs = G[np.arange(b)[:, None, None], idx[:, :, None], idx[:, None, :]]
+    eye = np.eye(width, dtype=bool)
+    Gs = np.where(valid[:, :, None] & valid[:, None, :], Gs, eye)
+    ridge = 1e-12 * np.maximum(np.trace(Gs, axis1=1, axis2=2) / width, 1e-300)
+    Gs = Gs + ridge[:, None, None] * (eye & valid[:, :, None])
+    cs = np.where(valid, np.take_along_axis(c, idx, axis=1), 0.0)
+    zs = np.linalg.solve(Gs, cs[..., None])[..., 0]
+    np.put_along_axis(z, idx, np.where(valid, zs, 0.0), axis=1)
+    return z
+
+
+def nnls_batch(A: np.ndarray, b: np.ndarray, max_iter: Optional[int] = None) -> np.ndarray:
+    """Solve min ||A[i] x - b[i]||, x >= 0 for a stack of problems A (B, m, n), b (B, m).
+
+    Block principal pivoting (Kim & Park, 2011) in lockstep over the batch: every
+    iteration is one batched solve on the current passive sets, after which all
+    infeasible variables of a problem are exchanged at once (falling back to Murty's
+    single-variable rule if that stops making progress). Converged problems are
+    simply left unchanged by later iterations.
+    """
+    A = np.asarray(A, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    nb, m, n = A.shape
+    At = A.transpose(0, 2, 1)
+    G = At @ A
+    c = (At @ b[..., None])[..., 0]
+    tol = 10 * np.finfo(float).eps * max(m, n) * np.maximum(np.abs(c).max(axis=1), 1e-300)[:, None]
+
+    # start from the unconstrained solution; in a mixture most weights stay positive,
+    # so this usually needs only one or two exchanges
+    F = np.diagonal(G, axis1=1, axis2=2) > 0
+    x = np.zeros((nb, n))
+    alpha = np.full(nb, 3)
+    beta = np.full(nb, n + 1)
+    for _ in range(max_iter or 5 * n):
+        x = _solve_passive(G, c, F)
+        y = np.einsum("bij,bj->bi", G, x) - c
+        V = np.where(F, x < -tol, y < -tol)
+        nv = V.sum(axis=1)
+        live = nv > 0
+        if not live.any():
+            break
+        improved = live & (nv < beta)
+        retry = live & ~improved & (alpha >= 1)
+        beta = np.where(improved, nv, beta)
+        alpha = np.where(improved, 3, np.where(retry, alpha - 1, alpha))
+        flip = V & (improved | retry)[:, None]
+        single = np.nonzero(live & ~improved & ~retry)[0]
+        if len(single):
+            last = n - 1 - np.argmax(V[single, ::-1], axis=1)
+            flip[single, last] = True
+        F ^= flip
+    return np.where(F, np.maximum(x, 0.0), 0.0)
+
+
+def mixture_weights_batch(
+    profiles: np.ndarray,
+    sims: np.ndarray,
+    mask: np.ndarray,
+    priors: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Mixture weights for a (batch x candidates) grid: NNLS-fitted to macro priors, else by similarity.
+
+    profiles: (B, K, 7) raw nutrient values in NUTRIENT_FIELDS order, NaN for nulls
+    sims: (B, K) retrieval similarities; mask: (B, K) which slots hold a candidate
+    priors: optional (B, K, 3) parse_macro_priors output per candidate
+    Returns (B, K) non-negative weights summing to one over each row's candidates.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    kcal = np.where(mask, profiles[..., 0], 1.0)
+    dens = profiles[..., 1:] / np.maximum(kcal, 1e-6)[..., None]
+    return mixture_weights_density(dens, sims, mask, priors)
+
+
+@timed_fn("mixture")
+def mixture_weights_density(
+    dens: np.ndarray,
+    sims: np.ndarray,
+    mask: np.ndarray,
+    priors: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """``mixture_weights_batch`` over (B, K, 6) per-kcal densities, e.g. NutrientMatrix.density[..., 1:]."""
+    mask = np.asarray(mask, dtype=bool)
+    sw = np.where(mask, np.clip(sims, 1e-3, None), 0.0)
+    w0 = sw / np.maximum(sw.sum(axis=1, keepdims=True), 1e-12)
+    if priors is None:
+        return w0
+
+    # the target is the candidates' curated macro split, not anything derived from the
+    # weights being fitted; rows (and macros) without priors keep similarity weights
+    has = mask[..., None] & ~np.isnan(priors)
+    pnum = (sw[..., None] * np.where(has, priors, 0.0)).sum(axis=1)
+    pden = (sw[..., None] * has).sum(axis=1)
+    use = pden > 0
+    fit = use.any(axis=1)
+    if not fit.any():
+        return w0
+    mask, use, w0f = mask[fit], use[fit], w0[fit]
+    target = np.divide(pnum[fit], pden[fit], out=np.zeros((int(fit.sum()), len(PRIOR_MACROS))), where=use)
+    macro = dens[fit][..., PRIOR_COLUMNS]
+
+    # a candidate's missing macro is imputed with the target so it does not pull the fit
+    # either way; rows are rescaled so the three macros weigh comparably
+    feats = np.where(mask[..., None] & ~np.isnan(macro), macro, target[:, None, :])
+    count = np.maximum(mask.sum(axis=1), 1)[:, None]
+    scale = np.abs(target) + (np.abs(feats) * mask[..., None]).sum(axis=1) / count + 1e-9
+    A = np.where(mask[:, None, :] & use[:, :, None], (feats / scale[:, None, :]).transpose(0, 2, 1), 0.0)
+    ones = np.where(mask, SUM_WEIGHT, 0.0)[:, None, :]
+    ridge = np.sqrt(RIDGE) * np.eye(mask.shape[1]) * mask[:, None, :]
+    A = np.concatenate([A, ones, ridge], axis=1)
+    bvec = np.concatenate(
+        [np.where(use, target / scale, 0.0), np.full((len(target), 1), SUM_WEIGHT), np.sqrt(RIDGE) * w0f], axis=1
+    )
+
+    x = nnls_batch(A, bvec)
+    total = x.sum(axis=1, keepdims=True)
+    out = w0.copy()
+    out[fit] = np.where(total > 1e-12, x / np.maximum(total, 1e-12), w0f)
     return out
+
+
+def blend_profiles_batch(profiles: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Blend (B, K, 7) candidate profiles into (B, 7) portions at the weighted mean kcal.
+
+    Each nutrient is averaged per kcal over the candidates that report it, so a null in
+    one candidate does not drag the blend to zero; it is NaN only if no candidate has it.
+    """
+    kcal = np.nan_to_num(profiles[..., 0], nan=0.0)
+    dens = profiles[..., 1:] / np.maximum(kcal, 1e-6)[..., None]
+    return blend_density_batch(kcal, dens, weights)
+
+
+@timed_fn("blend")
+def blend_density_batch(kcal: np.ndarray, dens: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """``blend_profiles_batch`` over (B, K) kcal and (B, K, 6) per-kcal densities.
+
+    Candidates without calories add their kcal but no densities: per kcal they are
+    undefined, and a near-zero divisor would swamp every other candidate's nutrients.
+    """
+    known = ((weights > 0) & (kcal > 0))[..., None] & ~np.isnan(dens)
+    wk = weights[..., None] * known
+    den = wk.sum(axis=1)
+    per_kcal = np.divide((wk * np.where(known, dens, 0.0)).sum(axis=1), den,
+                         out=np.full(den.shape, np.nan), where=den > 0)
+    kcal_bar = (weights * kcal).sum(axis=1)
+    return np.concatenate([kcal_bar[:, None], per_kcal * kcal_bar[:, None]], axis=1)
@@ -0,0 +1,56 @@
+from typing import Optional
+
+import numpy as np
+
+from app.db.models import NUTRIENT_FIELDS
+from app.services.mixture_service import PRIOR_MACROS, parse_macro_priors
+
+
+class NutrientMatrix:
+    """Columnar per-kcal nutrients for a set of dishes.
+
+    ``density[i]`` is dish i's label per kcal in NUTRIENT_FIELDS order (so column 0 is 1)
+    with NaN where the source value is null or the dish has no calories. A label at a calorie target is
+    ``density[i] * target``. Retrieval hands out (matrix, row) pairs and blending gathers
+    rows with one fancy index per matrix; Pydantic models are only built when a response
+    is rendered.
+
+    A precomputed ``density`` (e.g. memory-mapped from a snapshot) is used as is, so
+    processes mapping the same files share one copy.
+    """
+
+    def __init__(self, nutrients: np.ndarray, priors: Optional[np.ndarray] = None,
+                 density: Optional[np.ndarray] = None):
+        nutrients = np.asarray(nutrients, dtype=np.float32).reshape(-1, len(NUTRIENT_FIELDS))
+        self.kcal = nutrients[:, 0]
+        if density is None:
+            density = nutrients / np.maximum(np.nan_to_num(self.kcal, nan=0.0), 1e-6)[:, None]
+            # a zero-kcal dish (water, diet soda) has no per-kcal profile to blend or scale
+            density[~(self.kcal > 0), 1:] = np.nan
+            density[:, 0] = 1.0
+        self.density = density
+        if priors is None:
+            priors = np.full((len(nutrients), len(PRIOR_MACROS)), np.nan, dtype=np.float32)
+        self.priors = priors
+
+    def __len__(self) -> int:
+        return len(self.kcal)
+
+    @property
+    def known(self) -> np.ndarray:
+        return ~np.isnan(self.density)
+
+    def values(self, row: int) -> np.ndarray:
+        """Row ``row`` as stored: (kcal, protein_g, ..., sodium_mg), NaN for nulls."""
+        return self.density[row] * self.kcal[row]
+
+    def scaled(self, rows: np.ndarray, target_calories: np.ndarray) -> np.ndarray:
+        """``scale_nutrient_matrix`` for catalog rows: one broadcast multiply, no division."""
+        return self.density[rows] * np.asarray(target_calories, dtype=np.float32)[:, None]
+
+    @classmethod
+    def from_rows(cls, rows) -> "NutrientMatrix":
+        """Columns of a result set with NUTRIENT_FIELDS and macro_priors attributes."""
+        nuts = [[np.nan if getattr(r, f) is None else getattr(r, f) for f in NUTRIENT_FIELDS] for r in rows]
+        priors = np.asarray([parse_macro_priors(r.macro_priors) for r in rows], dtype=np.float32)
+        return cls(np.asarray(nuts, dtype=np.float32), priors.reshape(-1, len(PRIOR_MACROS)))
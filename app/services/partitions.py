@@ -0,0 +1,91 @@
+# Cuisine and style filters, and the row partitions of the in-process index they select.
+#
+# A filter restricts retrieval to dishes of one cuisine and/or style before ranking, so a
+# selective filter neither loses matches to a global top-k nor needs over-fetching. The
+# numpy index groups its rows by (cuisine, style); snapshots are written in that order,
+# so a partition, and a whole cuisine, is one contiguous range of the memory-mapped
+# matrix. pgvector gets the same filter inside the retrieval statement.
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+# LabelRequest.prefer_restaurant_style asks for dishes of this style first
+RESTAURANT_STYLE = "restaurant"
+
+# rows of an index: a slice when they are contiguous, else sorted row numbers
+Rows = Union[slice, np.ndarray]
+
+
+def normalize_facet(value) -> str:
+    """A cuisine or style as filters compare it: lowercased, single-spaced, '' for none."""
+    return " ".join(str(value).lower().split()) if value else ""
+
+
+class SearchFilter(NamedTuple):
+    """Normalized cuisine and style a query is restricted to (None matches any).
+
+    With ``strict`` false the style is only a preference: a query whose best match of
+    that style is below SIM_THRESHOLD is answered from every style instead.
+    """
+    cuisine: Optional[str] = None
+    style: Optional[str] = None
+    strict: bool = True
+
+    def relaxed(self) -> Optional["SearchFilter"]:
+        return SearchFilter(self.cuisine) if self.cuisine is not None else None
+
+
+def search_filter(cuisine=None, style=None, strict: bool = True) -> Optional[SearchFilter]:
+    """The SearchFilter for raw request values, or None when nothing is restricted."""
+    cuisine, style = normalize_facet(cuisine) or None, normalize_facet(style) or None
+    if cuisine is None and style is None:
+        return None
+    return SearchFilter(cuisine, style, strict or style is None)
+
+
+def matches(cuisine: str, style: str, where: SearchFilter) -> bool:
+    return (where.cuisine is None or cuisine == where.cuisine) and (where.style is None or style == where.style)
+
+
+class Partitions:
+    """Rows of an index grouped by normalized (cuisine, style).
+
+    Built once per index from its per-row values; a filter's rows are the union of the
+    groups it matches, so resolving one costs the number of groups plus the rows it
+    selects, never a pass over the whole catalog.
+    """
+
+    def __init__(self, cuisines: np.ndarray, styles: np.ndarray):
+        c_values, c_codes = np.unique(np.asarray(cuisines, dtype=str), return_inverse=True)
+        s_values, s_codes = np.unique(np.asarray(styles, dtype=str), return_inverse=True)
+        codes = c_codes.astype(np.int64) * len(s_values) + s_codes
+        self._order = np.argsort(codes, kind="stable")
+        ordered = codes[self._order]
+        first = np.ones(len(ordered), dtype=bool)
+        first[1:] = ordered[1:] != ordered[:-1]
+        starts = np.flatnonzero(first)
+        ends = np.r_[starts[1:], len(ordered)].astype(np.int64)
+        self.groups: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            c, s = divmod(int(ordered[start]), len(s_values))
+            self.groups[str(c_values[c]), str(s_values[s])] = (start, end)
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def sizes(self) -> Dict[Tuple[str, str], int]:
+        return {key: end - start for key, (start, end) in self.groups.items()}
+
+    def rows(self, where: SearchFilter) -> Rows:
+        parts: List[np.ndarray] = [
+            self._order[start:end]
+            for (cuisine, style), (start, end) in self.groups.items()
+            if matches(cuisine, style, where)
+        ]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        # a stable sort keeps each group's rows ascending
+        rows = parts[0] if len(parts) == 1 else np.sort(np.concatenate(parts))
+        if rows[-1] - rows[0] + 1 == len(rows):
+            return slice(int(rows[0]), int(rows[-1]) + 1)
+        return rows.astype(np.int64)
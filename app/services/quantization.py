@@ -0,0 +1,88 @@
+# Reduced-precision copies of the embedding matrix for a first-pass search.
+#
+# A compact code is scanned for a shortlist of RERANK_FACTOR * k rows, and only those
+# rows are re-scored against the full float32 vectors, which can stay memory-mapped on
+# disk. Bytes per 384-d row: float32 1536, halfvec 768, int8 384 (+4 for the scale),
+# binary 48.
+#
+#   halfvec -- float16 components
+#   int8    -- symmetric per-row scalar quantization: round(v / max|v| * 127)
+#   binary  -- sign bits, packed; rows are ranked by Hamming distance to the query's bits
+from typing import Optional, Tuple
+
+import numpy as np
+
+PRECISIONS = ("float32", "halfvec", "int8", "binary")
+
+# rows per chunk when decoding codes, so the temporary float32 block stays small
+_CHUNK = 8192
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(x: np.ndarray) -> np.ndarray:
+    """Set bits per row of an unsigned integer matrix."""
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+        return np.bitwise_count(x).sum(axis=-1, dtype=np.int32)
+    return _POPCOUNT[x.view(np.uint8)].sum(axis=-1, dtype=np.int32)
+
+
+def check_precision(precision: str) -> str:
+    if precision not in PRECISIONS:
+        raise ValueError(f"embedding precision must be one of {PRECISIONS}, got {precision!r}")
+    return precision
+
+
+def quantize(vectors: np.ndarray, precision: str) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """(codes, per-row scales) for ``precision``; float32 has no codes."""
+    check_precision(precision)
+    if precision == "float32":
+        return None, None
+    n = len(vectors)
+    if precision == "halfvec":
+        codes = np.empty(vectors.shape, dtype=np.float16)
+    elif precision == "int8":
+        codes = np.empty(vectors.shape, dtype=np.int8)
+    else:
+        codes = np.empty((n, (vectors.shape[1] + 7) // 8), dtype=np.uint8)
+    scales = np.ones(n, dtype=np.float32)
+    for start in range(0, n, _CHUNK):
+        block = np.asarray(vectors[start:start + _CHUNK], dtype=np.float32)
+        if precision == "halfvec":
+            codes[start:start + _CHUNK] = block
+        elif precision == "int8":
+            peak = np.abs(block).max(axis=1)
+            peak[peak == 0] = 1.0
+            codes[start:start + _CHUNK] = np.rint(block / peak[:, None] * 127.0)
+            scales[start:start + _CHUNK] = peak / 127.0
+        else:
+            codes[start:start + _CHUNK] = np.packbits(block > 0, axis=1)
+    return codes, scales if precision == "int8" else None
+
+
+def approx_scores(queries: np.ndarray, codes: np.ndarray, scales: Optional[np.ndarray], precision: str) -> np.ndarray:
+    """(queries x rows) float32 scores from compact codes; higher is closer.
+
+    halfvec and int8 approximate cosine similarity for normalized queries; binary returns
+    1 - 2 * hamming / dim, which preserves the Hamming ranking.
+    """
+    n = len(codes)
+    out = np.empty((len(queries), n), dtype=np.float32)
+    if precision == "binary":
+        qbits = np.packbits(queries > 0, axis=1)
+        dim = queries.shape[1]
+        if codes.shape[1] % 8 == 0:
+            # XOR and count 64 bits at a time
+            codes, qbits = codes.view(np.uint64), qbits.view(np.uint64)
+        for start in range(0, n, _CHUNK):
+            block = codes[start:start + _CHUNK]
+            for j, qb in enumerate(qbits):
+                out[j, start:start + len(block)] = 1.0 - 2.0 * _popcount(block ^ qb) / dim
+        return out
+    for start in range(0, n, _CHUNK):
+        block = codes[start:start + _CHUNK].astype(np.float32)
+        scores = queries @ block.T
+        if scales is not None:
+            scores *= scales[start:start + _CHUNK]
+        out[:, start:start + len(block)] = scores
+    return out
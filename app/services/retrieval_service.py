@@ -1,72 +1,529 @@
-from typing import List, Tuple
+import asyncio
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional, Sequence, Tuple, cast
+from psycopg import AsyncConnection, Connection, Pipeline
+from psycopg.rows import namedtuple_row
 from sqlalchemy import text
+from app.core.settings import settings
 from app.schemas.label import Candidate, Nutrients
-from app.db.session import engine
-from app.utils.embeddings import get_model
+from app.db import ann_index
+from app.db.session import async_engine, engine
+from app.services.lexical_index import get_lexical_index
+from app.services.nutrient_matrix import NutrientMatrix
+from app.services.partitions import SearchFilter
+from app.services.vector_index import get_index
+from app.utils.embedding_cache import normalize_query
+from app.utils.embeddings import aembed_text, aembed_texts, embed_text, embed_texts
+from app.utils.metrics import record_stage, timed
+from app.utils.single_flight import SingleFlight
 import numpy as np
 
+# (dish_id, name, sim, nutrient matrix, row): nutrients and priors stay columnar until rendered
+Hit = Tuple[str, str, float, NutrientMatrix, int]
+
+# One statement per retrieval pass, for a single query and a batch alike: one round trip,
+# and a fixed text per variant that psycopg keeps prepared on the connection. Queries come
+# in as arrays; exact name/alias hits, nearest neighbours and pg_trgm matches (migration
+# 0004) are tagged by kind, and dishes and nutrients are joined once for all of them.
+# Fusion stays in _combine, as with the in-process indexes.
+#
+# _NEAREST[precision] is the LATERAL body: the :k dishes nearest q.qv. Compact precisions
+# (EMBEDDING_PRECISION, migration 0005) re-rank a shortlist of the :shortlist rows nearest
+# by the compact column with the float32 vector; int8 codes exist only in the numpy index.
+# A cuisine/style filter joins dishes into the scan itself ({join}, {filter}), so the
+# index walks on until it has :k matching rows (iterative scans, see ann_index) instead
+# of filtering a global top-k afterwards.
+_NEAREST = {"float32": """
+        SELECT e.dish_id, 1 - (e.vector <=> CAST(q.qv AS vector)) AS score
+          FROM embeddings e{join}
+         WHERE e.vector IS NOT NULL{filter}
+         ORDER BY e.vector <=> CAST(q.qv AS vector)
+         LIMIT :k
+"""}
+
+# precision -> (compact column, shortlist order)
+_SHORTLIST = {
+    "halfvec": ("vector_half", "e.vector_half <=> CAST(q.qv AS halfvec(384))"),
+    "binary": ("vector_bits", "e.vector_bits <~> binary_quantize(CAST(q.qv AS vector))::bit(384)"),
+}
+
+_RERANK = """
+        SELECT e.dish_id, 1 - (e.vector <=> CAST(q.qv AS vector)) AS score
+          FROM (SELECT e.dish_id FROM embeddings e{{join}}
+                 WHERE e.{column} IS NOT NULL{{filter}} ORDER BY {order} LIMIT :shortlist) s
+          JOIN embeddings e ON e.dish_id = s.dish_id
+         ORDER BY e.vector <=> CAST(q.qv AS vector)
+         LIMIT :k
+"""
+_NEAREST.update((p, _RERANK.format(column=c, order=o)) for p, (c, o) in _SHORTLIST.items())
+
+_FILTER_JOIN = " JOIN dishes d ON d.dish_id = e.dish_id"
+
+# (cuisine given, style given) -> condition on dishes d; both sides are normalized with
+# partitions.normalize_facet (the columns on ingest, see migration 0008)
+_FILTERS = {
+    (False, False): "",
+    (True, False): " AND d.cuisine = :cuisine",
+    (False, True): " AND d.style = :style",
+    (True, True): " AND d.cuisine = :cuisine AND d.style = :style",
+}
+
+_EXACT_HITS = """
+    SELECT q.i, 'exact' AS kind, d.dish_id, 1.0::float8 AS score
+      FROM q
+      JOIN dishes d ON (lower(d.name) = q.name OR d.aliases @> ARRAY[q.name]){filter}
+"""
+
+_VECTOR_HITS = """
+    SELECT q.i, 'vector' AS kind, m.dish_id, m.score
+      FROM q
+     CROSS JOIN LATERAL ({nearest}) m
+"""
+
+_FUZZY_HITS = """
+    SELECT q.i, 'fuzzy' AS kind, m.dish_id, m.score
+      FROM q
+     CROSS JOIN LATERAL (
+        SELECT d.dish_id, similarity(lower(d.name), q.name) AS score
+          FROM dishes d
+          JOIN nutrients n ON n.dish_id = d.dish_id
+         WHERE lower(d.name) % q.name AND similarity(lower(d.name), q.name) >= :threshold{filter}
+         ORDER BY lower(d.name) <-> q.name
+         LIMIT :k
+     ) m
+"""
+
+_RETRIEVE_QUERY = """
+    WITH q AS (
+        SELECT * FROM unnest({arrays}) WITH ORDINALITY AS q({columns})
+    ), hits AS ({hits})
+    SELECT h.i, h.kind, d.dish_id, d.name, d.macro_priors,
+           n.kcal, n.protein_g, n.carbs_g, n.fat_g, n.fiber_g, n.sugar_g, n.sodium_mg, h.score
+      FROM hits h
+      JOIN dishes d ON d.dish_id = h.dish_id
+      JOIN nutrients n ON n.dish_id = h.dish_id
+     ORDER BY h.i, h.kind, h.score DESC
+"""
+
+
+def _retrieve_query(nearest: str, lexical: bool, shape: Tuple[bool, bool]):
+    cond = _FILTERS[shape]
+    vector = _VECTOR_HITS.format(nearest=nearest.format(join=_FILTER_JOIN if cond else "", filter=cond))
+    # with the in-process lexical index the exact and trigram lookups are already done
+    if lexical:
+        return text(_RETRIEVE_QUERY.format(arrays="CAST(:qvs AS text[])", columns="qv, i", hits=vector))
+    return text(_RETRIEVE_QUERY.format(
+        arrays="CAST(:names AS text[]), CAST(:qvs AS text[])", columns="name, qv, i",
+        hits="UNION ALL".join([_EXACT_HITS.format(filter=cond), vector, _FUZZY_HITS.format(filter=cond)]),
+    ))
+
+
+# (precision, lexical index in process, filter shape) -> statement; the lexical index
+# knows no cuisines or styles, so filtered queries always match names in SQL
+RETRIEVAL_QUERIES = {
+    (p, lexical, shape): _retrieve_query(nearest, lexical, shape)
+    for p, nearest in _NEAREST.items()
+    for lexical in (True, False)
+    for shape in _FILTERS
+    if not (lexical and any(shape))
+}
+
+# raises hnsw.ef_search for this transaction when a LIMIT exceeds the session default;
+# pipelined with the retrieval statement, so it costs no round trip of its own
+ANN_PARAMS_QUERY = text("SELECT set_config(:name, :value, true)")
+
+SEARCH_FLIGHTS = SingleFlight("search")
+
+
+def _to_pgvector(v: np.ndarray) -> str:
+    return "[" + ",".join(repr(float(x)) for x in v) + "]"
+
+
+def _candidate(dish_id, name, sim) -> Candidate:
+    return Candidate(dish_id=str(dish_id), name=str(name), sim=min(1.0, max(0.0, float(sim))))
+
+
+def _make_pair(dish_id, name, sim, matrix: NutrientMatrix, row: int) -> Tuple[Candidate, Nutrients]:
+    vals = [None if v != v else float(v) for v in matrix.values(row).tolist()]
+    candidate = _candidate(dish_id, name, sim)
+    nutrients = Nutrients(
+        calories=float(matrix.kcal[row]),
+        protein_g=vals[1],
+        carbs_g=vals[2],
+        fat_g=vals[3],
+        fiber_g=vals[4],
+        sugar_g=vals[5],
+        sodium_mg=vals[6],
+    )
+    return candidate, nutrients
+
+
+# per query: (exact hits, nearest neighbours, [(hit, trigram similarity)])
+Found = Tuple[List[Hit], List[Hit], List[Tuple[Hit, float]]]
+
+
+def _fuse(nearest: List[Hit], fuzzy: List[Tuple[Hit, float]], k: int) -> List[Hit]:
+    """Top k of nearest neighbours and trigram matches under a noisy-OR of the two scores."""
+    if not fuzzy:
+        return nearest[:k]
+    w = settings.LEXICAL_WEIGHT
+    lex: Dict[str, float] = {}
+    for h, s in fuzzy:
+        lex[h[0]] = max(s, lex.get(h[0], 0.0))
+    pool = {h[0]: h for h in nearest[:k]}
+    for h, _ in fuzzy:
+        pool.setdefault(h[0], h)
+    fused = []
+    for h in pool.values():
+        sim = float(h[2])
+        if h[0] in lex:
+            base = max(sim, 0.0)
+            sim = base + w * lex[h[0]] * (1.0 - base)
+        fused.append((h[0], h[1], sim, h[3], h[4]))
+    fused.sort(key=lambda h: -h[2])
+    return fused[:k]
+
+
+def _combine(found: Found, k: int) -> List[Hit]:
+    # an exact name/alias hit is the answer; otherwise fuse vector and lexical matches
+    exact, nearest, fuzzy = found
+    return exact if exact else _fuse(nearest, fuzzy, k)
+
+
+_SQL: Dict[object, str] = {}
+
+
+def _sql(stmt) -> str:
+    # psycopg query text of a statement, compiled once
+    sql = _SQL.get(stmt)
+    if sql is None:
+        sql = _SQL[stmt] = str(stmt.compile(dialect=engine.dialect))
+    return sql
+
+
+def _shape(where: Optional[SearchFilter]) -> Tuple[bool, bool]:
+    return (False, False) if where is None else (where.cuisine is not None, where.style is not None)
+
+
+def _pgvector_query(dish_names: List[str], query_vectors: np.ndarray, ks: Sequence[int], lexical: bool,
+                    where: Optional[SearchFilter] = None):
+    """(query, params) of one retrieval pass over queries sharing a filter."""
+    precision = settings.EMBEDDING_PRECISION if settings.EMBEDDING_PRECISION in _NEAREST else "float32"
+    params: Dict[str, Any] = {"qvs": [_to_pgvector(v) for v in query_vectors], "k": max(ks)}
+    if not lexical:
+        params["names"] = [normalize_query(n) for n in dish_names]
+        params["threshold"] = settings.LEXICAL_FUZZY_THRESHOLD
+    if where is not None and where.cuisine is not None:
+        params["cuisine"] = where.cuisine
+    if where is not None and where.style is not None:
+        params["style"] = where.style
+    if precision != "float32":
+        params["shortlist"] = params["k"] * settings.RERANK_FACTOR
+    return _sql(RETRIEVAL_QUERIES[precision, lexical, _shape(where)]), params
+
+
+def _pgvector_statements(queries):
+    """(setup, queries) for retrieval passes sent in one pipeline, shared by the sync and async paths.
+
+    Each query returns the hits of one pass; the setup statements ahead of them only
+    configure the transaction.
+    """
+    limit = max(params.get("shortlist", params["k"]) for _, params in queries)
+    filtered = any("cuisine" in params or "style" in params for _, params in queries)
+    ann = ann_index.query_params(limit, filtered)
+    return ([(_sql(ANN_PARAMS_QUERY), ann)] if ann is not None else []), queries
+
+
+def _pgvector_found(dish_names: List[str], rows) -> List[Found]:
+    found: List[Found] = [([], [], []) for _ in dish_names]
+    if not rows:
+        return found
+    # one columnar matrix for the whole pass; hits reference it by row
+    matrix = NutrientMatrix.from_rows(rows)
+    for j, r in enumerate(rows):
+        exact, nearest, fuzzy = found[r.i - 1]
+        if r.kind == "exact":
+            exact.append((str(r.dish_id), r.name, 1.0, matrix, j))
+        elif r.kind == "vector":
+            nearest.append((str(r.dish_id), r.name, r.score, matrix, j))
+        else:
+            fuzzy.append(((str(r.dish_id), r.name, 0.0, matrix, j), float(r.score)))
+    return found
+
+
+def _pipeline(conn):
+    # libpq < 14 has no pipeline mode; the statements then go one round trip each
+    return conn.pipeline() if Pipeline.is_supported() else nullcontext()
+
+
+def _execute(conn, setup, queries):
+    """Runs the statements on a psycopg connection in one pipeline; rows of each query.
+
+    ``prepare=True`` prepares each text on first use rather than after
+    DB_PREPARE_THRESHOLD executions: there are only a few of them per process.
+    """
+    with _pipeline(conn):
+        for sql, params in setup:
+            conn.cursor().execute(sql, params, prepare=True)
+        cursors = []
+        for sql, params in queries:
+            cur = conn.cursor(row_factory=namedtuple_row)
+            cur.execute(sql, params, prepare=True)
+            cursors.append(cur)
+        return [cur.fetchall() for cur in cursors]
+
+
+async def _aexecute(conn, setup, queries):
+    async with _pipeline(conn):
+        for sql, params in setup:
+            await conn.cursor().execute(sql, params, prepare=True)
+        cursors = []
+        for sql, params in queries:
+            cur = conn.cursor(row_factory=namedtuple_row)
+            await cur.execute(sql, params, prepare=True)
+            cursors.append(cur)
+        return [await cur.fetchall() for cur in cursors]
+
+
+# one retrieval pass: (positions in the batch, names, query vectors, ks, lexical, filter)
+Pass = Tuple[List[int], List[str], np.ndarray, List[int], bool, Optional[SearchFilter]]
+
+
+def _passes(dish_names: List[str], query_vectors: np.ndarray, ks: Sequence[int], lexical: bool,
+            wheres: Sequence[Optional[SearchFilter]]) -> List[Pass]:
+    """Queries grouped by filter, one retrieval pass per distinct filter."""
+    groups: Dict[Optional[SearchFilter], List[int]] = {}
+    for j, where in enumerate(wheres):
+        groups.setdefault(where, []).append(j)
+    return [
+        (js, [dish_names[j] for j in js], query_vectors[js], [ks[j] for j in js], lexical and where is None, where)
+        for where, js in groups.items()
+    ]
+
+
+def _scatter(n: int, passes: List[Pass], results: List[List[Found]]) -> List[Found]:
+    found: List[Found] = [([], [], []) for _ in range(n)]
+    for p, res in zip(passes, results):
+        for j, f in zip(p[0], res):
+            found[j] = f
+    return found
+
+
+# a connection killed within DB_PING_IDLE_S of its last use is only found broken by the
+# query itself; it is invalidated and the pass runs once more on a fresh connection
+_ATTEMPTS = 2
+
+
+def _retrieve_pgvector(passes: List[Pass]) -> List[List[Found]]:
+    setup, queries = _pgvector_statements([_pgvector_query(*p[1:]) for p in passes])
+    for attempt in range(_ATTEMPTS):
+        t0 = time.perf_counter()
+        with engine.connect() as conn:
+            # pool checkout, including a ping when the connection sat idle
+            record_stage("db_connect", time.perf_counter() - t0)
+            raw = cast(Connection, conn.connection.driver_connection)
+            with timed("db_retrieve"):
+                try:
+                    rows = _execute(raw, setup, queries)
+                    break
+                except Exception:
+                    if not raw.broken:
+                        raise
+                    conn.invalidate()
+                    if attempt == _ATTEMPTS - 1:
+                        raise
+    with timed("rows"):
+        return [_pgvector_found(p[1], r) for p, r in zip(passes, rows)]
+
+
+async def _aretrieve_pgvector(passes: List[Pass]) -> List[List[Found]]:
+    setup, queries = _pgvector_statements([_pgvector_query(*p[1:]) for p in passes])
+    for attempt in range(_ATTEMPTS):
+        t0 = time.perf_counter()
+        async with async_engine.connect() as conn:
+            record_stage("db_connect", time.perf_counter() - t0)
+            raw = cast(AsyncConnection, (await conn.get_raw_connection()).driver_connection)
+            with timed("db_retrieve"):
+                try:
+                    rows = await _aexecute(raw, setup, queries)
+                    break
+                except Exception:
+                    if not raw.broken:
+                        raise
+                    await conn.invalidate()
+                    if attempt == _ATTEMPTS - 1:
+                        raise
+    with timed("rows"):
+        return [_pgvector_found(p[1], r) for p, r in zip(passes, rows)]
+
+
+def _retrieve_numpy(dish_names: List[str], query_vectors: np.ndarray, ks: Sequence[int], lexical: bool,
+                    where: Optional[SearchFilter] = None) -> List[Found]:
+    index = get_index()
+    with timed("index_search"):
+        tops, sims = index.search_batch(query_vectors, max(ks), where=where)
+
+    hit = index.hit
+    out: List[Found] = []
+    for name, top, sim in zip(dish_names, tops.tolist(), sims.tolist()):
+        exact = [] if lexical else [hit(i, 1.0) for i in index.lookup(name) if where is None or index.matches(i, where)]
+        out.append((exact, [hit(i, s) for i, s in zip(top, sim) if i >= 0], []))
+    return out
+
+
+def _retrieve_numpy_passes(passes: List[Pass]) -> List[List[Found]]:
+    return [_retrieve_numpy(*p[1:]) for p in passes]
+
+
+def _weak(found: Found, k: int) -> bool:
+    hits = _combine(found, k)
+    return not hits or float(hits[0][2]) < settings.SIM_THRESHOLD
+
+
+def _fallbacks(wheres: Sequence[Optional[SearchFilter]], results: List[Found], ks: Sequence[int]) -> List[int]:
+    """Positions whose preferred style matched nothing at SIM_THRESHOLD; they are searched again without it."""
+    return [
+        j for j, (where, found) in enumerate(zip(wheres, results))
+        if where is not None and not where.strict and _weak(found, ks[j])
+    ]
+
+
+def _lexical_pass(dish_names: List[str], ks: Sequence[int], wheres: Sequence[Optional[SearchFilter]]):
+    """Exact and trigram matches from the in-process index, and the queries still needing vectors."""
+    lexical = get_lexical_index()
+    found: List[Found] = [([], [], []) for _ in dish_names]
+    if lexical is not None:
+        with timed("lexical"):
+            for i, (name, k) in enumerate(zip(dish_names, ks)):
+                if wheres[i] is not None:
+                    continue  # the index knows no cuisines or styles; matched under the filter instead
+                rows = lexical.lookup(name)
+                if rows:
+                    found[i][0].extend(lexical.hit(r, 1.0) for r in rows)
+                else:
+                    threshold = settings.LEXICAL_FUZZY_THRESHOLD
+                    found[i][2].extend((lexical.hit(r, 0.0), s) for r, s in lexical.fuzzy(name, k, threshold))
+    pending = [i for i, f in enumerate(found) if not f[0]]
+    return lexical is not None, found, pending
+
+
+def _merge_pending(found: List[Found], pending: List[int], results: List[Found], ks: Sequence[int]) -> List[List[Hit]]:
+    for i, (exact, nearest, fuzzy) in zip(pending, results):
+        found[i][0].extend(exact)
+        found[i][1].extend(nearest)
+        found[i][2].extend(fuzzy)
+    return [_combine(f, k) for f, k in zip(found, ks)]
+
+
+def _search(names: List[str], qvs: np.ndarray, ks: List[int], wheres: List[Optional[SearchFilter]],
+            lexical: bool) -> List[Found]:
+    passes = _passes(names, qvs, ks, lexical, wheres)
+    if settings.RETRIEVAL_BACKEND == "numpy":
+        return _scatter(len(names), passes, _retrieve_numpy_passes(passes))
+    return _scatter(len(names), passes, _retrieve_pgvector(passes))
+
+
+async def _asearch(names: List[str], qvs: np.ndarray, ks: List[int], wheres: List[Optional[SearchFilter]],
+                   lexical: bool) -> List[Found]:
+    passes = _passes(names, qvs, ks, lexical, wheres)
+    if settings.RETRIEVAL_BACKEND == "numpy":
+        # a brute-force scan over a large snapshot is CPU-bound, keep it off the loop
+        return _scatter(len(names), passes, await asyncio.to_thread(_retrieve_numpy_passes, passes))
+    return _scatter(len(names), passes, await _aretrieve_pgvector(passes))
+
+
+def _relaxed(js: List[int], names, qvs, ks, wheres) -> Tuple[List[str], np.ndarray, List[int], List]:
+    # the fallback queries, with only the cuisine of their filter
+    return [names[j] for j in js], qvs[js], [ks[j] for j in js], [wheres[j].relaxed() for j in js]
+
+
+def retrieve_hits_batch(dish_names: List[str], ks: Sequence[int], query_vectors=None,
+                        wheres: Optional[Sequence[Optional[SearchFilter]]] = None) -> List[List[Hit]]:
+    """Retrieve raw hits for many queries in one pass, without building Pydantic models.
+
+    Names with an exact name/alias match in the lexical index are answered without
+    encoding or querying; the rest are embedded and searched together, restricted to
+    the cuisine and style in ``wheres`` (one SearchFilter or None per name).
+    """
+    if not dish_names:
+        return []
+    wheres = list(wheres) if wheres is not None else [None] * len(dish_names)
+    lexical, found, pending = _lexical_pass(dish_names, ks, wheres)
+    results: List[Found] = []
+    if pending:
+        names = [dish_names[i] for i in pending]
+        pks = [ks[i] for i in pending]
+        pwheres = [wheres[i] for i in pending]
+        if query_vectors is not None:
+            qvs = np.asarray(query_vectors)[pending]
+        else:
+            # a lone query goes through the micro-batcher so it coalesces with concurrent requests
+            with timed("embed"):
+                qvs = embed_text(names[0])[None, :] if len(names) == 1 else embed_texts(names)
+        results = _search(names, qvs, pks, pwheres, lexical)
+        retry = _fallbacks(pwheres, results, pks)
+        if retry:
+            # the lexical pass skipped these, so their exact and trigram matches come from the backend
+            for j, f in zip(retry, _search(*_relaxed(retry, names, qvs, pks, pwheres), lexical=False)):
+                results[j] = f
+    return _merge_pending(found, pending, results, ks)
+
+
 def retrieve_candidates(dish_name: str, k: int = 5) -> List[Tuple[Candidate, Nutrients]]:
     if not dish_name:
         return []
 
-    model = get_model()
-    query_vector = model.encode([dish_name], normalize_embeddings=False)[0]
-    query_vector = np.asarray(query_vector, dtype=np.float32)
-
-    with engine.connect() as conn:
-        # Exact/alias match query
-        exact_match_query = text("""
-            SELECT d.dish_id, d.name, n.kcal, n.protein_g, n.carbs_g, n.fat_g, n.fiber_g, n.sugar_g, n.sodium_mg,
-                   1.0 AS sim
-              FROM dishes d
-              JOIN nutrients n ON n.dish_id = d.dish_id
-             WHERE lower(d.name) = :name OR :name = ANY(d.aliases)
-        """)
-        exact_matches = conn.execute(exact_match_query, {"name": dish_name.lower()}).fetchall()
-
-        # Vector similarity query
-        # For now, let's temporarily use a simpler approach without vector search
-        # since we're having issues with the pgvector syntax
-        vector_query = text("""
-            SELECT d.dish_id, d.name, n.kcal, n.protein_g, n.carbs_g, n.fat_g, n.fiber_g, n.sugar_g, n.sodium_mg,
-                   0.8 AS sim
-              FROM dishes d
-              JOIN nutrients n ON n.dish_id = d.dish_id
-              LIMIT :k
-        """)
-        vector_matches = conn.execute(vector_query, {"k": k}).fetchall()
-
-    # Process results
-    results = []
-    seen_dish_ids = set()
-
-    for row in exact_matches:
-        candidate = Candidate(dish_id=row["dish_id"], name=row["name"], sim=1.0)
-        nutrients = Nutrients(
-            calories=row["kcal"],
-            protein_g=row["protein_g"],
-            carbs_g=row["carbs_g"],
-            fat_g=row["fat_g"],
-            fiber_g=row["fiber_g"],
-            sugar_g=row["sugar_g"],
-            sodium_mg=row["sodium_mg"],
-        )
-        results.append((candidate, nutrients))
-        seen_dish_ids.add(row["dish_id"])
-
-    for row in vector_matches:
-        if row["dish_id"] in seen_dish_ids:
-            continue
-        candidate = Candidate(dish_id=row["dish_id"], name=row["name"], sim=min(1.0, max(0.0, row["sim"])))
-        nutrients = Nutrients(
-            calories=row["kcal"],
-            protein_g=row["protein_g"],
-            carbs_g=row["carbs_g"],
-            fat_g=row["fat_g"],
-            fiber_g=row["fiber_g"],
-            sugar_g=row["sugar_g"],
-            sodium_mg=row["sodium_mg"],
-        )
-        results.append((candidate, nutrients))
-
-    return results
+    hits = retrieve_hits_batch([dish_name], [k])[0]
+    return [_make_pair(*h) for h in hits]
+
+
+async def aretrieve_hits_batch(dish_names: List[str], ks: Sequence[int], query_vectors=None,
+                               wheres: Optional[Sequence[Optional[SearchFilter]]] = None) -> List[List[Hit]]:
+    """Async ``retrieve_hits_batch``: awaits the embedding and the database, never blocks the loop."""
+    if not dish_names:
+        return []
+    wheres = list(wheres) if wheres is not None else [None] * len(dish_names)
+    lexical, found, pending = _lexical_pass(dish_names, ks, wheres)
+    results: List[Found] = []
+    if pending:
+        names = [dish_names[i] for i in pending]
+        pks = [ks[i] for i in pending]
+        pwheres = [wheres[i] for i in pending]
+        if query_vectors is not None:
+            qvs = np.asarray(query_vectors)[pending]
+        else:
+            with timed("embed"):
+                if len(names) == 1:
+                    qvs = (await aembed_text(names[0]))[None, :]
+                else:
+                    qvs = await aembed_texts(names)
+        results = await _asearch(names, qvs, pks, pwheres, lexical)
+        retry = _fallbacks(pwheres, results, pks)
+        if retry:
+            for j, f in zip(retry, await _asearch(*_relaxed(retry, names, qvs, pks, pwheres), lexical=False)):
+                results[j] = f
+    return _merge_pending(found, pending, results, ks)
+
+
+async def aretrieve_candidates(dish_name: str, k: int = 5) -> List[Tuple[Candidate, Nutrients]]:
+    if not dish_name:
+        return []
+
+    hits = (await aretrieve_hits_batch([dish_name], [k]))[0]
+    return [_make_pair(*h) for h in hits]
+
+
+async def asearch_candidates(dish_name: str, k: int = 5, where: Optional[SearchFilter] = None) -> List[Candidate]:
+    """Candidates only, for search responses that carry no nutrients.
+
+    Identical searches in flight at the same time share one retrieval.
+    """
+    if not dish_name:
+        return []
+
+    async def search():
+        hits = (await aretrieve_hits_batch([dish_name], [k], wheres=[where]))[0]
+        return [_candidate(*h[:3]) for h in hits]
+
+    return await SEARCH_FLIGHTS.do((normalize_query(dish_name), k, where), search)
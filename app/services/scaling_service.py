@@ -1,14 +1,12 @@
-from app.schemas.label import Nutrients
+import numpy as np
+from app.utils.metrics import timed_fn
 
-def scale_nutrients(n0: Nutrients, target_calories: float) -> Nutrients:
-    s = target_calories / max(n0.calories, 1e-6)
-    def mul(x): return None if x is None else x * s
-    return Nutrients(
-        calories=target_calories,
-        protein_g=mul(n0.protein_g),
-        carbs_g=mul(n0.carbs_g),
-        fat_g=mul(n0.fat_g),
-        fiber_g=mul(n0.fiber_g),
-        sugar_g=mul(n0.sugar_g),
-        sodium_mg=mul(n0.sodium_mg),
-    )
+@timed_fn("scale")
+def scale_nutrient_matrix(base: np.ndarray, target_calories: np.ndarray) -> np.ndarray:
+    """Rescale rows of (kcal, protein_g, ..., sodium_mg) to each row's target kcal; NaN stays NaN."""
+    target = np.asarray(target_calories, dtype=np.float64)
+    base = np.asarray(base, dtype=np.float64)
+    s = target / np.maximum(base[:, 0], 1e-6)
+    out = base * s[:, None]
+    out[:, 0] = target
+    return out
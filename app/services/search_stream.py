@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from typing import AsyncIterator, List, Optional, Tuple
+
+import orjson
+
+from app.core.settings import settings
+from app.services.partitions import SearchFilter, search_filter
+from app.services.retrieval_service import aretrieve_hits_batch
+from app.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SEARCH_BATCH_ITEMS = REGISTRY.counter(
+    "search_batch_items", "Queries answered by POST /dishes/search/batch.", labels=("outcome",)
+)
+
+MAX_K = 50
+
+# (line number, query, k, filter, error)
+Item = Tuple[int, Optional[str], int, Optional[SearchFilter], Optional[str]]
+
+
+async def ndjson_lines(body: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[Optional[bytes]]:
+    """Non-blank lines of a streamed body.
+
+    A line longer than ``max_bytes`` comes out as None and is dropped as it arrives
+    instead of being buffered.
+    """
+    buf = b""
+    skipping = False
+    async for data in body:
+        lines = (buf + data).split(b"\n")
+        buf = lines.pop()
+        for line in lines:
+            if skipping:
+                skipping = False
+                yield None
+            elif len(line) > max_bytes:
+                yield None
+            elif line.strip():
+                yield line
+        if len(buf) > max_bytes:
+            buf, skipping = b"", True
+    if skipping:
+        yield None
+    elif buf.strip():
+        yield buf
+
+
+def parse_query(line: Optional[bytes], default_k: int,
+                default_where: Optional[SearchFilter] = None) -> Tuple[str, int, Optional[SearchFilter]]:
+    """``"name"`` or ``{"q": "name", "k": 5, "cuisine": ..., "style": ...}``; raises ValueError.
+
+    A line's own cuisine or style replaces the request's default for that facet.
+    """
+    if line is None:
+        raise ValueError("line too long")
+    obj = orjson.loads(line)
+    k, where = default_k, default_where
+    if isinstance(obj, dict):
+        k = obj.get("k", default_k)
+        if "cuisine" in obj or "style" in obj:
+            cuisine = obj.get("cuisine", where and where.cuisine)
+            style = obj.get("style", where and where.style)
+            if not all(v is None or isinstance(v, str) for v in (cuisine, style)):
+                raise ValueError("cuisine and style must be strings")
+            where = search_filter(cuisine=cuisine, style=style)
+        obj = obj.get("q")
+    if not isinstance(obj, str) or not obj.strip():
+        raise ValueError("expected a non-empty query string")
+    if isinstance(k, bool) or not isinstance(k, int) or not 1 <= k <= MAX_K:
+        raise ValueError(f"k must be an integer from 1 to {MAX_K}")
+    return obj, k, where
+
+
+def _error(i: int, message: str) -> bytes:
+    return orjson.dumps({"i": i, "error": message})
+
+
+async def _search_chunk(items: List[Item]) -> bytes:
+    queries = [(i, q, k, where) for i, q, k, where, err in items if err is None and q is not None]
+    hits = None
+    if queries:
+        try:
+            hits = dict(zip(
+                (i for i, _, _, _ in queries),
+                await aretrieve_hits_batch(
+                    [q for _, q, _, _ in queries], [k for _, _, k, _ in queries],
+                    wheres=[where for _, _, _, where in queries],
+                ),
+            ))
+        except Exception:
+            logger.exception("batch search failed for %d queries", len(queries))
+    out = []
+    for i, q, k, _, err in items:
+        if err is None and hits is not None:
+            # plain dicts: no response model to validate on the way out
+            candidates = [
+                {"dish_id": str(dish_id), "name": str(name), "sim": min(1.0, max(0.0, float(sim)))}
+                for dish_id, name, sim, _, _ in hits[i]
+            ]
+            out.append(orjson.dumps({"i": i, "q": q, "candidates": candidates}))
+        else:
+            out.append(_error(i, err or "search failed"))
+    ok = len(queries) if hits is not None else 0
+    SEARCH_BATCH_ITEMS.inc(float(ok), "ok")
+    SEARCH_BATCH_ITEMS.inc(float(len(items) - ok), "error")
+    return b"\n".join(out) + b"\n"
+
+
+async def search_stream(body: AsyncIterator[bytes], default_k: int,
+                        default_where: Optional[SearchFilter] = None) -> AsyncIterator[bytes]:
+    """NDJSON results for an NDJSON stream of queries, one output chunk per input chunk.
+
+    Lines are read in chunks of SEARCH_BATCH_CHUNK and each chunk is retrieved in one
+    pass. The next chunk is read while the current one is searched, and reading stops
+    while the client is not taking results, so at most three chunks are held. Output
+    line ``i`` answers input line ``i`` (counting non-blank lines from 0), with either
+    ``candidates`` or an ``error``.
+    """
+    chunks: "asyncio.Queue" = asyncio.Queue(maxsize=1)
+
+    async def read() -> None:
+        try:
+            chunk: List[Item] = []
+            i = 0
+            async for line in ndjson_lines(body, settings.SEARCH_BATCH_MAX_LINE_BYTES):
+                try:
+                    q, k, where = parse_query(line, default_k, default_where)
+                    chunk.append((i, q, k, where, None))
+                except ValueError as e:
+                    chunk.append((i, None, 0, None, str(e)))
+                i += 1
+                if len(chunk) >= settings.SEARCH_BATCH_CHUNK:
+                    await chunks.put(chunk)
+                    chunk = []
+            if chunk:
+                await chunks.put(chunk)
+            await chunks.put(None)
+        except Exception as e:
+            await chunks.put(e)
+
+    reader = asyncio.ensure_future(read())
+    try:
+        while True:
+            chunk = await chunks.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield await _search_chunk(chunk)
+    finally:
+        reader.cancel()
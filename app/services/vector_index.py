@@ -0,0 +1,492 @@
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Literal, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from app.core.settings import settings
+from app.db.models import CATALOG_VERSION, NUTRIENT_FIELDS
+from app.services.mixture_service import PRIOR_MACROS, parse_macro_priors
+from app.services.nutrient_matrix import NutrientMatrix
+from app.services.partitions import Partitions, Rows, SearchFilter, matches, normalize_facet
+from app.services.quantization import PRECISIONS, approx_scores, check_precision, quantize
+
+EMBEDDING_DIM = 384
+
+# grouped by cuisine and style, so each partition is a contiguous range of the snapshot
+SNAPSHOT_QUERY = text("""
+    SELECT d.dish_id, d.name, d.aliases, d.macro_priors, d.cuisine, d.style, e.vector::real[] AS vector,
+           n.kcal, n.protein_g, n.carbs_g, n.fat_g, n.fiber_g, n.sugar_g, n.sodium_mg
+      FROM dishes d
+      JOIN nutrients n ON n.dish_id = d.dish_id
+      LEFT JOIN embeddings e ON e.dish_id = d.dish_id
+     ORDER BY d.cuisine, d.style, d.dish_id
+""")
+
+# the same columns for a set of dishes, for applying catalog changes to a snapshot
+SNAPSHOT_ROWS_QUERY = text("""
+    SELECT d.dish_id, d.name, d.aliases, d.macro_priors, d.cuisine, d.style, e.vector::real[] AS vector,
+           n.kcal, n.protein_g, n.carbs_g, n.fat_g, n.fiber_g, n.sugar_g, n.sodium_mg
+      FROM dishes d
+      JOIN nutrients n ON n.dish_id = d.dish_id
+      LEFT JOIN embeddings e ON e.dish_id = d.dish_id
+     WHERE d.dish_id = ANY(CAST(:ids AS uuid[]))
+     ORDER BY d.dish_id
+""")
+
+
+def save_arrays(path: str, arrays: Dict[str, np.ndarray]) -> None:
+    """Write each array as ``path/<fname>`` via a temp name and a rename.
+
+    Each file is replaced atomically, so no reader opens a half-written one; the
+    snapshot as a whole is not, and loaders hold ``snapshot_lock`` to read its files
+    from one build.
+    """
+    os.makedirs(path, exist_ok=True)
+    for fname, arr in arrays.items():
+        tmp = os.path.join(path, fname + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(arr))
+        os.replace(tmp, os.path.join(path, fname))
+
+
+def _read_text(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def code_arrays(precision: str, codes: np.ndarray, scales: Optional[np.ndarray]) -> Dict[str, np.ndarray]:
+    arrays = {f"codes_{precision}.npy": codes}
+    if scales is not None:
+        arrays[f"scales_{precision}.npy"] = scales
+    return arrays
+
+
+def write_codes(path: str, vectors: np.ndarray, precision: str) -> None:
+    codes, scales = quantize(vectors, precision)
+    if codes is not None:
+        save_arrays(path, code_arrays(precision, codes, scales))
+
+
+def id_order(dish_ids: np.ndarray) -> Optional[np.ndarray]:
+    """None when ``dish_ids`` is already sorted, else an argsort."""
+    if len(dish_ids) < 2 or bool(np.all(dish_ids[:-1] <= dish_ids[1:])):
+        return None
+    return np.argsort(dish_ids, kind="stable")
+
+
+def find_rows(dish_ids: np.ndarray, order: Optional[np.ndarray], wanted: Iterable[str]) -> np.ndarray:
+    """Sorted rows of ``dish_ids`` holding any of ``wanted``; ids not present are skipped."""
+    wanted = np.asarray(list(wanted), dtype=str)
+    if not len(dish_ids) or not len(wanted):
+        return np.empty(0, dtype=np.int64)
+    ids = dish_ids if order is None else dish_ids[order]
+    pos = np.minimum(np.searchsorted(ids, wanted), len(ids) - 1)
+    pos = pos[ids[pos] == wanted]
+    return np.unique(pos if order is None else order[pos]).astype(np.int64)
+
+
+def _normalize_rows(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+class VectorIndex:
+    """Exact cosine top-k over a contiguous float32 (dish_count x dim) matrix.
+
+    Rows are L2-normalized at build time so a query is one mat-vec product plus an
+    argpartition. The snapshot directory holds plain .npy files that are opened
+    memory-mapped, so loading is O(1) and pages are shared through the OS cache: every
+    worker process mapping the same directory reads one copy. Aliases are read with the
+    rest of the snapshot but only parsed, and the exact-name map built, when something
+    asks for them.
+
+    With a compact ``precision`` (see quantization.py) the first pass scans the codes
+    for ``rerank_factor * k`` rows and only those are re-scored in float32, so the full
+    matrix can stay on disk and only the codes need to be resident.
+
+    Rows carry a normalized cuisine and style, and a SearchFilter restricts a search to
+    the partition it selects (see partitions.py).
+    """
+
+    def __init__(
+        self,
+        dish_ids: np.ndarray,
+        names: np.ndarray,
+        vectors: np.ndarray,
+        nutrients: np.ndarray,
+        aliases: Optional[List[List[str]]] = None,
+        priors: Optional[np.ndarray] = None,
+        precision: str = "float32",
+        codes: Optional[np.ndarray] = None,
+        scales: Optional[np.ndarray] = None,
+        rerank_factor: int = 4,
+        density: Optional[np.ndarray] = None,
+        aliases_json: Optional[str] = None,
+        cuisines: Optional[np.ndarray] = None,
+        styles: Optional[np.ndarray] = None,
+        missing: Optional[np.ndarray] = None,
+    ):
+        self.dish_ids = dish_ids
+        self.names = names
+        self.vectors = vectors
+        self.nutrients = nutrients
+        self._aliases = aliases
+        self._aliases_json = aliases_json
+        if priors is None:
+            priors = np.full((len(dish_ids), len(PRIOR_MACROS)), np.nan, dtype=np.float32)
+        self.priors = priors
+        self.matrix = NutrientMatrix(nutrients, priors, density)
+        self.precision = check_precision(precision)
+        self.rerank_factor = max(1, rerank_factor)
+        if codes is None and precision != "float32":
+            codes, scales = quantize(vectors, precision)
+        self.codes = codes
+        self.scales = scales
+        # snapshots from before migration 0008 have neither; every row is then unlabelled
+        blank = np.full(len(dish_ids), "", dtype=str)
+        self.cuisines = cuisines if cuisines is not None else blank
+        self.styles = styles if styles is not None else blank
+        self._partitions: Optional[Partitions] = None
+        # rows without an embedding are all-zero; keep them out of similarity results.
+        # ``missing`` lists them (snapshots store it) so the matrix need not be read for it
+        if missing is None:
+            missing = np.flatnonzero(np.einsum("ij,ij->i", vectors, vectors) == 0)
+        self._missing: Optional[np.ndarray] = None
+        if len(missing):
+            self._missing = np.zeros(len(dish_ids), dtype=bool)
+            self._missing[missing] = True
+        self._exact: Optional[Dict[str, List[int]]] = None
+        self._id_order: Optional[Tuple[Optional[np.ndarray]]] = None  # (id_order(dish_ids),) once computed
+        self.path: Optional[str] = None  # snapshot directory, when loaded from one
+        self.catalog_version: Optional[int] = None  # catalog_state.version the rows were read at
+
+    def __len__(self) -> int:
+        return len(self.dish_ids)
+
+    @property
+    def aliases(self) -> List[List[str]]:
+        if self._aliases is None:
+            if self._aliases_json is not None:
+                self._aliases = json.loads(self._aliases_json)
+                self._aliases_json = None
+            else:
+                self._aliases = [[] for _ in range(len(self.dish_ids))]
+        return self._aliases
+
+    def _exact_map(self) -> Dict[str, List[int]]:
+        if self._exact is None:
+            exact: Dict[str, List[int]] = {}
+            aliases = self.aliases
+            for i, name in enumerate(self.names):
+                exact.setdefault(str(name).lower(), []).append(i)
+                for alias in aliases[i]:
+                    rows = exact.setdefault(alias.lower(), [])
+                    if i not in rows:
+                        rows.append(i)
+            self._exact = exact
+        return self._exact
+
+    @classmethod
+    def from_rows(cls, rows) -> "VectorIndex":
+        dish_ids, names, aliases, vecs, nuts, priors, cuisines, styles = [], [], [], [], [], [], [], []
+        missing = []
+        for i, row in enumerate(rows):
+            dish_ids.append(str(row.dish_id))
+            names.append(row.name)
+            cuisines.append(normalize_facet(getattr(row, "cuisine", None)))
+            styles.append(normalize_facet(getattr(row, "style", None)))
+            aliases.append(list(row.aliases or []))
+            if row.vector is None:
+                missing.append(i)
+            vecs.append(row.vector if row.vector is not None else [0.0] * EMBEDDING_DIM)
+            nuts.append([np.nan if getattr(row, f) is None else getattr(row, f) for f in NUTRIENT_FIELDS])
+            priors.append(parse_macro_priors(row.macro_priors))
+        vectors = np.ascontiguousarray(
+            _normalize_rows(np.asarray(vecs, dtype=np.float32).reshape(-1, EMBEDDING_DIM))
+        )
+        return cls(
+            dish_ids=np.asarray(dish_ids, dtype=str),
+            names=np.asarray(names, dtype=str),
+            vectors=vectors,
+            nutrients=np.asarray(nuts, dtype=np.float32).reshape(-1, len(NUTRIENT_FIELDS)),
+            aliases=aliases,
+            priors=np.asarray(priors, dtype=np.float32).reshape(-1, len(PRIOR_MACROS)),
+            cuisines=np.asarray(cuisines, dtype=str),
+            styles=np.asarray(styles, dtype=str),
+            missing=np.asarray(missing, dtype=np.int64),
+        )
+
+    @classmethod
+    def from_db(cls, engine) -> "VectorIndex":
+        with engine.connect() as conn:
+            # read first, so the rows are at least this new; changes after it are applied again
+            version = conn.execute(text(CATALOG_VERSION)).scalar()
+            rows = conn.execution_options(stream_results=True, yield_per=10_000).execute(SNAPSHOT_QUERY)
+            index = cls.from_rows(rows)
+        index.catalog_version = version
+        return index
+
+    def save(self, path: str) -> None:
+        from app.services.lexical_index import LexicalIndex
+
+        save_arrays(path, {
+            "vectors.npy": self.vectors,
+            "nutrients.npy": self.nutrients,
+            "dish_ids.npy": self.dish_ids,
+            "names.npy": self.names,
+            "priors.npy": self.priors,
+            "density.npy": self.matrix.density,
+            "cuisines.npy": self.cuisines,
+            "styles.npy": self.styles,
+            "missing.npy": self.missing_rows(),
+        })
+        # the lexical index is derived from the same rows; workers map it instead of building it
+        LexicalIndex.from_vector_index(self).save(os.path.join(path, "lexical"))
+        tmp = os.path.join(path, "aliases.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.aliases, f)
+        os.replace(tmp, os.path.join(path, "aliases.json"))
+        # codes of the previous snapshot no longer match its rows
+        for precision in PRECISIONS:
+            for fname in (f"codes_{precision}.npy", f"scales_{precision}.npy"):
+                if os.path.exists(os.path.join(path, fname)):
+                    os.remove(os.path.join(path, fname))
+        if self.codes is not None:
+            save_arrays(path, code_arrays(self.precision, self.codes, self.scales))
+        tmp = os.path.join(path, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"catalog_version": self.catalog_version}, f)
+        os.replace(tmp, os.path.join(path, "meta.json"))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, precision: str = "float32", rerank_factor: int = 4) -> "VectorIndex":
+        mode: Optional[Literal["r"]] = "r" if mmap else None
+
+        def optional(fname):
+            p = os.path.join(path, fname)
+            return np.load(p, mmap_mode=mode) if os.path.exists(p) else None
+
+        # codes are scanned on every query; mapped, they stay in the shared page cache
+        codes = optional(f"codes_{precision}.npy") if precision != "float32" else None
+        index = cls(
+            dish_ids=np.load(os.path.join(path, "dish_ids.npy"), mmap_mode=mode),
+            names=np.load(os.path.join(path, "names.npy"), mmap_mode=mode),
+            vectors=np.load(os.path.join(path, "vectors.npy"), mmap_mode=mode),
+            nutrients=np.load(os.path.join(path, "nutrients.npy"), mmap_mode=mode),
+            priors=optional("priors.npy"),
+            precision=precision,
+            codes=codes,
+            scales=optional(f"scales_{precision}.npy") if codes is not None else None,
+            rerank_factor=rerank_factor,
+            density=optional("density.npy"),
+            # read now, under the loader's lock: read on first use, a rebuild in between could
+            # pair another snapshot's aliases with these rows
+            aliases_json=_read_text(os.path.join(path, "aliases.json")),
+            cuisines=optional("cuisines.npy"),
+            styles=optional("styles.npy"),
+            missing=optional("missing.npy"),
+        )
+        index.path = path
+        index.catalog_version = snapshot_version(path)
+        return index
+
+    def missing_rows(self) -> np.ndarray:
+        """Indices of the rows without an embedding."""
+        return np.flatnonzero(self._missing) if self._missing is not None else np.zeros(0, dtype=np.int64)
+
+    def lookup(self, name: str) -> List[int]:
+        return self._exact_map().get(name.lower(), [])
+
+    def hit(self, i: int, sim: float):
+        return self.dish_ids[i], self.names[i], sim, self.matrix, i
+
+    @property
+    def partitions(self) -> Partitions:
+        if self._partitions is None:
+            self._partitions = Partitions(self.cuisines, self.styles)
+        return self._partitions
+
+    def matches(self, i: int, where: SearchFilter) -> bool:
+        return matches(str(self.cuisines[i]), str(self.styles[i]), where)
+
+    def rows_of(self, dish_ids: Iterable[str]) -> np.ndarray:
+        if self._id_order is None:
+            self._id_order = (id_order(self.dish_ids),)
+        return find_rows(self.dish_ids, self._id_order[0], dish_ids)
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        top, sims = self.search_batch(np.asarray(query, dtype=np.float32).reshape(1, -1), k)
+        keep = top[0] >= 0
+        return top[0][keep], sims[0][keep]
+
+    def search_batch(self, queries: np.ndarray, k: int, exclude: Optional[np.ndarray] = None,
+                     where: Optional[SearchFilter] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k rows for each query row, never any in ``exclude``; short results are padded with index -1.
+
+        With ``where`` only the rows of that partition are scored: a contiguous one is a
+        view of the (mapped) matrix, others are gathered.
+        """
+        if exclude is not None and not len(exclude):
+            exclude = None
+        rows = None if where is None else self.partitions.rows(where)
+        vectors, codes, scales, missing = self.vectors, self.codes, self.scales, self._missing
+        local_exclude = exclude
+        if rows is not None:
+            vectors = vectors[rows]
+            codes = codes[rows] if codes is not None else None
+            scales = scales[rows] if scales is not None else None
+            missing = missing[rows] if missing is not None else None
+            local_exclude = _local_rows(rows, exclude) if exclude is not None else None
+        n = len(vectors)
+        dim = self.vectors.shape[1] if len(self.vectors) else EMBEDDING_DIM
+        q = np.asarray(queries, dtype=np.float32).reshape(-1, dim)
+        b = q.shape[0]
+        k = max(0, min(k, n - (int(missing.sum()) if missing is not None else 0)))
+        top = np.full((b, k), -1, dtype=np.int64)
+        out = np.full((b, k), -np.inf, dtype=np.float32)
+        if k == 0 or b == 0:
+            return top, out
+        q = _normalize_rows(q)
+        # bound the (chunk x n) score matrix to ~64MB regardless of catalog size
+        chunk = max(1, (1 << 24) // n)
+        for start in range(0, b, chunk):
+            qc = q[start:start + chunk]
+            if codes is None:
+                sims = qc @ vectors.T
+            else:
+                sims = approx_scores(qc, codes, scales, self.precision)
+            if missing is not None:
+                sims[:, missing] = -np.inf
+            if local_exclude is not None:
+                sims[:, local_exclude] = -np.inf
+            if codes is None:
+                idx = _top_k(sims, k)
+                scores = np.take_along_axis(sims, idx, axis=1)
+                idx = _global_rows(rows, idx)
+            else:
+                shortlist = _global_rows(rows, _top_k(sims, min(n, k * self.rerank_factor)))
+                idx, scores = self._rerank(qc, shortlist, k, exclude)
+            if exclude is not None:
+                idx = np.where(np.isfinite(scores), idx, -1)
+            top[start:start + chunk] = idx
+            out[start:start + chunk] = scores
+        return top, out
+
+    def _rerank(self, queries: np.ndarray, shortlist: np.ndarray, k: int,
+                exclude: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-score each query's shortlist against the float32 rows; returns (top-k rows, scores)."""
+        rows = np.sort(np.unique(shortlist))  # sorted reads are kinder to a memory-mapped matrix
+        full = np.asarray(self.vectors[rows], dtype=np.float32)
+        pos = np.searchsorted(rows, shortlist)
+        sims = np.einsum("bd,bmd->bm", queries, full[pos])
+        if self._missing is not None:
+            sims[self._missing[shortlist]] = -np.inf
+        if exclude is not None:
+            sims[np.isin(shortlist, exclude)] = -np.inf
+        order = _top_k(sims, k)
+        return np.take_along_axis(shortlist, order, axis=1), np.take_along_axis(sims, order, axis=1)
+
+
+def _global_rows(rows: Optional[Rows], idx: np.ndarray) -> np.ndarray:
+    """Index rows for positions within a partition's rows."""
+    if rows is None:
+        return idx
+    if isinstance(rows, slice):
+        return idx + rows.start
+    return rows[idx]
+
+
+def _local_rows(rows: Rows, index_rows: np.ndarray) -> np.ndarray:
+    """Positions within a partition's rows of those index rows that fall in it."""
+    if isinstance(rows, slice):
+        inside = index_rows[(index_rows >= rows.start) & (index_rows < rows.stop)]
+        return inside - rows.start
+    if not len(rows):
+        return np.empty(0, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(rows, index_rows), len(rows) - 1)
+    return pos[rows[pos] == index_rows]
+
+
+def _top_k(sims: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of each row's k largest values, best first."""
+    if k >= sims.shape[1]:
+        return np.argsort(-sims, axis=1, kind="stable")
+    part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(sims, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+_index: Optional[VectorIndex] = None
+
+
+def build_snapshot(path: Optional[str] = None) -> VectorIndex:
+    from app.db.session import engine
+
+    path = path or settings.VECTOR_INDEX_PATH
+    index = VectorIndex.from_db(engine)
+    index.save(path)
+    # quantized here, under the builder's lock, rather than by whichever worker loads it first
+    write_codes(path, index.vectors, settings.EMBEDDING_PRECISION)
+    return index
+
+
+def snapshot_version(path: str) -> Optional[int]:
+    try:
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            return json.load(f).get("catalog_version")
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def snapshot_lock(path: str, exclusive: bool = False):
+    """Builders hold it exclusively; loaders share it so they never map a half-replaced snapshot."""
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, ".build.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+def ensure_codes(path: str, precision: str) -> None:
+    """Quantize the snapshot's vectors to ``precision`` once, so every worker maps the same codes.
+
+    Written under the exclusive lock: a snapshot saved at another precision has none yet,
+    and workers starting together must neither race on the files nor quantize it each.
+    """
+    if precision == "float32" or os.path.exists(os.path.join(path, f"codes_{precision}.npy")):
+        return
+    with snapshot_lock(path, exclusive=True):
+        if not os.path.exists(os.path.join(path, f"codes_{precision}.npy")):
+            write_codes(path, np.load(os.path.join(path, "vectors.npy"), mmap_mode="r"), precision)
+
+
+def load_index(path: Optional[str] = None, rebuild: bool = False, min_version: Optional[int] = None) -> VectorIndex:
+    """Map the snapshot at ``path``, building it first if missing or ``rebuild``.
+
+    With ``min_version`` a rebuild is skipped when the snapshot on disk is already at
+    least that new, so workers reacting to the same catalog change build it once.
+    """
+    global _index
+    path = path or settings.VECTOR_INDEX_PATH
+    if rebuild or not os.path.exists(os.path.join(path, "aliases.json")):
+        # workers starting together build the snapshot once; the rest wait and map it
+        with snapshot_lock(path, exclusive=True):
+            built = os.path.exists(os.path.join(path, "aliases.json"))
+            current = snapshot_version(path) if built else None
+            if not built or (rebuild and (min_version is None or current is None or current < min_version)):
+                build_snapshot(path)
+    ensure_codes(path, settings.EMBEDDING_PRECISION)
+    with snapshot_lock(path):
+        _index = VectorIndex.load(path, precision=settings.EMBEDDING_PRECISION, rerank_factor=settings.RERANK_FACTOR)
+    return _index
+
+
+def get_index() -> VectorIndex:
+    if _index is None:
+        return load_index()
+    return _index
@@ -0,0 +1,97 @@
+from app.core.settings import settings
+from app.db import ann_index
+from app.db.ann_index import (
+    AnnParams, create_index_sql, hnsw_ef_search, ivfflat_lists, ivfflat_probes, iterative_scan_mode, parse_index_meta,
+    query_params, supports_iterative_scan, tune_connection,
+)
+
+
+def test_ivfflat_lists_follow_row_count():
+    assert ivfflat_lists(0) == 1
+    assert ivfflat_lists(250_000) == 250
+    assert ivfflat_lists(4_000_000) == 2000
+
+
+def test_query_params_grow_with_target_recall(monkeypatch):
+    assert ivfflat_probes(1000, 0.9) < ivfflat_probes(1000, 0.95) < ivfflat_probes(1000, 0.99) <= 1000
+    assert ivfflat_probes(10, 0.5) == 1
+    assert hnsw_ef_search(0.9) < hnsw_ef_search(0.95) < hnsw_ef_search(0.99)
+    # ef_search bounds how many rows hnsw returns, so it never drops below the LIMIT
+    assert hnsw_ef_search(0.8, limit=100) == 100
+    monkeypatch.setattr(settings, "VECTOR_IVFFLAT_PROBES", 7)
+    monkeypatch.setattr(settings, "VECTOR_HNSW_EF_SEARCH", 300)
+    assert ivfflat_probes(1000, 0.99) == 7 and hnsw_ef_search(0.8) == 300
+
+
+def test_index_sql_and_metadata(monkeypatch):
+    sql = create_index_sql("vector", "ivfflat", 50_000, name="ix_new")
+    assert sql == ("CREATE INDEX CONCURRENTLY ix_new ON embeddings USING ivfflat "
+                   "(vector vector_cosine_ops) WITH (lists = 50)")
+    assert "hnsw (vector_bits bit_hamming_ops)" in create_index_sql("vector_bits", "hnsw", 10, concurrently=False)
+
+    monkeypatch.setattr(settings, "VECTOR_TARGET_RECALL", 0.95)
+    params = parse_index_meta(("ivfflat", ["lists=400"]))
+    assert params.method == "ivfflat" and params.lists == 400 and params.probes == ivfflat_probes(400, 0.95)
+    assert parse_index_meta(None).method is None
+    # filtered scans only continue past ef_search from pgvector 0.8 on
+    assert supports_iterative_scan("0.8.0") and supports_iterative_scan("1.0")
+    assert not supports_iterative_scan("0.7.4") and not supports_iterative_scan(None)
+
+    monkeypatch.setattr(ann_index, "current", AnnParams("hnsw", 0, 0, 64))
+    assert query_params(20) is None
+    assert query_params(200) == {"name": "hnsw.ef_search", "value": "200"}
+    monkeypatch.setattr(ann_index, "current", AnnParams("ivfflat", 100, 6, 0))
+    assert query_params(200) is None
+
+
+def test_filtered_queries_widen_without_iterative_scans(monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_FILTER_OVERFETCH", 10)
+    monkeypatch.setattr(ann_index, "current", AnnParams("hnsw", 0, 0, 64, iterative=True))
+    assert query_params(20, filtered=True) is None
+    monkeypatch.setattr(ann_index, "current", AnnParams("hnsw", 0, 0, 64))
+    assert query_params(20, filtered=True) == {"name": "hnsw.ef_search", "value": "200"}
+    monkeypatch.setattr(ann_index, "current", AnnParams("ivfflat", 100, 6, 0))
+    assert query_params(20, filtered=True) == {"name": "ivfflat.probes", "value": "60"}
+    assert query_params(20) is None
+
+
+class _Conn:
+    def __init__(self, meta, extversion="0.8.0"):
+        self.rows = {ann_index.INDEX_META_QUERY: meta, ann_index.PGVECTOR_VERSION_QUERY: (extversion,)}
+        self.executed, self.last = [], None
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+        self.last = self.rows.get(sql)
+
+    def fetchone(self):
+        return self.last
+
+    def close(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def test_iterative_scan_mode_is_checked_per_method(monkeypatch):
+    monkeypatch.setattr(ann_index, "current", AnnParams(None, 0, 0, 0))
+    monkeypatch.setattr(settings, "VECTOR_ITERATIVE_SCAN", "strict_order")
+    assert iterative_scan_mode("hnsw") == "strict_order" and iterative_scan_mode("ivfflat") is None
+    conn = _Conn(("ivfflat", ["lists=100"]))
+    tune_connection(conn, None)
+    assert conn.executed[-1].startswith("SET ivfflat.probes")
+    assert ann_index.current.method == "ivfflat" and not ann_index.current.iterative
+
+    monkeypatch.setattr(settings, "VECTOR_ITERATIVE_SCAN", "relaxed_order")
+    conn = _Conn(("ivfflat", ["lists=100"]))
+    tune_connection(conn, None)
+    assert conn.executed[-1] == "SET ivfflat.iterative_scan = relaxed_order" and ann_index.current.iterative
+    tune_connection(_Conn(("hnsw", []), extversion="0.7.4"), None)
+    assert ann_index.current.method == "hnsw" and not ann_index.current.iterative
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import threading
+
+from app.api import label_router
+from app.schemas.label import Candidate, LabelRequest, LabelResponse, Nutrients
+from app.services.audit_log import AuditLogger, _row_from_json, to_row
+
+
+def _resp(i=0):
+    return LabelResponse(
+        nutrients=Nutrients(calories=500.0 + i, protein_g=20.0),
+        confidence=0.8,
+        assumptions="test",
+        candidates=[Candidate(dish_id="id-1", name="ramen", sim=0.9, weight=1.0)],
+    )
+
+
+def test_batches_are_flushed_by_size_and_on_close(tmp_path):
+    batches = []
+    audit = AuditLogger(batches.append, batch_size=10, flush_interval_ms=10_000, spill_path=str(tmp_path / "s.jsonl"))
+    for i in range(25):
+        assert audit.submit(f"dish {i}", 100.0 + i, _resp(i))
+    audit.close()
+    rows = [r for b in batches for r in b]
+    assert [len(b) for b in batches][:2] == [10, 10]
+    assert [r[0] for r in rows] == [f"dish {i}" for i in range(25)]
+    assert '"dish_id": "id-1"' in rows[0][2] and '"calories": 500.0' in rows[0][3]
+    assert not audit.submit("late", 1.0, _resp())
+
+
+def test_full_queue_drops_or_blocks_per_policy(tmp_path):
+    release = threading.Event()
+
+    def slow_writer(rows):
+        release.wait(5)
+
+    audit = AuditLogger(slow_writer, max_queue=2, batch_size=1, flush_interval_ms=1, policy="drop",
+                        spill_path=str(tmp_path / "s.jsonl"))
+    results = [audit.submit(f"d{i}", 1.0, _resp()) for i in range(10)]
+    assert results.count(False) >= 5
+    release.set()
+    audit.close()
+
+    release.clear()
+    audit = AuditLogger(slow_writer, max_queue=1, batch_size=1, flush_interval_ms=1, policy="block",
+                        block_timeout_ms=5, spill_path=str(tmp_path / "s.jsonl"))
+    results = [asyncio.run(audit.asubmit(f"d{i}", 1.0, _resp())) for i in range(6)]
+    assert False in results
+    release.set()
+    audit.close()
+
+
+def test_failed_flushes_spill_and_replay(tmp_path):
+    spill = str(tmp_path / "spill.jsonl")
+    written, down = [], [True]
+
+    def writer(rows):
+        if down[0]:
+            raise ConnectionError("db down")
+        written.extend(rows)
+
+    audit = AuditLogger(writer, batch_size=4, flush_interval_ms=1, spill_path=spill, replay_interval_s=3600)
+    for i in range(6):
+        audit.submit(f"dish {i}", 100.0, _resp(i))
+    audit.close()
+    spilled = []
+    for path in (spill, spill + ".replay"):  # a failed replay attempt leaves its file aside
+        if os.path.exists(path):
+            with open(path) as f:
+                spilled += [_row_from_json(line) for line in f]
+    assert sorted(r[0] for r in spilled) == [f"dish {i}" for i in range(6)]
+
+    down[0] = False
+    audit._replay()
+    assert sorted(r[0] for r in written) == [f"dish {i}" for i in range(6)]
+    assert written[0][5].tzinfo is not None
+    assert not (tmp_path / "spill.jsonl").exists() and not (tmp_path / "spill.jsonl.replay").exists()
+
+
+def test_workers_sharing_a_spill_file_replay_it_once(tmp_path):
+    spill = str(tmp_path / "spill.jsonl")
+    written = []
+    other = AuditLogger(written.extend, batch_size=2, spill_path=spill)
+
+    def writer(rows):
+        # another worker's replay starting mid-way must neither re-read nor remove the file
+        other._replay()
+        written.extend(rows)
+
+    audit = AuditLogger(writer, batch_size=2, spill_path=spill)
+    audit._spill([to_row((f"dish {i}", 100.0, _resp(i), 0.0)) for i in range(5)])
+    audit._replay()
+    assert sorted(r[0] for r in written) == [f"dish {i}" for i in range(5)]
+    assert not (tmp_path / "spill.jsonl").exists() and not (tmp_path / "spill.jsonl.replay").exists()
+
+
+def test_async_spill_writes_off_the_event_loop(tmp_path):
+    release = threading.Event()
+    audit = AuditLogger(lambda rows: release.wait(5), max_queue=1, batch_size=1, flush_interval_ms=1,
+                        policy="spill", spill_path=str(tmp_path / "s.jsonl"))
+    spilled_on = []
+    spill = audit._spill
+
+    def record(rows):
+        spilled_on.append(threading.current_thread())
+        spill(rows)
+
+    audit._spill = record
+
+    async def submit_all():
+        return [await audit.asubmit(f"d{i}", 1.0, _resp()) for i in range(6)]
+
+    assert all(asyncio.run(submit_all()))
+    assert spilled_on and threading.main_thread() not in spilled_on
+    release.set()
+    audit.close()
+
+
+def test_error_fallbacks_are_audited(monkeypatch):
+    async def fail(reqs):
+        raise RuntimeError("db down")
+
+    audited = []
+
+    async def audit(reqs, resps):
+        audited.extend(zip(reqs, resps))
+
+    monkeypatch.setattr(label_router, "alabel_batch", fail)
+    monkeypatch.setattr(label_router, "audit_labels", audit)
+    resp = asyncio.run(label_router.create_label(LabelRequest(dish_name="ramen", calories=400)))
+    assert resp.candidates[0].dish_id == "error" and audited == [(audited[0][0], resp)]
@@ -0,0 +1,49 @@
+import numpy as np
+
+from benchmarks import compare, filtered
+from benchmarks.synthetic import HashingEncoder, dish_name, make_catalog, make_queries
+
+
+def test_synthetic_catalog_is_deterministic_and_unique():
+    a = make_catalog(3000, seed=4)
+    b = make_catalog(3000, seed=4)
+    assert len(set(a.names.tolist())) == 3000
+    assert len(set(a.dish_ids.tolist())) == 3000
+    assert np.array_equal(a.names, b.names) and np.array_equal(a.dish_ids, b.dish_ids)
+    assert np.allclose(a.vectors, b.vectors)
+    assert np.allclose(np.linalg.norm(a.vectors, axis=1), 1.0, atol=1e-5)
+    assert (a.nutrients[:, 0] > 0).all()
+    assert make_queries(a, 50, seed=1) == make_queries(b, 50, seed=1)
+    assert dish_name(10**6) != dish_name(10**6 + 1)
+
+
+def test_hashing_encoder_keeps_typos_close():
+    enc = HashingEncoder()
+    v = enc.encode(["spicy chicken pad thai", "spicy chiken pad thai", "beef lasagna"], normalize_embeddings=True)
+    assert v[0] @ v[1] > v[0] @ v[2]
+
+
+def _run(**stages):
+    return {"config": {"size": 10}, "results": [
+        {"stage": s, "p50_ms": p50, "throughput": thr} for s, (p50, thr) in stages.items()
+    ]}
+
+
+def test_compare_flags_latency_and_throughput_regressions():
+    base = _run(a=(1.0, 100.0), b=(1.0, 100.0), c=(1.0, 100.0), gone=(1.0, 1.0))
+    cur = _run(a=(1.1, 95.0), b=(1.3, 100.0), c=(1.0, 70.0), new=(5.0, 1.0))
+    lines, regressed = compare.compare(base, cur, threshold=0.15)
+    assert regressed == ["b", "c"]
+    assert any("gone" in line for line in lines)
+
+
+def test_partition_search_is_exact_where_post_filtering_falls_short():
+    catalog = make_catalog(3000, seed=2)
+    assert {"restaurant", "home", ""} <= set(catalog.styles)
+    queries = HashingEncoder().encode(make_queries(catalog, 20, seed=3), normalize_embeddings=True)
+    results = filtered.run(catalog, queries, k=5, overfetch=2, batch=4, precision="float32")
+    partition = {r["filter"]: r for r in results if r["strategy"] == "partition"}
+    post = {r["filter"]: r for r in results if r["strategy"] == "post-filter"}
+    assert set(partition) == {"none", "cuisine", "cuisine+style", "style"} and set(post) == set(partition) - {"none"}
+    assert all(r["recall"] == 1.0 for r in partition.values())
+    assert partition["cuisine"]["contiguous"] and post["cuisine+style"]["recall"] < 1.0
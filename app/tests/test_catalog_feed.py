@@ -0,0 +1,93 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.services import catalog_feed
+from app.services.catalog import parse_changes
+from app.services.catalog_feed import CatalogFeed, PatchedLexicalIndex, PatchedVectorIndex, patch
+from app.services.lexical_index import LexicalIndex
+from app.services.vector_index import EMBEDDING_DIM, VectorIndex
+
+
+def _row(i, name, rng, kcal=None):
+    return SimpleNamespace(
+        dish_id=f"id-{i:03d}", name=name, aliases=None, macro_priors=None,
+        vector=rng.normal(size=EMBEDDING_DIM).tolist(), kcal=kcal or 100.0 + i, protein_g=10.0,
+        carbs_g=20.0, fat_g=5.0, fiber_g=1.0, sugar_g=2.0, sodium_mg=300.0,
+    )
+
+
+def _ids(index, top):
+    return [[str(index.hit(i, 0.0)[0]) for i in row if i >= 0] for row in top]
+
+
+def test_patched_index_matches_a_rebuild():
+    rng = np.random.default_rng(0)
+    rows = {r.dish_id: r for r in (_row(i, f"dish {i}", rng) for i in range(200))}
+    base = VectorIndex.from_rows(rows.values())
+
+    # one update, one delete, one insert; then the updated dish changes again
+    rows["id-005"] = _row(5, "dish 5 renamed", rng)
+    del rows["id-010"]
+    rows["id-500"] = _row(500, "new dish", rng)
+    index = patch(base, ["id-005", "id-010", "id-500"], [rows["id-005"], rows["id-500"]], version=2)
+    rows["id-005"] = _row(5, "dish 5 again", rng, kcal=999.0)
+    index = patch(index, ["id-005"], [rows["id-005"]], version=3)
+    assert isinstance(index, PatchedVectorIndex) and index.base is base
+    assert len(index) == 200 and index.catalog_version == 3
+
+    rebuilt = VectorIndex.from_rows(sorted(rows.values(), key=lambda r: r.dish_id))
+    queries = np.stack([np.asarray(rows[d].vector, dtype=np.float32) for d in ("id-005", "id-500", "id-007")])
+    queries = np.concatenate([queries, np.asarray([base.vectors[10]])])  # the deleted dish
+    top, sims = index.search_batch(queries, 5)
+    want, want_sims = rebuilt.search_batch(queries, 5)
+    assert _ids(index, top) == _ids(rebuilt, want)
+    np.testing.assert_allclose(sims, want_sims, rtol=1e-5)
+
+    assert [index.hit(i, 1.0)[0] for i in index.lookup("dish 5 again")] == ["id-005"]
+    assert index.lookup("dish 5") == [] and index.lookup("dish 10") == []
+    dish_id, _, _, matrix, row = index.hit(index.lookup("dish 5 again")[0], 1.0)
+    assert matrix.values(row)[0] == 999.0
+
+
+def test_patched_lexical_index():
+    rng = np.random.default_rng(1)
+    rows = [_row(0, "Chicken Tikka Masala", rng), _row(1, "Chicken Korma", rng), _row(2, "Pho", rng)]
+    base = LexicalIndex.from_rows(rows, version=1)
+    index = patch(base, ["id-001", "id-003"], [_row(3, "Chicken Kofta", rng)], version=2)
+    assert isinstance(index, PatchedLexicalIndex) and index.version == 2 and len(index) == 3
+    assert index.lookup("chicken korma") == []
+    assert [index.hit(i, 1.0)[0] for i in index.lookup("chicken kofta")] == ["id-003"]
+    got = [index.hit(i, s)[0] for i, s in index.fuzzy("chicken korma", 5, 0.2)]
+    assert "id-001" not in got and "id-003" in got
+
+
+def test_parse_changes():
+    def r(d, s, op):
+        return SimpleNamespace(dish_id=d, source=s, op=op)
+
+    changes = parse_changes(1, 3, [r("b", "nutrients", "U"), r("a", "nutrients", "U")])
+    assert changes.dish_ids == ("a", "b") and changes.nutrients_only and not changes.full
+    assert not parse_changes(1, 3, [r("a", "nutrients", "U"), r("b", "dishes", "U")]).nutrients_only
+    assert not parse_changes(1, 3, [r("a", "nutrients", "I")]).nutrients_only
+    assert parse_changes(1, 3, [r(None, "dishes", "T")]).full
+
+
+def test_feed_retries_a_failed_apply(monkeypatch):
+    calls = []
+
+    def fetch(since, until):
+        calls.append((since, until))
+        if len(calls) == 1:
+            raise ConnectionError("db down")
+        return parse_changes(since, until, [])
+
+    monkeypatch.setattr(catalog_feed, "fetch_changes", fetch)
+    feed = CatalogFeed(max_rows=10, retry_s=0.01)
+    feed.version = 1
+    feed.update(2)
+    deadline = time.monotonic() + 5
+    while feed.version != 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert feed.version == 2 and feed.errors == 1 and calls == [(1, 2), (1, 2)]
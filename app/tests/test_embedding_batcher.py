@@ -0,0 +1,71 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from app.utils.embeddings import EmbeddingBatcher  # noqa: E402
+
+
+def _fake_encode(calls):
+    def encode(texts):
+        calls.append(list(texts))
+        time.sleep(0.005)
+        return np.array([[len(t), i] for i, t in enumerate(texts)], dtype=np.float32)
+    return encode
+
+
+def test_concurrent_submits_are_coalesced():
+    calls = []
+    batcher = EmbeddingBatcher(_fake_encode(calls), max_batch_size=16, max_wait_ms=20)
+    results = {}
+
+    def worker(i):
+        results[i] = batcher.encode("x" * i)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(1, 41)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert {i: r[0] for i, r in results.items()} == {i: float(i) for i in range(1, 41)}
+    assert len(calls) < 40
+    assert max(len(c) for c in calls) <= 16
+    stats = batcher.stats.snapshot()
+    assert stats["items"] == 40 and stats["batches"] == len(calls)
+
+
+def test_encode_errors_reach_every_caller():
+    def boom(texts):
+        raise RuntimeError("model down")
+
+    batcher = EmbeddingBatcher(boom, max_batch_size=4, max_wait_ms=5)
+    futs = batcher.submit_many(["a", "b", "c"])
+    for f in futs:
+        with pytest.raises(RuntimeError):
+            f.result(timeout=1)
+
+
+def test_async_embeds_await_the_batcher_and_fill_the_cache(monkeypatch):
+    import asyncio
+
+    from app.utils import embeddings
+    from app.utils.embedding_cache import EmbeddingCache
+
+    calls = []
+    monkeypatch.setattr(embeddings, "_batcher", EmbeddingBatcher(_fake_encode(calls), max_batch_size=64, max_wait_ms=20))
+    monkeypatch.setattr(embeddings, "_cache", EmbeddingCache("test", max_bytes=1 << 20))
+    texts = [f"dish {i}" for i in range(20)]
+
+    async def run():
+        first = await asyncio.gather(*(embeddings.aembed_text(t) for t in texts))
+        again = await asyncio.gather(*(embeddings.aembed_text(t.upper()) for t in texts))
+        return first, again
+
+    first, again = asyncio.run(run())
+    assert sum(len(c) for c in calls) == 20 and len(calls) < 20
+    for a, b in zip(first, again):
+        assert a is b
@@ -0,0 +1,54 @@
+import numpy as np
+
+from app.utils.embedding_cache import DiskStore, EmbeddingCache, normalize_query
+
+
+def test_normalized_keys_share_one_encode(tmp_path):
+    calls = []
+
+    def encode(text):
+        calls.append(text)
+        return np.full(4, len(text), dtype=np.float32)
+
+    cache = EmbeddingCache("m", max_bytes=1 << 20, disk=DiskStore(str(tmp_path / "c.sqlite3")))
+    a = cache.get_or_compute("  Pad   Thai ", encode)
+    b = cache.get_or_compute("pad thai", encode)
+    assert calls == ["pad thai"]
+    assert a is b and not a.flags.writeable
+    assert cache.stats()["memory_hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_disk_tier_is_shared_and_keyed_by_model(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    EmbeddingCache("m1", 1 << 20, DiskStore(path)).put("chicken tikka masala", np.ones(4))
+
+    other_worker = EmbeddingCache("m1", 1 << 20, DiskStore(path))
+    assert other_worker.get("Chicken Tikka Masala").tolist() == [1, 1, 1, 1]
+    assert other_worker.stats()["disk_hits"] == 1
+
+    other_model = EmbeddingCache("m2", 1 << 20, DiskStore(path))
+    assert other_model.get("chicken tikka masala") is None
+
+
+def test_lru_is_bounded_in_bytes():
+    cache = EmbeddingCache("m", max_bytes=3 * (16 + 1 + 64))
+    for name in "abcd":
+        cache.put(name, np.zeros(4))
+    assert cache.get("a") is None
+    assert cache.get("d") is not None
+    assert cache.stats()["evictions"] == 1
+    assert normalize_query(" A  b ") == "a b"
+
+
+def test_many_encodes_only_distinct_misses_in_one_call(tmp_path):
+    calls = []
+
+    def encode_many(texts):
+        calls.append(list(texts))
+        return np.arange(len(texts) * 2, dtype=np.float32).reshape(-1, 2)
+
+    cache = EmbeddingCache("m", 1 << 20, DiskStore(str(tmp_path / "c.sqlite3")))
+    cache.put("pad thai", np.array([9, 9]))
+    out = cache.get_or_compute_many(["Pad Thai", "ramen", "RAMEN ", "pho"], encode_many)
+    assert calls == [["ramen", "pho"]]
+    assert [v.tolist() for v in out] == [[9, 9], [0, 1], [0, 1], [2, 3]]
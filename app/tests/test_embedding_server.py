@@ -0,0 +1,67 @@
+import threading
+
+import numpy as np
+import pytest
+
+from app.utils.embedding_server import EmbeddingServer, RemoteEncoder, serve_in_thread
+
+
+def _fake_encode(texts):
+    if "boom" in texts:
+        raise ValueError("bad text")
+    return np.stack([np.full(4, len(t), dtype=np.float32) for t in texts])
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / "embed.sock")
+
+
+def _serve(path):
+    server = EmbeddingServer(path, _fake_encode, max_batch_size=16, max_wait_ms=5.0)
+    serve_in_thread(server)
+    return server
+
+
+def test_remote_encoder_batches_across_clients(socket_path):
+    server = _serve(socket_path)
+    try:
+        encoder = RemoteEncoder(socket_path, timeout_s=5.0)
+        out = {}
+
+        def client(i):
+            out[i] = encoder.encode(["x" * i, "y" * (i + 1)])
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(1, 9)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for i in range(1, 9):
+            assert out[i].shape == (2, 4) and out[i][:, 0].tolist() == [i, i + 1]
+        stats = server.batcher.stats.snapshot()
+        assert stats["items"] == 16 and stats["batches"] < 16
+
+        with pytest.raises(RuntimeError, match="bad text"):
+            encoder.encode(["boom"])
+        assert encoder.encode(["ok"]).tolist() == [[2.0] * 4]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_remote_encoder_reconnects_after_a_server_restart(socket_path):
+    server = _serve(socket_path)
+    encoder = RemoteEncoder(socket_path, timeout_s=5.0)
+    assert encoder.encode(["abc"])[0, 0] == 3
+    server.shutdown()
+    server.server_close()
+
+    server = _serve(socket_path)
+    try:
+        assert encoder.encode(["abcd"])[0, 0] == 4
+        with pytest.raises(RuntimeError, match="already listening"):
+            EmbeddingServer(socket_path, _fake_encode)
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,216 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.core.settings import settings
+from app.db.models import NUTRIENT_FIELDS
+from app.schemas.label import LabelRequest
+from app.services import catalog, label_cache, label_service, lexical_index, retrieval_service
+from app.services.label_cache import LabelCache
+from app.services.vector_index import EMBEDDING_DIM, VectorIndex
+
+
+def _fake_embed(text):
+    rng = np.random.default_rng(abs(hash(text.lower())) % (2**32))
+    return rng.normal(size=EMBEDDING_DIM).astype(np.float32)
+
+
+@pytest.fixture
+def numpy_catalog(monkeypatch):
+    rng = np.random.default_rng(1)
+    names = ["pad thai", "ramen", "chicken tikka masala", "pho", "falafel", "burrito"] * 5
+    rows = [
+        SimpleNamespace(
+            dish_id=f"id-{i}", name=f"{n} {i}" if i >= 6 else n, aliases=None,
+            macro_priors={"protein": 30, "carbs": 40, "fat": 30} if i % 3 == 0 else None,
+            vector=rng.normal(size=EMBEDDING_DIM).tolist(),
+            kcal=300.0 + 10 * i, protein_g=20.0, carbs_g=None if i % 4 == 0 else 40.0,
+            fat_g=10.0, fiber_g=3.0, sugar_g=5.0, sodium_mg=800.0,
+        )
+        for i, n in enumerate(names)
+    ]
+    index = VectorIndex.from_rows(rows)
+    # caching off unless a test opts in, so batch and single paths are really compared
+    monkeypatch.setattr(label_cache, "_label_cache", LabelCache(max_entries=0, max_bytes=0))
+    monkeypatch.setattr(settings, "RETRIEVAL_BACKEND", "numpy")
+    monkeypatch.setattr(settings, "AUDIT_LOG_ENABLED", False)
+    # the snapshot is the catalog; nothing to follow in a database
+    monkeypatch.setattr(settings, "CATALOG_FEED", False)
+    monkeypatch.setattr(retrieval_service, "get_index", lambda: index)
+    monkeypatch.setattr(catalog, "get_index", lambda: index)
+    monkeypatch.setattr(lexical_index, "_lexical", None)
+    monkeypatch.setattr(retrieval_service, "embed_text", _fake_embed)
+    monkeypatch.setattr(
+        retrieval_service, "embed_texts", lambda texts: np.stack([_fake_embed(t) for t in texts])
+    )
+
+    async def fake_aembed_text(text):
+        return _fake_embed(text)
+
+    async def fake_aembed_texts(texts):
+        return np.stack([_fake_embed(t) for t in texts])
+
+    monkeypatch.setattr(retrieval_service, "aembed_text", fake_aembed_text)
+    monkeypatch.setattr(retrieval_service, "aembed_texts", fake_aembed_texts)
+
+
+def test_batch_labels_are_the_weighted_blend_of_their_candidates(numpy_catalog):
+    reqs = [
+        LabelRequest(dish_name="Pad Thai", calories=650),
+        LabelRequest(dish_name="ramen", calories=400, top_k=3, use_mixture=False),
+        LabelRequest(dish_name="unknown stew", calories=500, top_k=8),
+        LabelRequest(dish_name="", calories=200),
+        LabelRequest(dish_name="pho", calories=350, top_k=1),
+    ]
+    index = retrieval_service.get_index()
+    row = {d: i for i, d in enumerate(index.dish_ids.tolist())}
+    batch = label_service.label_batch(reqs)
+    assert len(batch) == len(reqs)
+    assert batch[3].candidates[0].dish_id == "fallback"
+    assert len(batch[1].candidates) == 1 and batch[1].candidates[0].weight == 1.0
+    assert len(batch[2].candidates) == 8 and len(batch[4].candidates) == 1
+    for req, got in zip(reqs, batch):
+        if not req.dish_name:
+            continue
+        rows = [row[c.dish_id] for c in got.candidates]
+        w = np.array([c.weight for c in got.candidates])
+        assert np.isclose(w.sum(), 1.0) and (w >= 0).all()
+        if np.isnan(index.priors[rows]).all():
+            sims = np.clip([c.sim for c in got.candidates], 1e-3, None)
+            assert w == pytest.approx(sims / sims.sum(), abs=1e-6)
+        # each nutrient: the weighted per-kcal mean over the candidates reporting it, at the target
+        raw = index.nutrients[rows].astype(float)
+        per_kcal = raw[:, 1:] / raw[:, :1]
+        known = ~np.isnan(per_kcal)
+        den = (w[:, None] * known).sum(axis=0)
+        num = (w[:, None] * np.nan_to_num(per_kcal)).sum(axis=0)
+        assert got.nutrients.calories == pytest.approx(req.calories)
+        for field, n, d in zip(NUTRIENT_FIELDS[1:], num, den):
+            value = getattr(got.nutrients, field)
+            assert value is None if d == 0 else value == pytest.approx(req.calories * n / d, rel=1e-5)
+
+
+def test_async_batch_matches_sync(numpy_catalog, monkeypatch):
+    reqs = [LabelRequest(dish_name=n, calories=300 + 10 * i) for i, n in enumerate(["ramen", "pho", "tacos"] * 30)]
+    monkeypatch.setattr(label_service, "ASYNC_INLINE_MAX", 8)  # exercise the worker-thread path
+    got = asyncio.run(label_service.alabel_batch(reqs))
+    want = label_service.label_batch(reqs)
+    assert [r.model_dump() for r in got] == [r.model_dump() for r in want]
+
+
+def test_label_cache_rescales_hits_to_each_target(numpy_catalog, monkeypatch):
+    cache = LabelCache(max_entries=100, max_bytes=1 << 20)
+    monkeypatch.setattr(label_cache, "_label_cache", cache)
+    calls = []
+    retrieve = retrieval_service.retrieve_hits_batch
+    monkeypatch.setattr(label_service, "retrieve_hits_batch", lambda *a, **kw: calls.append(a) or retrieve(*a, **kw))
+
+    first = label_service.label_batch([LabelRequest(dish_name="Pad Thai", calories=650)])[0]
+    reqs = [LabelRequest(dish_name="pad  THAI", calories=c) for c in (120, 650, 2000)]
+    cached = label_service.label_batch(reqs)
+    assert len(calls) == 1
+    assert cache.hits == 3 and cache.misses == 1
+    assert cached[1].model_dump() == first.model_dump()
+
+    monkeypatch.setattr(label_cache, "_label_cache", LabelCache(max_entries=0, max_bytes=0))
+    for req, got in zip(reqs, cached):
+        assert got.model_dump() == label_service.label_batch([req])[0].model_dump()
+
+
+def test_label_cache_drops_entries_on_new_catalog_version(numpy_catalog, monkeypatch):
+    cache = LabelCache(max_entries=100, max_bytes=1 << 20)
+    monkeypatch.setattr(label_cache, "_label_cache", cache)
+    watcher = catalog.CatalogWatcher(check_s=0.0)
+    watcher.listen(cache.set_version)
+    monkeypatch.setattr(catalog, "_watcher", watcher)
+    version = ["v1"]
+    monkeypatch.setattr(catalog, "catalog_version", lambda: version[0])
+    req = LabelRequest(dish_name="ramen", calories=400)
+    label_service.label_batch([req])
+    label_service.label_batch([req])
+    assert cache.hits == 1
+    version[0] = "v2"
+    label_service.label_batch([req])
+    assert cache.hits == 1 and cache.invalidations == 1 and cache.version == "v2"
+
+
+def test_lexical_exact_hits_skip_the_model(numpy_catalog, monkeypatch):
+    index = retrieval_service.get_index()
+    monkeypatch.setattr(lexical_index, "_lexical", lexical_index.LexicalIndex.from_vector_index(index))
+
+    def no_model(*args):
+        raise AssertionError("exact hits must not be embedded")
+
+    monkeypatch.setattr(retrieval_service, "embed_text", no_model)
+    monkeypatch.setattr(retrieval_service, "embed_texts", no_model)
+    hits = retrieval_service.retrieve_hits_batch(["PAD  thai", "Ramen"], [5, 5])
+    assert [[h[1] for h in row] for row in hits] == [["pad thai"], ["ramen"]]
+    assert all(h[2] == 1.0 for row in hits for h in row)
+
+
+def test_lexical_typos_are_fused_with_vector_hits(numpy_catalog, monkeypatch):
+    index = retrieval_service.get_index()
+    monkeypatch.setattr(lexical_index, "_lexical", lexical_index.LexicalIndex.from_vector_index(index))
+    hits = retrieval_service.retrieve_hits_batch(["chicken tikka masla"], [3])[0]
+    assert len(hits) == 3
+    assert hits[0][1].startswith("chicken tikka masala")
+    assert hits[0][2] > 0.4
+    assert [h[2] for h in hits] == sorted((h[2] for h in hits), reverse=True)
+
+    # the async path gives the same answer
+    ahits = asyncio.run(retrieval_service.aretrieve_hits_batch(["chicken tikka masla"], [3]))[0]
+    assert [h[0] for h in ahits] == [h[0] for h in hits]
+
+
+def test_concurrent_identical_labels_share_one_computation(numpy_catalog, monkeypatch):
+    calls = []
+    aretrieve = retrieval_service.aretrieve_hits_batch
+
+    async def counting(names, ks, **kw):
+        calls.append(list(names))
+        await asyncio.sleep(0.01)  # still in flight when the others arrive
+        return await aretrieve(names, ks, **kw)
+
+    monkeypatch.setattr(label_service, "aretrieve_hits_batch", counting)
+    reqs = [LabelRequest(dish_name=n, calories=c) for n, c in [("Ramen", 400), ("ramen ", 800), ("pho", 300)]]
+
+    async def stampede():
+        singles = [label_service.alabel_batch([r]) for r in reqs[:2] * 5]
+        return await asyncio.gather(label_service.alabel_batch(reqs), *singles)
+
+    leaders, coalesced = label_service.LABEL_FLIGHTS.leaders, label_service.LABEL_FLIGHTS.coalesced
+    batch, *singles = asyncio.run(stampede())
+    assert calls == [["ramen", "pho"]]
+    assert label_service.LABEL_FLIGHTS.leaders - leaders == 2
+    assert label_service.LABEL_FLIGHTS.coalesced - coalesced == 10
+    # shared per-kcal profiles, scaled to each request's own target
+    assert [s[0].model_dump() for s in singles[:2]] == [b.model_dump() for b in batch[:2]]
+    assert batch[1].nutrients.calories == pytest.approx(2 * batch[0].nutrients.calories)
+
+
+def test_preferred_style_falls_back_to_every_style(numpy_catalog, monkeypatch):
+    rows = [
+        SimpleNamespace(
+            dish_id=dish_id, name=name, aliases=None, macro_priors=None, cuisine=cuisine, style=style,
+            vector=_fake_embed(name).tolist(), kcal=400.0, protein_g=20.0, carbs_g=50.0,
+            fat_g=12.0, fiber_g=2.0, sugar_g=4.0, sodium_mg=900.0,
+        )
+        for dish_id, name, cuisine, style in [
+            ("home-ramen", "ramen", "Japanese", None),
+            ("shop-ramen", "ramen", "japanese", "Restaurant"),
+            ("pho", "pho", "Vietnamese", ""),
+        ]
+    ]
+    index = VectorIndex.from_rows(rows)
+    monkeypatch.setattr(retrieval_service, "get_index", lambda: index)
+
+    def label(name, **kw):
+        return label_service.label_batch([LabelRequest(dish_name=name, calories=400, **kw)])[0]
+
+    assert {c.dish_id for c in label("ramen").candidates} == {"home-ramen", "shop-ramen"}
+    assert [c.dish_id for c in label("ramen", prefer_restaurant_style=True).candidates] == ["shop-ramen"]
+    # no restaurant-style pho: the preference gives way instead of returning a poor match
+    assert label("pho", prefer_restaurant_style=True).candidates[0].dish_id == "pho"
+    assert label("pho", cuisine="japanese").candidates[0].dish_id != "pho"
@@ -0,0 +1,106 @@
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.core.settings import settings
+from app.schemas.label import LabelRequest
+from app.services import audit_log, catalog, label_cache, label_service, retrieval_service
+from app.services.audit_log import AuditLogger
+from app.services.label_cache import LabelCache
+from app.services.vector_index import EMBEDDING_DIM, VectorIndex
+from scripts import label_batch
+
+
+def _embed(texts):
+    return np.stack([np.random.default_rng(abs(hash(t.lower())) % (2**32)).normal(size=EMBEDDING_DIM)
+                     for t in texts]).astype(np.float32)
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    rng = np.random.default_rng(2)
+    rows = [
+        SimpleNamespace(dish_id=f"id-{i}", name=n, aliases=None, macro_priors=None,
+                        vector=rng.normal(size=EMBEDDING_DIM).tolist(), kcal=300.0 + 20 * i, protein_g=20.0,
+                        carbs_g=40.0, fat_g=10.0, fiber_g=None, sugar_g=5.0, sodium_mg=800.0)
+        for i, n in enumerate(["pad thai", "ramen", "pho", "falafel", "burrito"])
+    ]
+    index = VectorIndex.from_rows(rows)
+    monkeypatch.setattr(label_cache, "_label_cache", LabelCache(max_entries=0, max_bytes=0))
+    monkeypatch.setattr(settings, "LEXICAL_INDEX", False)
+    monkeypatch.setattr(settings, "AUDIT_LOG_ENABLED", False)
+    monkeypatch.setattr(settings, "CATALOG_FEED", False)
+    monkeypatch.setattr(retrieval_service, "get_index", lambda: index)
+    monkeypatch.setattr(catalog, "get_index", lambda: index)
+    monkeypatch.setattr(settings, "RETRIEVAL_BACKEND", "numpy")
+    monkeypatch.setattr(settings, "EMBED_SERVER_SOCKET", "")
+    monkeypatch.setattr(retrieval_service, "embed_texts", _embed)
+    monkeypatch.setattr(retrieval_service, "embed_text", lambda t: _embed([t])[0])
+
+
+def _args(tmp_path, output, **kw):
+    base = dict(input=str(tmp_path / "menu.csv"), output=str(tmp_path / output), workers=1, chunk_size=2,
+                offset=0, resume=False, backend="numpy", audit=False, report_s=0)
+    return SimpleNamespace(**{**base, **kw})
+
+
+def test_labels_a_file_like_the_api_and_resumes(offline, tmp_path):
+    (tmp_path / "menu.csv").write_text(
+        "dish_name,calories,top_k,use_mixture\n"
+        "Pad Thai,650,,\nramen,400,3,false\n,500,,\npho,-1,,\nburrito,900,5,true\n"
+    )
+    stats = label_batch.run(_args(tmp_path, "out.jsonl"))
+    assert stats["rows"] == 5 and stats["errors"] == 2
+
+    out = [json.loads(line) for line in (tmp_path / "out.jsonl").read_text().splitlines()]
+    assert [r["row"] for r in out] == [0, 1, 2, 3, 4]
+    assert out[2]["error"] == "missing dish_name" and out[3]["error"] == "calories must be > 0"
+    want = label_service.label_batch([
+        LabelRequest(dish_name="Pad Thai", calories=650),
+        LabelRequest(dish_name="ramen", calories=400, top_k=3, use_mixture=False),
+        LabelRequest(dish_name="burrito", calories=900),
+    ])
+    for rec, resp in zip([out[0], out[1], out[4]], want):
+        assert rec["calories"] == pytest.approx(resp.nutrients.calories)
+        assert rec["protein_g"] == pytest.approx(resp.nutrients.protein_g)
+        assert rec["fiber_g"] is None and resp.nutrients.fiber_g is None
+        assert rec["confidence"] == pytest.approx(resp.confidence)
+        assert [c[0] for c in rec["candidates"]] == [c.dish_id for c in resp.candidates]
+
+    # a run killed mid-write: two full rows and a torn third
+    full = (tmp_path / "out.jsonl").read_text()
+    lines = full.splitlines(keepends=True)
+    (tmp_path / "out.jsonl").write_text("".join(lines[:2]) + lines[2][:10])
+    stats = label_batch.run(_args(tmp_path, "out.jsonl", resume=True))
+    assert stats["offset"] == 2 and stats["rows"] == 3
+    assert (tmp_path / "out.jsonl").read_text() == full
+
+
+def test_csv_output(offline, tmp_path):
+    (tmp_path / "menu.csv").write_text("dish_name,calories\npho,300\nfalafel,450\n")
+    label_batch.run(_args(tmp_path, "out.csv"))
+    lines = (tmp_path / "out.csv").read_text().splitlines()
+    assert lines[0].split(",")[:3] == ["row", "dish_name", "calories"] and len(lines) == 3
+    assert label_batch.rows_written(str(tmp_path / "out.csv")) == 2
+
+
+def test_resume_counts_from_the_offset(offline, tmp_path):
+    (tmp_path / "menu.csv").write_text("dish_name,calories\n" + "".join(f"pho,{300 + i}\n" for i in range(5)))
+    label_batch.run(_args(tmp_path, "out.jsonl", offset=1))
+    full = (tmp_path / "out.jsonl").read_text()
+    (tmp_path / "out.jsonl").write_text("".join(full.splitlines(keepends=True)[:2]))
+    stats = label_batch.run(_args(tmp_path, "out.jsonl", offset=1, resume=True))
+    assert stats["offset"] == 3 and stats["rows"] == 2
+    assert (tmp_path / "out.jsonl").read_text() == full
+
+
+def test_audit_records_every_labeled_row(offline, monkeypatch, tmp_path):
+    batches = []
+    monkeypatch.setattr(audit_log, "_audit", AuditLogger(batches.append, spill_path=str(tmp_path / "s.jsonl")))
+    (tmp_path / "menu.csv").write_text("dish_name,calories\npho,300\n,450\nfalafel,450\n")
+    label_batch.run(_args(tmp_path, "out.jsonl", audit=True))
+    rows = [r for b in batches for r in b]
+    assert [(r[0], r[1]) for r in rows] == [("pho", 300.0), ("falafel", 450.0)]
+    assert audit_log._audit is None
@@ -0,0 +1,63 @@
+import time
+
+import numpy as np
+
+from app.services.label_cache import CachedLabel, LabelCache, label_key
+
+
+def _entry(n_candidates=2):
+    cands = tuple((f"id-{i}", f"dish {i}", 0.9, 0.5) for i in range(n_candidates))
+    return CachedLabel(np.arange(7, dtype=np.float64), 0.9, cands, 0.01)
+
+
+def test_keys_normalize_the_dish_name():
+    assert label_key("  Pad   Thai ", 5, True) == label_key("pad thai", 5, True)
+    assert label_key("pad thai", 5, True) != label_key("pad thai", 5, False)
+
+
+def test_bounded_by_entries_and_bytes():
+    cache = LabelCache(max_entries=3, max_bytes=1 << 20)
+    for i in range(5):
+        cache.put(label_key(f"d{i}", 5, True), _entry())
+    assert cache.stats()["entries"] == 3 and cache.evictions == 2
+    assert cache.get(label_key("d0", 5, True)) is None
+
+    one = LabelCache._size(label_key("d0", 5, True), _entry())
+    cache = LabelCache(max_entries=100, max_bytes=2 * one)
+    for i in range(5):
+        cache.put(label_key(f"d{i}", 5, True), _entry())
+    assert cache.stats()["entries"] == 2 and cache.stats()["bytes"] <= 2 * one
+
+
+def test_ttl_and_stale_versions():
+    cache = LabelCache(max_entries=10, max_bytes=1 << 20, ttl_s=0.01)
+    key = label_key("ramen", 5, True)
+    cache.put(key, _entry())
+    assert cache.get(key) is not None
+    time.sleep(0.02)
+    assert cache.get(key) is None and cache.expired == 1
+
+    cache.set_version(1)
+    cache.put(key, _entry(), version=0)  # computed before the catalog changed
+    assert cache.get(key) is None
+    cache.put(key, _entry(), version=1)
+    assert cache.get(key) is not None
+    assert cache.stats()["saved_ms"] > 0
+
+
+def test_nutrient_changes_drop_only_affected_labels():
+    from app.services.catalog import ChangeSet
+
+    cache = LabelCache(max_entries=10, max_bytes=1 << 20)
+    cache.set_version(1)
+    cache.put(label_key("one", 5, True), _entry(1), version=1)  # candidates id-0
+    cache.put(label_key("two", 5, True), _entry(2), version=1)  # candidates id-0, id-1
+    cache.put(label_key("other", 5, True), CachedLabel(None, 0.0, (("id-9", "x", 0.5, 1.0),), 0.01), version=1)
+
+    cache.apply_changes(ChangeSet(1, 2, ("id-1",), False, True))
+    assert cache.version == 2
+    assert cache.get(label_key("two", 5, True)) is None
+    assert cache.get(label_key("one", 5, True)) is not None
+
+    cache.apply_changes(ChangeSet(2, 3, ("id-5",), False, False))  # e.g. a renamed dish
+    assert cache.version == 3 and cache.stats()["entries"] == 0
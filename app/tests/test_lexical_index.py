@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.services.catalog import CatalogWatcher
+from app.services.lexical_index import LexicalIndex, trigrams
+
+
+def _index():
+    names = ["Chicken Tikka Masala", "Pad Thai", "Pho", "Chicken Korma"]
+    aliases = [["CTM"], ["phat thai"], None, None]
+    rows = [
+        SimpleNamespace(dish_id=f"id-{i}", name=n, aliases=a, macro_priors=None, kcal=100.0 * (i + 1),
+                        protein_g=10.0, carbs_g=None, fat_g=5.0, fiber_g=1.0, sugar_g=2.0, sodium_mg=300.0)
+        for i, (n, a) in enumerate(zip(names, aliases))
+    ]
+    return LexicalIndex.from_rows(rows, version=1)
+
+
+def test_trigrams_follow_pg_trgm():
+    assert trigrams("Cat") == {"  c", " ca", "cat", "at "}
+    assert trigrams("a-b") == {"  a", " a ", "  b", " b "}
+
+
+def test_exact_lookup_covers_names_and_aliases():
+    idx = _index()
+    assert idx.lookup("  chicken   TIKKA masala") == [0]
+    assert idx.lookup("ctm") == [0]
+    assert idx.lookup("Phat Thai") == [1]
+    assert idx.lookup("tikka") == []
+    dish_id, name, sim, matrix, row = idx.hit(0, 1.0)
+    assert (dish_id, name, sim) == ("id-0", "Chicken Tikka Masala", 1.0)
+    assert matrix.values(row)[0] == 100.0 and np.isnan(matrix.values(row)[2])
+
+
+def test_fuzzy_tolerates_typos_and_ranks_by_similarity():
+    idx = _index()
+    hits = idx.fuzzy("chicken tikka masla", limit=3, threshold=0.3)
+    assert hits[0][0] == 0 and 0.5 < hits[0][1] < 1.0
+    rows, sims = [r for r, _ in hits], [s for _, s in hits]
+    assert len(set(rows)) == len(rows) and sims == sorted(sims, reverse=True)
+    assert all(s >= 0.3 for _, s in hits)
+    assert idx.fuzzy("zzzz", limit=3, threshold=0.3) == []
+
+
+def test_saved_index_is_mapped_with_the_same_answers(tmp_path):
+    idx = _index()
+    idx.save(str(tmp_path))
+    index = SimpleNamespace(dish_ids=idx.dish_ids, names=idx.names, matrix=idx.matrix)
+    loaded = LexicalIndex.load(str(tmp_path), index, version=2)
+    assert isinstance(loaded.arrays["keys"], np.memmap)
+    for name in ["ctm", "phat thai", "pho", "a much longer query than any key in the index", ""]:
+        assert loaded.lookup(name) == idx.lookup(name)
+    assert loaded.fuzzy("chiken korma", 3, 0.3) == idx.fuzzy("chiken korma", 3, 0.3)
+
+
+def test_watcher_notifies_on_change_and_ignores_failed_polls():
+    seen = []
+    w = CatalogWatcher(check_s=60.0)
+    w.listen(seen.append)
+    assert w.claim() and not w.claim()
+    w.update(3)
+    w.update(3)
+    w.update(None)
+    w.update(4)
+    assert seen == [3, 4] and w.version == 4 and w.errors == 1
@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils.embeddings import _in_executor
+from app.utils.metrics import Registry, TimingMiddleware, STAGE_SECONDS, _request_stages, record_stage, timed
+from app.utils.profiler import SlowRequestProfiler
+
+
+def test_histogram_renders_cumulative_prometheus_buckets():
+    reg = Registry()
+    h = reg.histogram("demo_seconds", "Demo.", labels=("stage",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 3.0):
+        h.observe(v, "embed")
+    text = reg.render()
+    assert 'demo_seconds_bucket{stage="embed",le="0.1"} 2' in text
+    assert 'demo_seconds_bucket{stage="embed",le="1.0"} 3' in text
+    assert 'demo_seconds_bucket{stage="embed",le="+Inf"} 4' in text
+    assert 'demo_seconds_count{stage="embed"} 4' in text
+    assert "# TYPE demo_seconds histogram" in text
+
+
+def test_server_timing_header_lists_request_stages():
+    app = FastAPI()
+
+    @app.get("/work")
+    async def work():
+        with timed("test_stage"):
+            await asyncio.sleep(0.002)
+        return {"ok": True}
+
+    app.add_middleware(TimingMiddleware)
+    before = STAGE_SECONDS.count("test_stage")
+    r = TestClient(app).get("/work")
+    assert r.status_code == 200
+    header = r.headers["server-timing"]
+    assert header.startswith("test_stage;dur=") and "total;dur=" in header
+    assert STAGE_SECONDS.count("test_stage") == before + 1
+
+
+def test_slow_request_profiler_dumps_folded_stacks(tmp_path):
+    prof = SlowRequestProfiler(threshold_ms=20, interval_ms=1, out_dir=str(tmp_path))
+    prof.start()
+    try:
+        t0 = time.perf_counter()
+        time.sleep(0.05)
+        t1 = time.perf_counter()
+        assert prof.on_finish("/fast", t1 - 0.001, t1) is None
+        out = prof.on_finish("/label", t0, t1)
+    finally:
+        prof.stop()
+    with open(out) as f:
+        lines = f.read().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("test_slow_request_profiler_dumps_folded_stacks" in line for line in lines)
+
+
+def test_executor_work_records_into_the_request_stages():
+    async def run():
+        stages = {}
+        token = _request_stages.set(stages)
+        try:
+            await _in_executor(record_stage, "executor_stage", 0.25)
+        finally:
+            _request_stages.reset(token)
+        return stages
+
+    assert asyncio.run(run()) == {"executor_stage": 0.25}
@@ -0,0 +1,108 @@
+import numpy as np
+from scipy.optimize import nnls
+
+from app.services.mixture_service import (
+    blend_density_batch,
+    blend_profiles_batch,
+    mixture_weights_batch,
+    mixture_weights_density,
+    nnls_batch,
+    parse_macro_priors,
+)
+from app.services.nutrient_matrix import NutrientMatrix
+
+
+def test_nnls_batch_matches_scipy():
+    rng = np.random.default_rng(0)
+    for m, n in [(7, 5), (7, 20), (7, 50), (12, 6)]:
+        A = rng.normal(size=(64, m, n))
+        b = rng.normal(size=(64, m))
+        x = nnls_batch(A, b)
+        assert (x >= 0).all()
+        for i in range(len(A)):
+            _, ref = nnls(A[i], b[i])
+            got = np.linalg.norm(A[i] @ x[i] - b[i])
+            assert got <= ref + 1e-8 * max(1.0, ref)
+
+
+def _profiles():
+    # kcal, protein, carbs, fat, fiber, sugar, sodium
+    return np.array([[
+        [500, 40, 30, 20, 4, 5, 900],
+        [500, 10, 80, 10, 6, 15, 400],
+        [500, 20, 50, np.nan, 5, 10, np.nan],
+    ]], dtype=float)
+
+
+def test_weights_are_a_mixture_and_respect_the_mask():
+    sims = np.array([[0.9, 0.8, 0.7]])
+    w = mixture_weights_batch(_profiles(), sims, np.array([[True, True, False]]))
+    assert w[0, 2] == 0
+    assert np.isclose(w.sum(), 1.0) and (w >= 0).all()
+
+
+def test_macro_priors_pull_towards_matching_candidate():
+    sims = np.array([[0.8, 0.8, 0.8]])
+    mask = np.ones((1, 3), dtype=bool)
+    protein_heavy = parse_macro_priors({"protein": 32, "carbs": 24, "fat": 44})
+    priors = np.stack([protein_heavy] * 3)[None]
+    plain = mixture_weights_batch(_profiles(), sims, mask)
+    pulled = mixture_weights_batch(_profiles(), sims, mask, priors)
+    assert pulled[0, 0] > plain[0, 0]
+
+
+def test_blend_skips_nulls_per_nutrient():
+    w = np.array([[0.5, 0.0, 0.5]])
+    out = blend_profiles_batch(_profiles(), w)[0]
+    assert out[0] == 500
+    assert np.isclose(out[1], 30)
+    assert np.isclose(out[3], 20)  # only the first candidate reports fat
+    assert np.isclose(out[6], 900)
+
+
+def test_weights_fit_the_priors_not_themselves():
+    sims = np.array([[0.9, 0.6, 0.3]])
+    mask = np.ones((1, 3), dtype=bool)
+    # nothing independent to fit: plain similarity weights
+    assert np.allclose(mixture_weights_batch(_profiles(), sims, mask), sims / sims.sum())
+
+    # a carb-heavy prior split moves weight to the carb-heavy candidate, and the fitted
+    # blend is closer to that split than the similarity blend
+    carbs = parse_macro_priors({"protein": 10, "carbs": 70, "fat": 20})
+    priors = np.stack([carbs, carbs, np.full(3, np.nan)])[None]
+    w = mixture_weights_batch(_profiles(), sims, mask, priors)
+    assert w[0, 1] > sims[0, 1] / sims.sum() and np.isclose(w.sum(), 1.0)
+    dens = _profiles()[0, :, 1:4] / 500
+
+    def miss(weights):
+        return np.linalg.norm(np.nansum(weights[0, :, None] * np.nan_to_num(dens), axis=0) - carbs)
+
+    assert miss(w) < miss(sims / sims.sum())
+
+
+def test_nutrient_matrix_densities_match_raw_profiles():
+    profiles = _profiles()
+    matrix = NutrientMatrix(profiles[0])
+    assert np.allclose(matrix.values(2), profiles[0, 2], equal_nan=True)
+    assert not matrix.known[2, 3] and np.isnan(matrix.priors).all()
+
+    w = np.array([[0.5, 0.2, 0.3]])
+    dens = matrix.density[None, :, 1:].astype(float)
+    assert np.allclose(blend_density_batch(matrix.kcal[None].astype(float), dens, w),
+                       blend_profiles_batch(profiles, w), equal_nan=True)
+    mask = np.ones((1, 3), dtype=bool)
+    sims = np.array([[0.9, 0.8, 0.7]])
+    assert np.allclose(mixture_weights_density(dens, sims, mask), mixture_weights_batch(profiles, sims, mask))
+
+
+def test_zero_kcal_candidates_do_not_swamp_the_blend():
+    # a diet soda's 10 mg sodium per 0 kcal must not count as 1e7 mg per kcal
+    profiles = np.array([[[300, 20, 30, 10, 2, 5, 600], [0, 0, 0, 0, 0, 0, 10]]], dtype=float)
+    w = np.array([[0.5, 0.5]])
+    out = blend_profiles_batch(profiles, w)[0]
+    assert out[0] == 150 and np.isclose(out[6], 300)
+
+    matrix = NutrientMatrix(profiles[0])
+    assert np.isnan(matrix.density[1, 1:]).all() and not matrix.known[1, 6]
+    dens = matrix.density[None, :, 1:].astype(float)
+    assert np.allclose(blend_density_batch(matrix.kcal[None].astype(float), dens, w)[0], out)
@@ -0,0 +1,126 @@
+import re
+from collections import namedtuple
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.core.settings import settings
+from app.db import ann_index
+from app.db.ann_index import AnnParams
+from app.services.partitions import search_filter
+from app.services import retrieval_service
+from app.services.retrieval_service import _combine, _pgvector_found, _pgvector_query, _pgvector_statements
+
+Row = namedtuple("Row", "i kind dish_id name macro_priors kcal protein_g carbs_g fat_g fiber_g sugar_g sodium_mg score")
+
+
+def _placeholders(sql):
+    return set(re.findall(r"%\((\w+)\)s", sql))
+
+
+def test_one_statement_per_pass(monkeypatch):
+    monkeypatch.setattr(ann_index, "current", AnnParams("hnsw", 0, 0, 64))
+    monkeypatch.setattr(settings, "EMBEDDING_PRECISION", "float32")
+    qvs = np.ones((3, 4), dtype=np.float32)
+
+    setup, [(sql, params)] = _pgvector_statements([_pgvector_query(["A", "b", "c"], qvs, [5, 10, 3], lexical=False)])
+    assert setup == []
+    assert _placeholders(sql) == set(params) == {"names", "qvs", "k", "threshold"}
+    assert params["names"] == ["a", "b", "c"] and params["k"] == 10
+    assert "'exact'" in sql and "'fuzzy'" in sql and "%%" in sql
+
+    # the in-process lexical index already did the exact and trigram lookups
+    _, [(sql, params)] = _pgvector_statements([_pgvector_query(["a"], qvs[:1], [5], lexical=True)])
+    assert _placeholders(sql) == set(params) == {"qvs", "k"}
+    assert "'exact'" not in sql and "'fuzzy'" not in sql
+
+    # a shortlist past ef_search raises it in the same pipeline, ahead of the queries
+    monkeypatch.setattr(settings, "EMBEDDING_PRECISION", "halfvec")
+    [(ann_sql, ann)], [(sql, params)] = _pgvector_statements([_pgvector_query(["a"], qvs[:1], [20], lexical=True)])
+    assert "set_config" in ann_sql and ann == {"name": "hnsw.ef_search", "value": str(20 * settings.RERANK_FACTOR)}
+    assert params["shortlist"] == 20 * settings.RERANK_FACTOR and "vector_half" in sql
+
+
+def test_filters_reach_every_kind_of_hit(monkeypatch):
+    monkeypatch.setattr(ann_index, "current", AnnParams("hnsw", 0, 0, 64, iterative=True))
+    monkeypatch.setattr(settings, "EMBEDDING_PRECISION", "halfvec")
+    qvs = np.ones((2, 4), dtype=np.float32)
+    where = search_filter(" Thai ", "Street  Food")
+
+    sql, params = _pgvector_query(["a", "b"], qvs, [5, 5], False, where)
+    assert _placeholders(sql) == set(params)
+    assert params["cuisine"] == "thai" and params["style"] == "street food"
+    # in the exact join, the shortlist scan and the trigram scan
+    assert sql.count("d.cuisine = %(cuisine)s") == 3 and sql.count("d.style = %(style)s") == 3
+
+    sql, params = _pgvector_query(["a"], qvs[:1], [5], False, search_filter("thai"))
+    assert "style" not in params and "%(style)s" not in sql and sql.count("%(cuisine)s") == 3
+
+    # passes with different filters share the pipeline and one ef_search setting
+    setup, queries = _pgvector_statements([
+        _pgvector_query(["a"], qvs[:1], [5], True),
+        _pgvector_query(["b"], qvs[1:], [30], False, where),
+    ])
+    assert len(setup) == 1 and setup[0][1]["value"] == str(30 * settings.RERANK_FACTOR)
+    assert "%(style)s" not in queries[0][0] and "%(style)s" in queries[1][0]
+
+
+def test_rows_map_to_found():
+    priors = '{"protein": 0.3, "carbs": 0.5, "fat": 0.2}'
+    rows = [
+        Row(1, "exact", "d1", "Dal", priors, 120.0, 8, 18, 2, 4, 1, 300, 1.0),
+        Row(1, "vector", "d2", "Dal makhani", priors, 150.0, 7, 15, 7, 3, 2, 400, 0.8),
+        Row(2, "fuzzy", "d3", "Tikka masala", priors, 180.0, 12, 8, 11, 1, 3, 500, 0.6),
+        Row(2, "vector", "d4", "Butter chicken", priors, None, 14, 6, 13, 1, 4, 600, 0.7),
+        Row(2, "vector", "d3", "Tikka masala", priors, 180.0, 12, 8, 11, 1, 3, 500, 0.5),
+    ]
+    found = _pgvector_found(["dal", "tikka masla", "nothing"], rows)
+
+    exact, nearest, fuzzy = found[0]
+    assert [h[0] for h in exact] == ["d1"] and [h[0] for h in nearest] == ["d2"] and fuzzy == []
+    assert _combine(found[0], 5) == exact
+
+    # hits share one matrix and point at their row in it
+    hit = found[1][1][0]
+    assert hit[0] == "d4" and np.isnan(hit[3].values(hit[4])[0])
+    assert found[1][2][0][1] == 0.6
+    fused = _combine(found[1], 2)
+    assert fused[0][0] == "d3" and fused[0][2] > 0.7
+    assert found[2] == ([], [], [])
+
+
+def test_broken_connection_is_retried_once(monkeypatch):
+    monkeypatch.setattr(ann_index, "current", AnnParams("hnsw", 0, 0, 64))
+    monkeypatch.setattr(settings, "EMBEDDING_PRECISION", "float32")
+    raws, invalidated = [], []
+
+    @contextmanager
+    def connect():
+        raw = SimpleNamespace(broken=False)
+        raws.append(raw)
+        yield SimpleNamespace(connection=SimpleNamespace(driver_connection=raw),
+                              invalidate=lambda: invalidated.append(raw))
+
+    def execute(raw, setup, queries):
+        if len(raws) == 1:
+            # killed server-side while idle for less than DB_PING_IDLE_S
+            raw.broken = True
+            raise OSError("server closed the connection unexpectedly")
+        return [[] for _ in queries]
+
+    monkeypatch.setattr(retrieval_service, "engine", SimpleNamespace(connect=connect))
+    monkeypatch.setattr(retrieval_service, "_execute", execute)
+    passes = retrieval_service._passes(["pad thai"], np.ones((1, 4), dtype=np.float32), [3], False, [None])
+    assert retrieval_service._retrieve_pgvector(passes) == [[([], [], [])]]
+    assert invalidated == raws[:1] and len(raws) == 2
+
+    def always_broken(raw, setup, queries):
+        raw.broken = True
+        raise OSError("server closed the connection unexpectedly")
+
+    monkeypatch.setattr(retrieval_service, "_execute", always_broken)
+    with pytest.raises(OSError):
+        retrieval_service._retrieve_pgvector(passes)
+    assert len(raws) == 4
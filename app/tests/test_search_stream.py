@@ -0,0 +1,89 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from app.core.settings import settings
+from app.services import search_stream
+from app.services.partitions import search_filter
+from app.services.search_stream import ndjson_lines, parse_query
+
+
+def _fake_hits(calls):
+    async def retrieve(names, ks, wheres=None):
+        calls.append(len(names))
+        return [[(f"id-{n}-{j}", n.title(), 1.2 - 0.3 * j, None, j) for j in range(k)] for n, k in zip(names, ks)]
+    return retrieve
+
+
+async def _body(*parts):
+    for p in parts:
+        yield p
+
+
+def _collect(agen):
+    async def run():
+        return [x async for x in agen]
+    return asyncio.run(run())
+
+
+def test_lines_split_across_reads_and_long_lines_are_dropped():
+    lines = _collect(ndjson_lines(_body(b'"pad', b' thai"\n\n"ra', b'men"\n', b"x" * 20, b"y\n", b'"pho"'), 16))
+    assert lines == [b'"pad thai"', b'"ramen"', None, b'"pho"']
+
+    assert parse_query(b'"pho"', 10) == ("pho", 10, None)
+    assert parse_query(b'{"q": "pho", "k": 3}', 10) == ("pho", 3, None)
+    # a line's own facet replaces the request default, the other is kept
+    thai = search_filter("thai")
+    assert parse_query(b'"pho"', 10, thai) == ("pho", 10, thai)
+    assert parse_query(b'{"q": "pho", "style": "Street Food"}', 10, thai)[2] == search_filter("thai", "street food")
+    assert parse_query(b'{"q": "pho", "cuisine": null}', 10, thai)[2] is None
+    bad_lines = (b'{"q": ""}', b'{"q": "pho", "k": 0}', b'{"q": "pho", "k": true}', b'{"q": "pho", "style": 1}')
+    for bad in bad_lines + (b"[1]", b"nope", None):
+        try:
+            parse_query(bad, 10)
+        except ValueError:
+            continue
+        raise AssertionError(bad)
+
+
+def test_batch_endpoint_streams_results_in_input_order(monkeypatch):
+    from app import main
+
+    calls = []
+    monkeypatch.setattr(search_stream, "aretrieve_hits_batch", _fake_hits(calls))
+    monkeypatch.setattr(settings, "SEARCH_BATCH_CHUNK", 2)
+    body = b'"pad thai"\n{"q": "ramen", "k": 1}\n{"q": 5}\n"pho"\n"falafel"'
+    resp = TestClient(main.app).post("/dishes/search/batch?k=2", content=body)
+
+    assert resp.status_code == 200 and resp.headers["content-type"] == "application/x-ndjson"
+    out = [json.loads(line) for line in resp.text.splitlines()]
+    assert [o["i"] for o in out] == [0, 1, 2, 3, 4]
+    assert [c["dish_id"] for c in out[0]["candidates"]] == ["id-pad thai-0", "id-pad thai-1"]
+    assert out[0]["candidates"][0]["sim"] == 1.0  # clamped like Candidate.sim
+    assert len(out[1]["candidates"]) == 1 and "error" in out[2]
+    # chunks of two lines; the malformed one is never searched
+    assert calls == [2, 1, 1]
+
+
+def test_a_failed_chunk_answers_its_lines_with_errors(monkeypatch):
+    async def down(names, ks, wheres=None):
+        raise ConnectionError("db down")
+
+    monkeypatch.setattr(search_stream, "aretrieve_hits_batch", down)
+    out = _collect(search_stream.search_stream(_body(b'"pho"\n"ramen"\n'), 5))
+    assert [json.loads(line) for line in b"".join(out).splitlines()] == [
+        {"i": 0, "error": "search failed"}, {"i": 1, "error": "search failed"},
+    ]
+
+
+def test_a_failed_search_is_an_error_not_an_empty_result(monkeypatch):
+    from app import main
+    from app.api import dishes_router
+
+    async def down(q, k, where=None):
+        raise ConnectionError("db down")
+
+    monkeypatch.setattr(dishes_router, "asearch_candidates", down)
+    resp = TestClient(main.app).get("/dishes/search?q=ramen")
+    assert resp.status_code == 503
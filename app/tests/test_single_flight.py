@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from app.core.settings import settings
+from app.utils.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight("test")
+    calls = []
+
+    async def compute(keys):
+        calls.append(keys)
+        await asyncio.sleep(0.01)
+        return [k.upper() for k in keys]
+
+    async def main():
+        first = asyncio.ensure_future(flights.do_many(["a", "b"], compute))
+        await asyncio.sleep(0)
+        # "b" joins the first call, "c" starts its own
+        second = await flights.do_many(["b", "c"], compute)
+        return await first, second
+
+    assert asyncio.run(main()) == (["A", "B"], ["B", "C"])
+    assert calls == [["a", "b"], ["c"]]
+    assert flights.stats() == {"leaders": 3, "coalesced": 1, "in_flight": 0}
+
+
+def test_errors_reach_every_caller_and_are_not_remembered():
+    flights = SingleFlight("test")
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("db down")
+
+    async def main():
+        return await asyncio.gather(*(flights.do("k", fail) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert len(calls) == 1 and all(isinstance(e, ValueError) for e in errors)
+    # the failed call is forgotten, so the next caller tries again
+    with pytest.raises(ValueError):
+        asyncio.run(flights.do("k", fail))
+    assert len(calls) == 2
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    flights = SingleFlight("test")
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return 42
+
+    async def main():
+        first = asyncio.ensure_future(flights.do("k", slow))
+        second = asyncio.ensure_future(flights.do("k", slow))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == 42
+
+
+def test_disabled_computes_every_call(monkeypatch):
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT", False)
+    flights = SingleFlight("test")
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.005)
+        return 1
+
+    async def main():
+        return await asyncio.gather(flights.do("k", compute), flights.do("k", compute))
+
+    assert asyncio.run(main()) == [1, 1] and len(calls) == 2
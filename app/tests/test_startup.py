@@ -0,0 +1,45 @@
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.settings import settings
+from app.utils import embeddings
+
+
+def test_importing_the_app_does_not_load_torch():
+    code = "import sys, app.main; print(sorted(m for m in ('torch', 'sentence_transformers') if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_backend_is_checked_and_keys_the_cache(monkeypatch):
+    with pytest.raises(ValueError):
+        embeddings.load_model(backend="tensorrt")
+    monkeypatch.setattr(settings, "EMBEDDING_BACKEND", "torch")
+    assert embeddings.model_key() == settings.EMBEDDING_MODEL
+    monkeypatch.setattr(settings, "EMBEDDING_BACKEND", "int8")
+    assert embeddings.model_key() == settings.EMBEDDING_MODEL + "@int8"
+
+
+def test_warm_up_runs_each_batch_shape(monkeypatch):
+    calls = []
+
+    class Model:
+        def encode(self, texts, **kw):
+            calls.append(len(texts))
+
+    monkeypatch.setattr(embeddings, "_model", Model())
+    assert embeddings.warm_up(8) >= 0
+    assert calls == [1, 8]
+
+
+def test_ready_waits_for_warm_up(monkeypatch):
+    from app import main
+
+    monkeypatch.setattr(main, "_warm", main.threading.Event())
+    client = TestClient(main.app)  # no lifespan: nothing has warmed up
+    assert client.get("/ready").status_code == 503
+    main._warm.set()
+    assert client.get("/ready").json()["ready"] is True
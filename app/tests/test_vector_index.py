@@ -0,0 +1,149 @@
+import numpy as np
+from types import SimpleNamespace
+
+from app.services.partitions import search_filter
+from app.services.vector_index import EMBEDDING_DIM, VectorIndex, ensure_codes
+
+
+def _random_index(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = [
+        SimpleNamespace(
+            dish_id=f"id-{i}", name=f"dish {i}", aliases=[f"Alias {i}"] if i % 7 == 0 else None,
+            macro_priors=None,
+            vector=rng.normal(size=EMBEDDING_DIM).tolist(),
+            kcal=100.0 + i, protein_g=None, carbs_g=10.0, fat_g=5.0,
+            fiber_g=1.0, sugar_g=2.0, sodium_mg=300.0,
+        )
+        for i in range(n)
+    ]
+    return VectorIndex.from_rows(rows), rng
+
+
+def test_search_matches_brute_force():
+    index, rng = _random_index()
+    for _ in range(20):
+        q = rng.normal(size=EMBEDDING_DIM).astype(np.float32)
+        top, sims = index.search(q, 10)
+        ref = index.vectors @ (q / np.linalg.norm(q))
+        expected = np.argsort(-ref)[:10]
+        assert top.tolist() == expected.tolist()
+        np.testing.assert_allclose(sims, ref[expected], rtol=1e-6)
+
+
+def test_snapshot_roundtrip_is_memory_mapped(tmp_path):
+    index, rng = _random_index(50)
+    index.save(str(tmp_path))
+    loaded = VectorIndex.load(str(tmp_path))
+    # a rebuild after the load must not hand this index another snapshot's aliases
+    (tmp_path / "aliases.json").write_text("[]")
+    assert isinstance(loaded.vectors, np.memmap)
+    q = rng.normal(size=EMBEDDING_DIM)
+    assert index.search(q, 5)[0].tolist() == loaded.search(q, 5)[0].tolist()
+    assert loaded.lookup("DISH 3") == [3]
+    assert loaded.lookup("alias 14") == [14]
+    assert np.isnan(loaded.nutrients[0, 1])
+    # the per-kcal matrix is mapped too, so worker processes share it
+    assert isinstance(loaded.matrix.density, np.memmap)
+    np.testing.assert_allclose(loaded.matrix.values(9), index.matrix.values(9), equal_nan=True)
+
+
+def test_rows_without_vectors_are_skipped(tmp_path, monkeypatch):
+    rows = [
+        SimpleNamespace(dish_id="a", name="a", aliases=None, macro_priors=None, vector=None, kcal=1.0, protein_g=None,
+                        carbs_g=None, fat_g=None, fiber_g=None, sugar_g=None, sodium_mg=None),
+        SimpleNamespace(dish_id="b", name="b", aliases=None, macro_priors=None, vector=[1.0] * EMBEDDING_DIM, kcal=1.0,
+                        protein_g=None, carbs_g=None, fat_g=None, fiber_g=None, sugar_g=None,
+                        sodium_mg=None),
+    ]
+    index = VectorIndex.from_rows(rows)
+    top, _ = index.search(np.ones(EMBEDDING_DIM), 5)
+    assert top.tolist() == [1]
+    assert index.lookup("a") == [0]
+
+    # a snapshot stores which rows have no embedding, so loading never scans the matrix
+    index.save(str(tmp_path))
+    monkeypatch.setattr(np, "einsum", None)
+    loaded = VectorIndex.load(str(tmp_path))
+    assert loaded.missing_rows().tolist() == [0]
+    assert loaded.search(np.ones(EMBEDDING_DIM), 5)[0].tolist() == [1]
+
+
+def test_quantized_first_pass_reranks_to_exact_scores(tmp_path):
+    index, rng = _random_index(400)
+    queries = rng.normal(size=(8, EMBEDDING_DIM)).astype(np.float32)
+    want_top, _ = index.search_batch(queries, 5)
+    for precision in ("halfvec", "int8", "binary"):
+        compact = VectorIndex(index.dish_ids, index.names, index.vectors, index.nutrients, precision=precision,
+                              rerank_factor=80)
+        top, sims = compact.search_batch(queries, 5)
+        # a shortlist covering the whole catalog re-ranks to the exact answer
+        assert top.tolist() == want_top.tolist(), precision
+        exact = np.einsum("bd,bkd->bk", queries / np.linalg.norm(queries, axis=1, keepdims=True), index.vectors[top])
+        np.testing.assert_allclose(sims, exact, rtol=1e-5)
+
+    compact = VectorIndex(index.dish_ids, index.names, index.vectors, index.nutrients, precision="int8")
+    assert compact.codes.dtype == np.int8 and compact.codes.nbytes == index.vectors.nbytes // 4
+    compact.save(str(tmp_path))
+    loaded = VectorIndex.load(str(tmp_path), precision="int8")
+    assert np.array_equal(loaded.codes, compact.codes)
+    assert loaded.search_batch(queries, 5)[0].tolist() == compact.search_batch(queries, 5)[0].tolist()
+
+
+def test_codes_are_written_once_not_by_loaders(tmp_path):
+    index, _ = _random_index(100)
+    compact = VectorIndex(index.dish_ids, index.names, index.vectors, index.nutrients, precision="int8")
+    compact.save(str(tmp_path))
+    # a snapshot saved again at float32 drops the int8 codes, which no longer match its rows
+    index.save(str(tmp_path))
+    assert not (tmp_path / "codes_int8.npy").exists()
+
+    loaded = VectorIndex.load(str(tmp_path), precision="int8")
+    assert np.array_equal(loaded.codes, compact.codes)
+    assert not (tmp_path / "codes_int8.npy").exists()
+    ensure_codes(str(tmp_path), "int8")
+    assert np.array_equal(np.load(tmp_path / "codes_int8.npy"), compact.codes)
+
+
+def test_filtered_search_scans_only_the_partition(tmp_path):
+    rng = np.random.default_rng(3)
+    cuisines = ["Thai", "thai ", "Indian", None]
+    rows = [
+        SimpleNamespace(
+            dish_id=f"id-{i}", name=f"dish {i}", aliases=None, macro_priors=None,
+            cuisine=cuisines[i % 4], style="restaurant" if i % 3 == 0 else "",
+            vector=rng.normal(size=EMBEDDING_DIM).tolist(),
+            kcal=100.0, protein_g=None, carbs_g=None, fat_g=None, fiber_g=None, sugar_g=None, sodium_mg=None,
+        )
+        for i in range(240)
+    ]
+    index = VectorIndex.from_rows(rows)
+    assert index.partitions.sizes()[("thai", "restaurant")] == 40 and len(index.partitions) == 6
+    # rows are interleaved here, so partitions are gathered; a snapshot stores them contiguously
+    assert not isinstance(index.partitions.rows(search_filter("thai")), slice)
+    index.save(str(tmp_path))
+    loaded = VectorIndex.load(str(tmp_path))
+    grouped = VectorIndex.from_rows(sorted(rows, key=lambda r: (str(r.cuisine).strip().lower(), r.style)))
+    assert isinstance(grouped.partitions.rows(search_filter("thai")), slice)
+
+    queries = rng.normal(size=(6, EMBEDDING_DIM)).astype(np.float32)
+    unit = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    for where in (search_filter("THAI"), search_filter(style="restaurant"), search_filter("indian", "restaurant")):
+        for idx in (index, loaded, grouped):
+            keep = np.array([idx.matches(i, where) for i in range(len(rows))])
+            ref = np.where(keep, unit @ idx.vectors.T, -np.inf)
+            top, sims = idx.search_batch(queries, 5, where=where)
+            assert top.tolist() == np.argsort(-ref, axis=1)[:, :5].tolist()
+            np.testing.assert_allclose(sims, np.take_along_axis(ref, top, axis=1), rtol=1e-5)
+
+            exclude = np.sort(top[:, 0])
+            top, _ = idx.search_batch(queries, 5, exclude=exclude, where=where)
+            assert not np.isin(top, exclude).any() and keep[top].all()
+
+    compact = VectorIndex(grouped.dish_ids, grouped.names, grouped.vectors, grouped.nutrients, precision="int8",
+                          rerank_factor=80, cuisines=grouped.cuisines, styles=grouped.styles)
+    where = search_filter("thai")
+    want = grouped.search_batch(queries, 5, where=where)[0]
+    assert compact.search_batch(queries, 5, where=where)[0].tolist() == want.tolist()
+    top, _ = index.search_batch(queries, 5, where=search_filter("korean"))
+    assert top.shape == (6, 0)
@@ -0,0 +1,184 @@
+from collections import OrderedDict
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Union, cast
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class DiskStore:
+    """SQLite-backed vector store shared by every worker on the host.
+
+    WAL mode lets readers in other processes proceed while one writer appends.
+    Connections are per-thread because sqlite3 connections are not thread-safe.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            " model TEXT NOT NULL, text TEXT NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text)) WITHOUT ROWID"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        row = self._conn().execute(
+            "SELECT vector FROM query_embeddings WHERE model = ? AND text = ?", (model, text)
+        ).fetchone()
+        return None if row is None else np.frombuffer(row[0], dtype=np.float32)
+
+    def put(self, model: str, text: str, vec: np.ndarray) -> None:
+        self.put_many(model, [(text, vec)])
+
+    def put_many(self, model: str, items: Sequence) -> None:
+        conn = self._conn()
+        conn.executemany(
+            "INSERT OR IGNORE INTO query_embeddings (model, text, vector) VALUES (?, ?, ?)",
+            [(model, text, np.asarray(vec, dtype=np.float32).tobytes()) for text, vec in items],
+        )
+        conn.commit()
+
+
+class EmbeddingCache:
+    """Two-level query embedding cache: a byte-bounded in-process LRU over a DiskStore.
+
+    Keys are (model name, normalized text). Cached arrays are read-only and shared
+    between callers.
+    """
+
+    def __init__(self, model: str, max_bytes: int, disk: Optional[DiskStore] = None):
+        self.model = model
+        self.max_bytes = max_bytes
+        self.disk = disk
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_errors = 0
+
+    @staticmethod
+    def _size(key: str, vec: np.ndarray) -> int:
+        return vec.nbytes + len(key) + 64
+
+    def _remember(self, key: str, vec: np.ndarray) -> None:
+        with self._lock:
+            if key in self._lru:
+                return
+            self._lru[key] = vec
+            self._bytes += self._size(key, vec)
+            while self._bytes > self.max_bytes and self._lru:
+                old_key, old_vec = self._lru.popitem(last=False)
+                self._bytes -= self._size(old_key, old_vec)
+                self.evictions += 1
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        vec = self.get_memory(text)
+        return vec if vec is not None else self.get_disk(text)
+
+    def get_memory(self, text: str) -> Optional[np.ndarray]:
+        """In-process tier only; never touches the disk, so it is safe on an event loop."""
+        key = normalize_query(text)
+        with self._lock:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+            return vec
+
+    def get_disk(self, text: str) -> Optional[np.ndarray]:
+        key = normalize_query(text)
+        if self.disk is not None:
+            try:
+                vec = self.disk.get(self.model, key)
+            except sqlite3.Error:
+                self.disk_errors += 1
+                vec = None
+            if vec is not None:
+                vec.setflags(write=False)
+                self._remember(key, vec)
+                with self._lock:
+                    self.disk_hits += 1
+                return vec
+        return None
+
+    def put(self, text: str, vec: np.ndarray) -> np.ndarray:
+        return self.put_many([text], [vec])[0]
+
+    def put_many(self, texts: Sequence[str], vecs: Union[np.ndarray, Sequence[np.ndarray]]) -> List[np.ndarray]:
+        items = []
+        for text, vec in zip(texts, vecs):
+            vec = np.array(vec, dtype=np.float32)
+            vec.setflags(write=False)
+            key = normalize_query(text)
+            self._remember(key, vec)
+            items.append((key, vec))
+        if self.disk is not None and items:
+            try:
+                self.disk.put_many(self.model, items)
+            except sqlite3.Error:
+                self.disk_errors += 1
+        return [vec for _, vec in items]
+
+    def count_misses(self, n: int = 1) -> None:
+        with self._lock:
+            self.misses += n
+
+    def get_or_compute(self, text: str, compute: Callable[[str], np.ndarray]) -> np.ndarray:
+        vec = self.get(text)
+        if vec is not None:
+            return vec
+        self.count_misses()
+        # encode the normalized text so every spelling that shares a key gets the same vector
+        return self.put(text, compute(normalize_query(text)))
+
+    def get_or_compute_many(
+        self, texts: Sequence[str], compute_many: Callable[[List[str]], np.ndarray]
+    ) -> List[np.ndarray]:
+        found: Dict[str, Optional[np.ndarray]] = {}
+        for t in texts:
+            key = normalize_query(t)
+            if key not in found:
+                found[key] = self.get(key)
+        missing = [key for key, vec in found.items() if vec is None]
+        if missing:
+            self.count_misses(len(missing))
+            for key, vec in zip(missing, self.put_many(missing, compute_many(missing))):
+                found[key] = vec
+        return [cast(np.ndarray, found[normalize_query(t)]) for t in texts]
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, nbytes = len(self._lru), self._bytes
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_errors": self.disk_errors,
+            "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": nbytes,
+        }
@@ -0,0 +1,192 @@
+# One encoder process per host, shared by every API worker over a Unix socket.
+#
+# Each worker process would otherwise load its own copy of the model. With
+# EMBED_SERVER_SOCKET set, get_model() returns a RemoteEncoder instead, and
+# `python -m scripts.embedding_server` owns the only model; requests from all workers
+# go through one EmbeddingBatcher there, so they also coalesce into shared batches.
+#
+# Frames are a 4-byte big-endian length followed by the payload. A request is a JSON
+# list of texts; a reply is a status byte, then either (rows, dim) as two big-endian
+# uint32 and the float32 matrix, or a UTF-8 error message.
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+from typing import Callable, List, Sequence, Set
+
+import numpy as np
+
+from app.utils.embeddings import EmbeddingBatcher
+
+logger = logging.getLogger(__name__)
+
+_LEN = struct.Struct(">I")
+_SHAPE = struct.Struct(">II")
+OK, ERROR = b"\x00", b"\x01"
+MAX_FRAME = 64 * 1024 * 1024
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        r = sock.recv_into(view[got:])
+        if r == 0:
+            raise ConnectionError("embedding server connection closed")
+        got += r
+    return bytes(buf)
+
+
+def send_frame(sock: socket.socket, payload: bytes) -> None:
+    sock.sendall(_LEN.pack(len(payload)) + payload)
+
+
+def recv_frame(sock: socket.socket) -> bytes:
+    (n,) = _LEN.unpack(_recv_exact(sock, _LEN.size))
+    if n > MAX_FRAME:
+        raise ConnectionError(f"embedding frame of {n} bytes exceeds {MAX_FRAME}")
+    return _recv_exact(sock, n)
+
+
+def encode_reply(vectors: np.ndarray) -> bytes:
+    v = np.ascontiguousarray(vectors, dtype=np.float32)
+    return OK + _SHAPE.pack(*v.shape) + v.tobytes()
+
+
+def decode_reply(payload: bytes) -> np.ndarray:
+    if payload[:1] != OK:
+        raise RuntimeError(f"embedding server error: {payload[1:].decode('utf-8', 'replace')}")
+    rows, dim = _SHAPE.unpack_from(payload, 1)
+    return np.frombuffer(payload, dtype=np.float32, offset=1 + _SHAPE.size).reshape(rows, dim)
+
+
+class RemoteEncoder:
+    """Stands in for the SentenceTransformer in API workers; ``encode`` asks the server.
+
+    Connections are per thread and reconnect once if the server went away (e.g. was
+    restarted) between calls.
+    """
+
+    def __init__(self, path: str, timeout_s: float = 30.0):
+        self.path = path
+        self.timeout_s = timeout_s
+        self._local = threading.local()
+
+    def _sock(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout_s)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _drop(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def _request(self, payload: bytes) -> bytes:
+        try:
+            sock = self._sock()
+            send_frame(sock, payload)
+            return recv_frame(sock)
+        except OSError:
+            # a half-read reply leaves the stream out of step; never reuse it
+            self._drop()
+            raise
+
+    def encode(self, texts: Sequence[str], normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        payload = json.dumps(list(texts)).encode("utf-8")
+        try:
+            reply = self._request(payload)
+        except OSError:
+            # the server may have restarted since this thread connected
+            reply = self._request(payload)
+        return decode_reply(reply)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: "EmbeddingServer"
+
+    def setup(self) -> None:
+        with self.server.lock:
+            self.server.connections.add(self.request)
+
+    def finish(self) -> None:
+        with self.server.lock:
+            self.server.connections.discard(self.request)
+
+    def handle(self) -> None:
+        # one connection per client thread, serving requests until it disconnects
+        while True:
+            try:
+                request = recv_frame(self.request)
+            except OSError:
+                return
+            try:
+                texts = json.loads(request)
+                futures = self.server.batcher.submit_many(texts)
+                reply = encode_reply(np.stack([f.result() for f in futures]) if futures else np.empty((0, 0)))
+            except Exception as e:
+                logger.exception("encode failed for %d bytes of request", len(request))
+                reply = ERROR + str(e).encode("utf-8")
+            try:
+                send_frame(self.request, reply)
+            except OSError:
+                return  # the client gave up waiting
+
+
+class EmbeddingServer(socketserver.ThreadingUnixStreamServer):
+    """Serves ``encode_fn`` on a Unix socket, batching texts across all connections."""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, encode_fn: Callable[[List[str]], np.ndarray], max_batch_size: int = 32,
+                 max_wait_ms: float = 3.0):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connections: Set[socket.socket] = set()
+        self.batcher = EmbeddingBatcher(encode_fn, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                os.unlink(path)  # stale socket from a previous run
+            else:
+                raise RuntimeError(f"an embedding server is already listening on {path}")
+            finally:
+                probe.close()
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o660)
+
+    def server_close(self) -> None:
+        super().server_close()
+        # clients see the restart at once rather than talking to orphaned handler threads
+        with self.lock:
+            for conn in self.connections:
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def serve_in_thread(server: EmbeddingServer) -> threading.Thread:
+    t = threading.Thread(target=server.serve_forever, name="embedding-server", daemon=True)
+    t.start()
+    return t
@@ -1,17 +1,291 @@
-from functools import lru_cache
+import asyncio
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import contextvars
+import functools
+import queue
+import threading
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from app.core.settings import settings
+from app.utils.embedding_cache import DiskStore, EmbeddingCache, normalize_query
+from app.utils.metrics import REGISTRY, SIZE_BUCKETS
 
 _model = None
+_model_lock = threading.Lock()
+
+BACKENDS = ("torch", "onnx", "int8")
+# one short and one padded-out text, at batch sizes 1 and EMBED_BATCH_MAX_SIZE
+WARMUP_TEXTS = ("pad thai", "grilled chicken caesar salad with parmesan, croutons and extra dressing on the side")
+
+BATCH_SIZE = REGISTRY.histogram("embedding_batch_size", "Texts per model encode call.", buckets=SIZE_BUCKETS)
+ENCODE_SECONDS = REGISTRY.histogram("embedding_encode_seconds", "Model encode time per batch.")
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "embedding_queue_wait_seconds", "Time the oldest text in a batch waited for the encoder."
+)
+
+def check_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"embedding backend must be one of {BACKENDS}, got {backend!r}")
+    return backend
+
+def load_model(name: Optional[str] = None, backend: Optional[str] = None):
+    """EMBEDDING_MODEL on EMBEDDING_BACKEND; anything with SentenceTransformer's ``encode``."""
+    name = name or settings.EMBEDDING_MODEL
+    backend = check_backend(backend or settings.EMBEDDING_BACKEND)
+    # imported here so processes that never encode (alembic, most scripts, API workers
+    # using the embedding server) never load torch
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        kwargs = {"file_name": settings.EMBEDDING_ONNX_FILE} if settings.EMBEDDING_ONNX_FILE else None
+        return SentenceTransformer(name, device="cpu", backend="onnx", model_kwargs=kwargs)
+    if backend == "int8":
+        import torch
+        from torch.ao.quantization import quantize_dynamic
+
+        model = SentenceTransformer(name, device="cpu")
+        return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return SentenceTransformer(name)
+
+def model_key() -> str:
+    """Identifies the vectors get_model() produces; int8 and ONNX exports differ slightly from torch."""
+    backend = settings.EMBEDDING_BACKEND
+    if backend == "torch":
+        return settings.EMBEDDING_MODEL
+    if backend == "onnx" and settings.EMBEDDING_ONNX_FILE:
+        return f"{settings.EMBEDDING_MODEL}@onnx:{settings.EMBEDDING_ONNX_FILE}"
+    return f"{settings.EMBEDDING_MODEL}@{backend}"
 
 def get_model():
     global _model
     if _model is None:
-        _model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+        with _model_lock:
+            if _model is None:
+                if settings.EMBED_SERVER_SOCKET:
+                    from app.utils.embedding_server import RemoteEncoder
+
+                    _model = RemoteEncoder(settings.EMBED_SERVER_SOCKET, settings.EMBED_SERVER_TIMEOUT_S)
+                else:
+                    _model = load_model()
     return _model
 
-@lru_cache(maxsize=2048)
-def embed_text(text: str) -> np.ndarray:
-    model = get_model()
-    v = model.encode([text], normalize_embeddings=False)[0]
+def warm_up(batch_size: Optional[int] = None) -> float:
+    """Load the encoder and run it once per batch shape the API uses; returns seconds taken.
+
+    The first encodes after a load are several times slower (lazy allocations, kernel
+    selection, tokenizer caches); paying for them here keeps them off the first requests.
+    """
+    t0 = time.perf_counter()
+    n = max(1, batch_size or settings.EMBED_BATCH_MAX_SIZE)
+    get_model().encode(list(WARMUP_TEXTS[:1]), normalize_embeddings=False)
+    get_model().encode([WARMUP_TEXTS[i % 2] for i in range(n)], normalize_embeddings=False)
+    return time.perf_counter() - t0
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    t0 = time.perf_counter()
+    v = get_model().encode(texts, normalize_embeddings=False)
+    ENCODE_SECONDS.observe(time.perf_counter() - t0)
+    BATCH_SIZE.observe(len(texts))
     return np.asarray(v, dtype=np.float32)
+
+
+class BatchStats:
+    """Running counters for the batcher; recent batches are kept for percentiles."""
+
+    def __init__(self, window: int = 1024):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_batch_size = 0
+        self.total_encode_s = 0.0
+        self._recent: deque = deque(maxlen=window)  # (batch_size, encode_s, queue_wait_s)
+
+    def record(self, size: int, encode_s: float, queue_wait_s: float) -> None:
+        with self._lock:
+            self.batches += 1
+            self.items += size
+            self.max_batch_size = max(self.max_batch_size, size)
+            self.total_encode_s += encode_s
+            self._recent.append((size, encode_s, queue_wait_s))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = list(self._recent)
+            out = {
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "mean_encode_ms": 1000 * self.total_encode_s / self.batches if self.batches else 0.0,
+            }
+        if recent:
+            sizes = np.array([r[0] for r in recent])
+            encode_ms = 1000 * np.array([r[1] for r in recent])
+            wait_ms = 1000 * np.array([r[2] for r in recent])
+            out.update({
+                "recent_batch_size_p50": float(np.percentile(sizes, 50)),
+                "recent_encode_ms_p50": float(np.percentile(encode_ms, 50)),
+                "recent_encode_ms_p99": float(np.percentile(encode_ms, 99)),
+                "recent_queue_wait_ms_p99": float(np.percentile(wait_ms, 99)),
+            })
+        return out
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text encodes into one batched model call.
+
+    Callers get a Future per text. A background thread takes the first queued text,
+    then keeps collecting until ``max_batch_size`` texts are queued or ``max_wait_ms``
+    has passed since that first text, and encodes the whole batch at once.
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], np.ndarray] = _encode_batch,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 3.0,
+    ):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000.0
+        self.stats = BatchStats()
+        self._queue: "queue.Queue[Tuple[str, Future, float]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    t = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    t.start()
+                    self._thread = t
+
+    def submit(self, text: str) -> "Future[np.ndarray]":
+        self._ensure_started()
+        fut: Future = Future()
+        self._queue.put((text, fut, time.perf_counter()))
+        return fut
+
+    def submit_many(self, texts: Sequence[str]) -> List["Future[np.ndarray]"]:
+        return [self.submit(t) for t in texts]
+
+    def encode(self, text: str) -> np.ndarray:
+        return self.submit(text).result()
+
+    def _collect(self) -> List[Tuple[str, Future, float]]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = [b for b in self._collect() if b[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            t0 = time.perf_counter()
+            try:
+                vecs = self.encode_fn([text for text, _, _ in batch])
+            except Exception as e:
+                for _, fut, _ in batch:
+                    fut.set_exception(e)
+                continue
+            encode_s = time.perf_counter() - t0
+            for (_, fut, _), v in zip(batch, vecs):
+                fut.set_result(np.asarray(v, dtype=np.float32))
+            self.stats.record(len(batch), encode_s, t0 - batch[0][2])
+            QUEUE_WAIT_SECONDS.observe(t0 - batch[0][2])
+
+
+_batcher: Optional[EmbeddingBatcher] = None
+_batcher_lock = threading.Lock()
+
+def get_batcher() -> EmbeddingBatcher:
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = EmbeddingBatcher(
+                    max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+                    max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS,
+                )
+    return _batcher
+
+def encode_query(text: str) -> np.ndarray:
+    return get_batcher().encode(text)
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> EmbeddingCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                path = settings.EMBED_CACHE_PATH
+                _cache = EmbeddingCache(
+                    model=model_key(),
+                    max_bytes=settings.EMBED_CACHE_MAX_BYTES,
+                    disk=DiskStore(path) if path else None,
+                )
+    return _cache
+
+def embed_text(text: str) -> np.ndarray:
+    return get_cache().get_or_compute(text, encode_query)
+
+def embed_texts(texts: Sequence[str]) -> np.ndarray:
+    """Embed many texts through the cache, encoding all misses in one model call."""
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.stack(get_cache().get_or_compute_many(texts, _encode_batch))
+
+
+# --- async path ---------------------------------------------------------------------
+# Event-loop callers never block on encoding: single texts await the batcher's Future
+# directly, and blocking work (sqlite lookups, whole-batch encodes) runs on a small
+# dedicated executor instead of the loop's default pool.
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max(1, settings.EMBED_EXECUTOR_WORKERS), thread_name_prefix="embed"
+                )
+    return _executor
+
+async def _in_executor(fn: Callable, *args):
+    # run_in_executor drops contextvars; carry them so stage timings reach Server-Timing
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), functools.partial(ctx.run, fn, *args))
+
+async def aembed_text(text: str) -> np.ndarray:
+    cache = get_cache()
+    vec = cache.get_memory(text)
+    if vec is not None:
+        return vec
+    if cache.disk is not None:
+        vec = await _in_executor(cache.get_disk, text)
+        if vec is not None:
+            return vec
+    cache.count_misses()
+    vec = await asyncio.wrap_future(get_batcher().submit(normalize_query(text)))
+    return await _in_executor(cache.put, text, vec)
+
+async def aembed_texts(texts: Sequence[str]) -> np.ndarray:
+    return await _in_executor(embed_texts, list(texts))
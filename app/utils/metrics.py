@@ -0,0 +1,252 @@
+"""In-process metrics with Prometheus text exposition and per-request stage timings.
+
+Each observation costs two perf_counter calls, a bisect and a short lock, so the
+instrumentation stays on in production. Stages timed inside a request are also
+collected into a per-request dict (a contextvar) that TimingMiddleware turns into a
+``Server-Timing`` header.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+import functools
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar, cast
+
+# seconds; covers sub-millisecond numpy work up to multi-second slow requests
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_value(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+_M = TypeVar("_M", bound=_Metric)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, *label_values: str) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}_total{_fmt_labels(self.labels, k)} {_fmt_value(v)}" for k, v in items
+        ]
+
+
+class Gauge(_Metric):
+    """A gauge read from a callback at scrape time, so the hot path never touches it."""
+    kind = "gauge"
+
+    def __init__(self, name, help, fn: Callable[[], Dict[tuple, float]], labels=()):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            items = list(self.fn().items())
+        except Exception:
+            items = []
+        return self.header() + [
+            f"{self.name}{_fmt_labels(self.labels, k)} {_fmt_value(float(v))}" for k, v in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # per label set: [bucket counts..., +Inf count], sum
+        self._series: Dict[tuple, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][i] += 1
+            series[1][0] += value
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(c), s[0]) for k, (c, s) in self._series.items()]
+        out = self.header()
+        for k, counts, total in items:
+            cum = 0
+            for bound, c in zip(self.buckets + (math.inf,), counts):
+                cum += c
+                le = 'le="' + _fmt_value(float(bound)) + '"'
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labels, k, le)} {cum}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, k)} {_fmt_value(total)}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, k)} {cum}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _M) -> _M:
+        with self._lock:
+            # a name registered again (a reloaded module) keeps its first metric
+            return cast(_M, self._metrics.setdefault(metric.name, metric))
+
+    def counter(self, name, help, labels=()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, fn, labels=()) -> Gauge:
+        return self.register(Gauge(name, help, fn, labels))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for m in metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "label_stage_seconds", "Time spent in each hot-path stage.", labels=("stage",)
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "End-to-end request latency.", labels=("method", "route", "status")
+)
+
+# stage name -> seconds accumulated for the current request (None outside a request)
+_request_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_stages", default=None)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - t0)
+
+
+def timed_fn(stage: str):
+    """Decorator form of ``timed`` for sync functions."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record_stage(stage, time.perf_counter() - t0)
+        return inner
+    return wrap
+
+
+def server_timing(stages: Dict[str, float], total_s: float) -> str:
+    parts = [f"{name};dur={1000 * s:.2f}" for name, s in stages.items()]
+    parts.append(f"total;dur={1000 * total_s:.2f}")
+    return ", ".join(parts)
+
+
+class TimingMiddleware:
+    """ASGI middleware: request latency histogram plus a Server-Timing header.
+
+    Written against raw ASGI rather than BaseHTTPMiddleware so it adds no extra task
+    or body buffering per request. ``on_finish(path, start, end)`` is called on the event
+    loop after each request (used by the slow-request profiler), so it must not block.
+    """
+
+    def __init__(self, app, on_finish: Optional[Callable[[str, float, float], object]] = None):
+        self.app = app
+        self.on_finish = on_finish
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stages: Dict[str, float] = {}
+        token = _request_stages.set(stages)
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                headers = list(message.get("headers", []))
+                value = server_timing(stages, time.perf_counter() - t0)
+                headers.append((b"server-timing", value.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            t1 = time.perf_counter()
+            _request_stages.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(t1 - t0, scope.get("method", ""), path, str(status[0]))
+            if self.on_finish is not None:
+                self.on_finish(scope.get("path", ""), t0, t1)
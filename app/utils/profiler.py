@@ -0,0 +1,89 @@
+"""Opt-in sampling profiler for slow requests.
+
+A daemon thread samples every thread's Python stack at a fixed interval into a ring
+buffer. When a request takes longer than the threshold, the samples taken while it was
+in flight are written as folded stacks (one ``frame;frame;frame count`` line per
+distinct stack), which flamegraph.pl and speedscope read directly; the sampler thread
+writes them, never the request's event loop. Samples cover the whole process, so
+concurrent requests show up in each other's profiles.
+"""
+from collections import Counter, deque
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Deque, Optional, Tuple
+
+
+def _fold(frame, thread_name: str) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+class SlowRequestProfiler:
+    def __init__(self, threshold_ms: float, interval_ms: float = 5.0, out_dir: str = "data/profiles",
+                 window_s: float = 30.0):
+        self.threshold_s = threshold_ms / 1000.0
+        self.interval_s = max(interval_ms, 0.5) / 1000.0
+        self.out_dir = out_dir
+        self._samples: Deque[Tuple[float, str]] = deque(maxlen=int(window_s / self.interval_s) * 8)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # (path, folded stack counts) waiting to be written
+        self._dumps: "queue.SimpleQueue[Tuple[str, Counter]]" = queue.SimpleQueue()
+        self.dumps = 0
+
+    def start(self) -> None:
+        if self._thread is None:
+            os.makedirs(self.out_dir, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._write_dumps()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            now = time.perf_counter()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    self._samples.append((now, _fold(frame, names.get(ident, str(ident)))))
+            self._write_dumps()
+
+    def _write_dumps(self) -> None:
+        while True:
+            try:
+                out, stacks = self._dumps.get_nowait()
+            except queue.Empty:
+                return
+            with open(out, "w") as f:
+                for stack, n in stacks.most_common():
+                    f.write(f"{stack} {n}\n")
+            self.dumps += 1
+
+    def on_finish(self, path: str, start: float, end: float) -> Optional[str]:
+        """Queue a dump of a finished request's samples if it was slow; returns the file it goes to.
+
+        Called on the event loop, so the file is written by the sampler thread within one
+        interval (or by ``stop``).
+        """
+        if end - start < self.threshold_s:
+            return None
+        stacks = Counter(s for t, s in list(self._samples) if start <= t <= end)
+        if not stacks:
+            return None
+        slug = path.strip("/").replace("/", "_") or "root"
+        out = os.path.join(self.out_dir, f"{time.strftime('%Y%m%dT%H%M%S')}_{slug}_{int(1000 * (end - start))}ms.folded")
+        self._dumps.put((out, stacks))
+        return out
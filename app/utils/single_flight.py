@@ -0,0 +1,69 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, List, Sequence, Tuple
+
+from app.core.settings import settings
+from app.utils.metrics import REGISTRY
+
+FLIGHT_KEYS = REGISTRY.counter(
+    "single_flight_keys",
+    "Keys requested through a single-flight group, by whether they started a computation or joined one.",
+    labels=("group", "role"),
+)
+
+
+class SingleFlight:
+    """Shares one in-progress computation among concurrent callers asking for the same key.
+
+    This is not a cache: a key is forgotten as soon as its computation finishes, so only
+    requests that overlap in time are collapsed. The computation runs as a task of its
+    own, so a cancelled caller does not cancel it for the others. Its exception is raised
+    in every caller.
+    """
+
+    def __init__(self, group: str):
+        self.group = group
+        self.leaders = 0
+        self.coalesced = 0
+        self._calls: Dict[Hashable, Tuple[asyncio.Future, int]] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        async def one(_):
+            return [await fn()]
+
+        return (await self.do_many([key], one))[0]
+
+    async def do_many(self, keys: Sequence[Hashable], fn: Callable[[List], Awaitable[List]]) -> List:
+        """Results for distinct ``keys``, in order.
+
+        ``fn(missing)`` returns the results for the keys no one else is computing, in the
+        order given; the rest are awaited from the calls already running.
+        """
+        if not settings.SINGLE_FLIGHT:
+            return await fn(list(keys))
+        loop = asyncio.get_running_loop()
+        running = [self._calls.get(key) for key in keys]
+        # a call left behind by another event loop (tests, worker restarts) cannot be joined
+        missing = [key for key, call in zip(keys, running) if call is None or call[0].get_loop() is not loop]
+        if missing:
+            task = asyncio.ensure_future(fn(missing))
+            task.add_done_callback(lambda t: self._forget(missing, t))
+            for j, key in enumerate(missing):
+                self._calls[key] = (task, j)
+        calls = [self._calls[key] for key in keys]
+        joined = len(keys) - len(missing)
+        self.leaders += len(missing)
+        self.coalesced += joined
+        FLIGHT_KEYS.inc(float(len(missing)), self.group, "leader")
+        if joined:
+            FLIGHT_KEYS.inc(float(joined), self.group, "coalesced")
+        return [(await asyncio.shield(task))[j] for task, j in calls]
+
+    def _forget(self, keys, task) -> None:
+        for key in keys:
+            if self._calls.get(key, (None,))[0] is task:
+                del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved, even if every caller was cancelled meanwhile
+
+    def stats(self) -> dict:
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._calls)}
@@ -0,0 +1,67 @@
+"""Compare a benchmark run against a stored baseline.
+
+A stage regresses when its p50 latency rises, or its throughput falls, by more than
+``threshold`` (a fraction) relative to the baseline. Stages present in only one file are
+listed but never fail the comparison, so adding a stage does not need a new baseline.
+
+    python -m benchmarks.compare baseline.json current.json --threshold 0.15
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+
+def load(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> Tuple[List[str], List[str]]:
+    """Return (report lines, regressed stage names)."""
+    base = {r["stage"]: r for r in baseline["results"]}
+    lines = [f"{'stage':<28} {'p50 ms':>9} {'base':>9} {'ratio':>6}   {'thru/s':>10} {'base':>10} {'ratio':>6}"]
+    regressed = []
+    for r in current["results"]:
+        b = base.pop(r["stage"], None)
+        if b is None:
+            lines.append(f"{r['stage']:<28} {r['p50_ms']:>9.3f} {'-':>9} {'':>6}   {r['throughput']:>10.1f}   (new)")
+            continue
+        lat = r["p50_ms"] / b["p50_ms"] if b["p50_ms"] else 1.0
+        thr = r["throughput"] / b["throughput"] if b["throughput"] else 1.0
+        bad = lat > 1 + threshold or thr < 1 - threshold
+        if bad:
+            regressed.append(r["stage"])
+        lines.append(
+            f"{r['stage']:<28} {r['p50_ms']:>9.3f} {b['p50_ms']:>9.3f} {lat:>6.2f}   "
+            f"{r['throughput']:>10.1f} {b['throughput']:>10.1f} {thr:>6.2f}" + ("  REGRESSED" if bad else "")
+        )
+    for stage in base:
+        lines.append(f"{stage:<28} (missing from this run)")
+    return lines, regressed
+
+
+def check(baseline_path: str, current: Dict, threshold: float) -> bool:
+    baseline = load(baseline_path)
+    if baseline.get("config", {}).get("size") != current.get("config", {}).get("size"):
+        print(f"warning: baseline catalog size {baseline.get('config', {}).get('size')} "
+              f"!= current {current.get('config', {}).get('size')}")
+    lines, regressed = compare(baseline, current, threshold)
+    print("\n".join(lines))
+    if regressed:
+        print(f"{len(regressed)} stage(s) regressed more than {100 * threshold:.0f}%: {', '.join(regressed)}")
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if a benchmark run regressed against a baseline.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args()
+    sys.exit(0 if check(args.baseline, load(args.current), args.threshold) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Cold start and encode latency of the sentence encoder on each EMBEDDING_BACKEND.
+
+Every backend is measured in a fresh process: importing sentence_transformers, loading
+the model, the first encode (what warm-up takes off the first request), then p50/p99 at
+batch size 1 and --batch-size. Vectors are compared with the torch backend's by mean
+cosine similarity, since int8 and ONNX exports only approximate them. Needs the model,
+downloaded or as a local path in --model.
+
+    python -m benchmarks.encoder --backends torch int8 onnx --out encoder.json
+"""
+import argparse
+import json
+import multiprocessing as mp
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from app.core.settings import settings
+from benchmarks.harness import run_sync
+from benchmarks.synthetic import HashingEncoder, make_catalog, make_queries
+
+
+def _measure(backend: str, args, texts: List[str], results) -> None:
+    try:
+        t0 = time.perf_counter()
+        import sentence_transformers  # noqa: F401  (cold import is part of startup)
+
+        t_import = time.perf_counter() - t0
+        from app.utils.embeddings import load_model
+
+        settings.EMBEDDING_ONNX_FILE = args.onnx_file
+        t0 = time.perf_counter()
+        model = load_model(args.model, backend)
+        t_load = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        model.encode(texts[:1])
+        t_first = time.perf_counter() - t0
+
+        def batch(n):
+            def fn(i):
+                start = (i * n) % (len(texts) - n)
+                model.encode(texts[start:start + n])
+                return n
+            return fn
+
+        one = run_sync("batch_1", batch(1), args.seconds)
+        many = run_sync(f"batch_{args.batch_size}", batch(args.batch_size), args.seconds)
+        vectors = np.asarray(model.encode(texts[:256]), dtype=np.float32)
+        results.put({
+            "backend": backend, "import_s": t_import, "load_s": t_load, "first_encode_ms": 1000 * t_first,
+            "cold_start_s": t_import + t_load + t_first,
+            "batch_1_p50_ms": one["p50_ms"], "batch_1_p99_ms": one["p99_ms"],
+            "batch_n_p50_ms": many["p50_ms"], "batch_n_p99_ms": many["p99_ms"],
+            "texts_per_s": many["throughput"], "rss_mb": many["rss_mb"], "vectors": vectors.tolist(),
+        })
+    except Exception as e:
+        results.put({"backend": backend, "error": f"{type(e).__name__}: {e}"})
+
+
+def _cosine(a: np.ndarray, b: np.ndarray) -> float:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return float(np.mean(np.sum(a * b, axis=1)))
+
+
+def run(args) -> List[Dict]:
+    texts = make_queries(make_catalog(2000, args.seed, HashingEncoder()), 1000, args.seed + 1)
+    ctx = mp.get_context("spawn")
+    out = []
+    print(f"{'backend':>8} {'cold s':>7} {'load s':>7} {'1st ms':>7} {'b1 p50':>7} {'b1 p99':>7} "
+          f"{'bN p50':>7} {'texts/s':>8} {'cos':>6}")
+    for backend in args.backends:
+        results = ctx.Queue()
+        p = ctx.Process(target=_measure, args=(backend, args, texts, results))
+        p.start()
+        row = results.get()
+        p.join()
+        out.append(row)
+        if "error" in row:
+            print(f"{backend:>8} failed: {row['error']}")
+            continue
+        ref = next((r for r in out if r["backend"] == "torch" and "vectors" in r), None)
+        row["cosine_vs_torch"] = _cosine(np.asarray(row["vectors"]), np.asarray(ref["vectors"])) if ref else None
+        cos = f"{row['cosine_vs_torch']:.4f}" if row["cosine_vs_torch"] is not None else "-"
+        print(f"{backend:>8} {row['cold_start_s']:>7.2f} {row['load_s']:>7.2f} {row['first_encode_ms']:>7.1f} "
+              f"{row['batch_1_p50_ms']:>7.2f} {row['batch_1_p99_ms']:>7.2f} {row['batch_n_p50_ms']:>7.2f} "
+              f"{row['texts_per_s']:>8.0f} {cos:>6}")
+    for row in out:
+        row.pop("vectors", None)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encoder cold start and latency per backend.")
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    parser.add_argument("--backends", nargs="+", default=["torch", "int8", "onnx"])
+    parser.add_argument("--onnx-file", default=settings.EMBEDDING_ONNX_FILE)
+    parser.add_argument("--batch-size", type=int, default=settings.EMBED_BATCH_MAX_SIZE)
+    parser.add_argument("--seconds", type=float, default=3.0, help="measured time per batch size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results as JSON")
+    args = parser.parse_args()
+    out = run(args)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"config": vars(args), "results": out}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
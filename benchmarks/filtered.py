@@ -0,0 +1,131 @@
+"""Cuisine/style-filtered search: scanning the partition vs over-fetching and post-filtering.
+
+Runs the in-process index over a synthetic catalog laid out as snapshots are (grouped by
+cuisine and style), for filters from none to highly selective. "partition" scores only
+the filter's rows; "post-filter" takes the global top ``k * overfetch`` and keeps the
+matching rows, which is what a filter applied after an unfiltered ANN search amounts to.
+Recall is against an exact brute force over the matching rows.
+
+    python -m benchmarks.filtered --size 100000 --k 10 --overfetch 10
+"""
+import argparse
+import json
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.services.partitions import SearchFilter, normalize_facet, search_filter
+from app.services.quantization import PRECISIONS
+from app.services.vector_index import VectorIndex
+from benchmarks.quantization import recall
+from benchmarks.synthetic import Catalog, HashingEncoder, make_catalog, make_queries
+
+
+def grouped_index(catalog: Catalog, precision: str = "float32") -> VectorIndex:
+    """The catalog as a snapshot stores it: rows ordered by cuisine, then style."""
+    cuisines = np.asarray([normalize_facet(c) for c in catalog.cuisines], dtype=str)
+    styles = np.asarray([normalize_facet(s) for s in catalog.styles or [""] * len(cuisines)], dtype=str)
+    order = np.lexsort((styles, cuisines))
+    return VectorIndex(
+        catalog.dish_ids[order], catalog.names[order], catalog.vectors[order], catalog.nutrients[order],
+        precision=precision, cuisines=cuisines[order], styles=styles[order],
+    )
+
+
+def filters(catalog: Catalog) -> Dict[str, Optional[SearchFilter]]:
+    """No filter, a median-sized cuisine, that cuisine in restaurant style, and the style alone."""
+    counts = Counter(catalog.cuisines).most_common()
+    cuisine = counts[len(counts) // 2][0]
+    return {
+        "none": None,
+        "cuisine": search_filter(cuisine),
+        "cuisine+style": search_filter(cuisine, "restaurant"),
+        "style": search_filter(style="restaurant"),
+    }
+
+
+def exact_top(index: VectorIndex, queries: np.ndarray, k: int, where: Optional[SearchFilter]) -> np.ndarray:
+    sims = queries @ np.asarray(index.vectors).T
+    if where is not None:
+        keep = np.array([index.matches(i, where) for i in range(len(index.dish_ids))])
+        sims[:, ~keep] = -np.inf
+    k = min(k, int(np.isfinite(sims[0]).sum()))
+    return np.argsort(-sims, axis=1, kind="stable")[:, :k]
+
+
+def post_filter(index: VectorIndex, queries: np.ndarray, k: int, where: Optional[SearchFilter],
+                overfetch: int) -> np.ndarray:
+    if where is None:
+        return index.search_batch(queries, k)[0]
+    top, _ = index.search_batch(queries, k * overfetch)
+    out = np.full((len(top), k), -1, dtype=np.int64)
+    for j, row in enumerate(top.tolist()):
+        kept = [i for i in row if i >= 0 and index.matches(i, where)][:k]
+        out[j, :len(kept)] = kept
+    return out
+
+
+def measure(search, queries: np.ndarray, batch: int) -> Dict:
+    search(queries[:batch])  # warm up
+    latencies = []
+    tops = []
+    for start in range(0, len(queries), batch):
+        t0 = time.perf_counter()
+        top = search(queries[start:start + batch])
+        latencies.append((time.perf_counter() - t0) / len(top))
+        tops.append(top)
+    ms = 1000 * np.asarray(latencies)
+    return {"top": np.concatenate(tops), "p50_ms": float(np.percentile(ms, 50)), "p99_ms": float(np.percentile(ms, 99))}
+
+
+def run(catalog: Catalog, queries: np.ndarray, k: int, overfetch: int, batch: int, precision: str) -> List[Dict]:
+    index = grouped_index(catalog, precision)
+    results = []
+    for label, where in filters(catalog).items():
+        rows = index.partitions.rows(where) if where is not None else slice(0, len(index.dish_ids))
+        size = rows.stop - rows.start if isinstance(rows, slice) else len(rows)
+        want = exact_top(index, queries, k, where)
+        strategies = {"partition": lambda q, w=where: index.search_batch(q, k, where=w)[0]}
+        if where is not None:
+            strategies["post-filter"] = lambda q, w=where: post_filter(index, q, k, w, overfetch)
+        for strategy, search in strategies.items():
+            m = measure(search, queries, batch)
+            results.append({
+                "filter": label, "strategy": strategy, "rows": size, "contiguous": isinstance(rows, slice),
+                "recall": recall(m["top"], want) if want.shape[1] else 1.0,
+                "filled": float((m["top"] >= 0).sum(axis=1).mean() / max(1, want.shape[1])),
+                "p50_ms": m["p50_ms"], "p99_ms": m["p99_ms"],
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partitioned filtered search vs global top-k with post-filtering.")
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--overfetch", type=int, default=10, help="post-filter candidates per result")
+    parser.add_argument("--batch", type=int, default=1, help="queries per search call")
+    parser.add_argument("--precision", choices=PRECISIONS, default="float32")
+    parser.add_argument("--out", help="write results as JSON")
+    args = parser.parse_args()
+
+    catalog = make_catalog(args.size, args.seed)
+    queries = HashingEncoder().encode(make_queries(catalog, args.queries, args.seed + 1), normalize_embeddings=True)
+    results = run(catalog, queries, args.k, args.overfetch, args.batch, args.precision)
+
+    print(f"{args.size} dishes, {args.queries} queries, {args.precision}, recall@{args.k} vs exact filtered search")
+    print(f"{'filter':>13} {'strategy':>11} {'rows':>8} {'recall':>7} {'filled':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for r in results:
+        print(f"{r['filter']:>13} {r['strategy']:>11} {r['rows']:>8} {r['recall']:>7.3f} {r['filled']:>7.3f} "
+              f"{r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Timing loops and result records shared by the benchmark stages."""
+import asyncio
+import os
+import resource
+import time
+import tracemalloc
+from typing import Awaitable, Callable, Dict, List
+
+import numpy as np
+
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_mb() -> float:
+    """Current resident set size; falls back to the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE / 2**20
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if peak > 2**32 else peak / 1024
+
+
+def summarize(stage: str, latencies: List[float], elapsed: float, items: int, errors: int = 0, **extra) -> Dict:
+    ms = 1000 * np.asarray(latencies) if latencies else np.zeros(1)
+    return {
+        "stage": stage,
+        "calls": len(latencies),
+        "errors": errors,
+        "throughput": items / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "rss_mb": rss_mb(),
+        **extra,
+    }
+
+
+def alloc_kb(fn: Callable[[int], int], calls: int = 5) -> float:
+    """Mean peak Python heap growth of one ``fn(i)`` call, in KiB (numpy buffers included)."""
+    tracemalloc.start()
+    try:
+        peaks = []
+        for i in range(calls):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            fn(i)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks) / 1024
+
+
+def run_sync(stage: str, fn: Callable[[int], int], seconds: float, warmup: int = 3, **extra) -> Dict:
+    """Call ``fn(i)`` back to back for ``seconds``; ``fn`` returns how many items it processed."""
+    for i in range(warmup):
+        fn(i)
+    # measured outside the timed loop, tracing slows every allocation down
+    extra.setdefault("alloc_kb", alloc_kb(fn))
+    latencies: List[float] = []
+    items = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    i = 0
+    while True:
+        t0 = time.perf_counter()
+        items += fn(i)
+        t1 = time.perf_counter()
+        latencies.append(t1 - t0)
+        i += 1
+        if t1 >= deadline:
+            break
+    return summarize(stage, latencies, time.perf_counter() - start, items, **extra)
+
+
+async def run_closed_loop(stage: str, fn: Callable[[int], Awaitable[bool]], concurrency: int, seconds: float,
+                          warmup: int = 3, **extra) -> Dict:
+    """``concurrency`` workers each await ``fn(i)`` back to back; ``fn`` returns False on error."""
+    for i in range(warmup):
+        await fn(i)
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+
+    async def worker(w: int):
+        nonlocal errors
+        i = w
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            ok = await fn(i)
+            if ok:
+                latencies.append(time.perf_counter() - t0)
+            else:
+                errors += 1
+            i += concurrency
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return summarize(stage, latencies, elapsed, len(latencies), errors, concurrency=concurrency, **extra)
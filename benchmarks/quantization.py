@@ -0,0 +1,82 @@
+"""Recall@k, memory and latency of each EMBEDDING_PRECISION against exact float32 search.
+
+Runs the in-process index over a synthetic catalog; recall is the overlap of each
+query's top k with the exact float32 top k. Resident bytes are what the first pass
+scans per row (the float32 rows used for re-ranking can stay memory-mapped).
+
+    python -m benchmarks.quantization --size 100000 --k 10 --rerank 1 4 10
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from app.services.quantization import PRECISIONS
+from app.services.vector_index import VectorIndex
+from benchmarks.synthetic import HashingEncoder, make_catalog, make_queries
+
+
+def recall(got: np.ndarray, want: np.ndarray) -> float:
+    k = want.shape[1]
+    return float(np.mean([len(set(g) & set(w)) / k for g, w in zip(got.tolist(), want.tolist())]))
+
+
+def measure(index: VectorIndex, queries: np.ndarray, k: int, batch: int) -> Dict:
+    index.search_batch(queries[:batch], k)  # warm up
+    latencies = []
+    tops = []
+    for start in range(0, len(queries), batch):
+        t0 = time.perf_counter()
+        top, _ = index.search_batch(queries[start:start + batch], k)
+        latencies.append((time.perf_counter() - t0) / len(top))
+        tops.append(top)
+    ms = 1000 * np.asarray(latencies)
+    return {"top": np.concatenate(tops), "p50_ms": float(np.percentile(ms, 50)), "p99_ms": float(np.percentile(ms, 99))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantized first pass vs exact float32 search.")
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=1, help="queries per search call")
+    parser.add_argument("--rerank", type=int, nargs="+", default=[1, 4, 10], help="RERANK_FACTOR values")
+    parser.add_argument("--out", help="write results as JSON")
+    args = parser.parse_args()
+
+    catalog = make_catalog(args.size, args.seed)
+    queries = HashingEncoder().encode(make_queries(catalog, args.queries, args.seed + 1), normalize_embeddings=True)
+    n = len(catalog.names)
+    base = VectorIndex(catalog.dish_ids, catalog.names, catalog.vectors, catalog.nutrients)
+    exact = measure(base, queries, args.k, args.batch)
+
+    results: List[Dict] = [{
+        "precision": "float32", "rerank_factor": None, "recall": 1.0,
+        "bytes_per_row": catalog.vectors.nbytes / n, "p50_ms": exact["p50_ms"], "p99_ms": exact["p99_ms"],
+    }]
+    for precision in PRECISIONS[1:]:
+        index = VectorIndex(catalog.dish_ids, catalog.names, catalog.vectors, catalog.nutrients, precision=precision)
+        size = index.codes.nbytes + (index.scales.nbytes if index.scales is not None else 0)
+        for factor in args.rerank:
+            index.rerank_factor = factor
+            m = measure(index, queries, args.k, args.batch)
+            results.append({
+                "precision": precision, "rerank_factor": factor, "recall": recall(m["top"], exact["top"]),
+                "bytes_per_row": size / n, "p50_ms": m["p50_ms"], "p99_ms": m["p99_ms"],
+            })
+
+    print(f"{args.size} dishes, {args.queries} queries, recall@{args.k} vs exact float32")
+    print(f"{'precision':>9} {'rerank':>6} {'recall':>7} {'B/row':>7} {'MB':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for r in results:
+        print(f"{r['precision']:>9} {r['rerank_factor'] or '-':>6} {r['recall']:>7.3f} {r['bytes_per_row']:>7.0f} "
+              f"{r['bytes_per_row'] * n / 2**20:>8.1f} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Benchmark the retrieval, scaling, mixture and HTTP layers against a synthetic catalog.
+
+Everything runs offline on CPU: the sentence encoder is replaced by a hashing encoder of
+the same dimension, and with ``--backend numpy`` (the default) the catalog is a numpy snapshot
+built in memory. ``--backend pgvector`` queries a database seeded beforehand with
+``benchmarks.seed_postgres`` at the same ``--size`` and ``--seed``.
+
+    python -m benchmarks.run --size 100000 --out bench.json
+    python -m benchmarks.run --size 100000 --compare bench.json --threshold 0.15
+"""
+import argparse
+import asyncio
+import json
+import platform
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from app.core.settings import settings
+from benchmarks import compare
+from benchmarks.harness import peak_rss_mb, rss_mb, run_closed_loop, run_sync
+from benchmarks.synthetic import HashingEncoder, make_catalog, make_queries
+
+STAGES = ("encode", "retrieve", "scale", "blend", "http")
+
+
+def install(catalog, backend: str) -> None:
+    """Point the app's singletons at the synthetic catalog and the offline encoder."""
+    from app.services import audit_log, catalog as catalog_service, label_cache, lexical_index, vector_index
+    from app.utils import embeddings
+
+    settings.RETRIEVAL_BACKEND = backend
+    settings.EMBED_CACHE_PATH = ""
+    settings.AUDIT_LOG_ENABLED = False
+    settings.CATALOG_FEED = False  # offline: the synthetic snapshot is the whole catalog
+    # every request should do the full work, not replay a cached label
+    settings.LABEL_CACHE_MAX_ENTRIES = 0
+    embeddings._model = HashingEncoder()
+    embeddings._cache = None
+    label_cache._label_cache = None
+    audit_log._audit = None
+    catalog_service._watcher = None
+    lexical_index._lexical = None
+    if backend == "numpy":
+        vector_index._index = vector_index.VectorIndex(
+            catalog.dish_ids, catalog.names, catalog.vectors, catalog.nutrients, catalog.aliases,
+            catalog.prior_matrix(),
+        )
+    if settings.LEXICAL_INDEX:
+        catalog_service.refresh_catalog()
+        lexical_index.load_lexical_index(catalog_service.get_watcher().version)
+
+
+def bench_encode(queries: List[str], seconds: float) -> List[Dict]:
+    from app.utils.embeddings import _encode_batch
+
+    out = []
+    for n in (1, 32):
+        def fn(i, n=n):
+            start = (i * n) % len(queries)
+            _encode_batch((queries * 2)[start:start + n])
+            return n
+        out.append(run_sync(f"encode_{n}", fn, seconds, batch=n))
+    return out
+
+
+def bench_retrieve(queries: List[str], seconds: float, k: int) -> List[Dict]:
+    from app.services.retrieval_service import retrieve_candidates
+
+    def fn(i):
+        retrieve_candidates(queries[i % len(queries)], k)
+        return 1
+    return [run_sync("retrieve_candidates", fn, seconds, k=k)]
+
+
+def bench_scale(catalog, seconds: float) -> List[Dict]:
+    from app.services.nutrient_matrix import NutrientMatrix
+    from app.services.scaling_service import scale_nutrient_matrix
+
+    rng = np.random.default_rng(2)
+    idx = rng.integers(len(catalog.names), size=256)
+    columns = NutrientMatrix(catalog.nutrients)
+    targets = rng.uniform(200, 900, size=len(idx))
+    matrix = catalog.nutrients[idx]
+
+    def many(i):
+        scale_nutrient_matrix(matrix, targets)
+        return len(targets)
+
+    def density(i):
+        columns.scaled(idx, targets)
+        return len(targets)
+    return [run_sync("scale_nutrient_matrix_256", many, seconds),
+            run_sync("scale_density_256", density, seconds)]
+
+
+def bench_blend(queries: List[str], seconds: float, k: int) -> List[Dict]:
+    from app.schemas.label import LabelRequest
+    from app.services.label_service import _blend, label_batch
+    from app.services.retrieval_service import retrieve_hits_batch
+
+    names = queries[:64]
+    keys = [(q, k, True, None) for q in names]
+    hits = retrieve_hits_batch(names, [k] * len(names))
+
+    def fn(i):
+        _blend(keys, hits, 0.0)
+        return len(keys)
+
+    # retrieval, blending and response models for 64 distinct names, the label cache off
+    reqs = [LabelRequest(dish_name=q, calories=500, top_k=k) for q in queries]
+
+    def batch(i):
+        start = (i * 64) % len(reqs)
+        return len(label_batch((reqs * 2)[start:start + 64]))
+    return [run_sync("blend_64", fn, seconds, k=k), run_sync("label_batch_64", batch, seconds, k=k)]
+
+
+async def bench_http(queries: List[str], seconds: float, levels: List[int], k: int) -> List[Dict]:
+    import httpx
+
+    from app.main import app
+
+    rng = np.random.default_rng(3)
+    calories = rng.integers(200, 900, size=len(queries)).tolist()
+    out = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60.0) as client:
+        async def label(i):
+            j = i % len(queries)
+            r = await client.post("/label", json={"dish_name": queries[j], "calories": calories[j], "top_k": k})
+            return r.status_code == 200
+
+        async def search(i):
+            r = await client.get("/dishes/search", params={"q": queries[i % len(queries)], "k": 10})
+            return r.status_code == 200
+
+        for name, fn in (("label", label), ("search", search)):
+            for c in levels:
+                out.append(await run_closed_loop(f"http_{name}_c{c}", fn, c, seconds))
+    return out
+
+
+def run(args) -> Dict:
+    t0 = time.perf_counter()
+    catalog = make_catalog(args.size, args.seed)
+    build_s = time.perf_counter() - t0
+    queries = make_queries(catalog, args.queries, args.seed + 1)
+    install(catalog, args.backend)
+    print(f"catalog: {args.size} dishes in {build_s:.1f}s, rss {rss_mb():.0f} MB")
+
+    results: List[Dict] = []
+    for stage in args.stages:
+        if stage == "encode":
+            results += bench_encode(queries, args.seconds)
+        elif stage == "retrieve":
+            results += bench_retrieve(queries, args.seconds, args.k)
+        elif stage == "scale":
+            results += bench_scale(catalog, args.seconds)
+        elif stage == "blend":
+            results += bench_blend(queries, args.seconds, args.k)
+        elif stage == "http":
+            results += asyncio.run(bench_http(queries, args.seconds, args.concurrency, args.k))
+    print(f"{'stage':<28} {'thru/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rss MB':>8} {'alloc KB':>9}")
+    for r in results:
+        alloc = f"{r['alloc_kb']:>9.1f}" if "alloc_kb" in r else f"{'-':>9}"
+        print(f"{r['stage']:<28} {r['throughput']:>10.1f} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} "
+              f"{r['p99_ms']:>9.3f} {r['rss_mb']:>8.0f} {alloc}")
+    return {
+        "config": {
+            "size": args.size, "seed": args.seed, "backend": args.backend, "seconds": args.seconds,
+            "queries": args.queries, "k": args.k, "concurrency": args.concurrency,
+            "python": platform.python_version(), "machine": platform.machine(),
+        },
+        "catalog_build_s": build_s,
+        "peak_rss_mb": peak_rss_mb(),
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks over a synthetic catalog.")
+    parser.add_argument("--size", type=int, default=10_000, help="synthetic dishes, e.g. 10000, 100000, 1000000")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=["numpy", "pgvector"], default="numpy")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--seconds", type=float, default=3.0, help="measured time per stage")
+    parser.add_argument("--queries", type=int, default=2000, help="distinct query names to cycle through")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", metavar="BASELINE", help="exit 1 if a stage regressed against this JSON")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed regression, as a fraction")
+    args = parser.parse_args()
+
+    result = run(args)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare and not compare.check(args.compare, result, args.threshold):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""COPY a synthetic catalog into Postgres so the pgvector backend can be benchmarked.
+
+Meant for the local docker-compose database only: the dish tables are truncated first,
+which is why ``--reset`` must be passed explicitly.
+
+    python -m benchmarks.seed_postgres --size 100000 --reset
+"""
+import argparse
+import json
+import time
+
+import psycopg
+from sqlalchemy.engine import make_url
+
+from app.core.settings import settings
+from app.db.models import BUMP_CATALOG_VERSION, NUTRIENT_FIELDS
+from app.services.partitions import normalize_facet
+from benchmarks.synthetic import Catalog, make_catalog
+
+
+def _dsn() -> str:
+    return make_url(settings.DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def _num(v) -> object:
+    return None if v != v else float(v)  # NaN -> NULL
+
+
+def seed(catalog: Catalog, dsn: str, chunk: int = 10_000) -> None:
+    with psycopg.connect(dsn) as conn:
+        with conn.cursor() as cur:
+            cur.execute("TRUNCATE dishes CASCADE")
+            n = len(catalog.dish_ids)
+            for start in range(0, n, chunk):
+                rows = range(start, min(n, start + chunk))
+                with cur.copy("COPY dishes (dish_id, name, cuisine, style, aliases, macro_priors) FROM STDIN") as copy:
+                    for i in rows:
+                        priors = catalog.priors[i]
+                        style = normalize_facet(catalog.styles[i]) if catalog.styles else None
+                        copy.write_row((catalog.dish_ids[i], catalog.names[i],
+                                        normalize_facet(catalog.cuisines[i]) or None, style or None,
+                                        catalog.aliases[i] or None, json.dumps(priors) if priors else None))
+                with cur.copy(f"COPY nutrients (dish_id, {', '.join(NUTRIENT_FIELDS)}, source) FROM STDIN") as copy:
+                    for i in rows:
+                        copy.write_row((catalog.dish_ids[i], *map(_num, catalog.nutrients[i]), "synthetic"))
+                with cur.copy("COPY embeddings (dish_id, text, vector) FROM STDIN") as copy:
+                    for i in rows:
+                        vec = "[" + ",".join(f"{x:.6f}" for x in catalog.vectors[i]) + "]"
+                        copy.write_row((catalog.dish_ids[i], catalog.names[i], vec))
+                print(f"Copied {min(n, start + chunk)}/{n} dishes.")
+            # both compact columns, so any EMBEDDING_PRECISION can be benchmarked on one seed
+            cur.execute("UPDATE embeddings SET vector_half = vector::halfvec(384), "
+                        "vector_bits = binary_quantize(vector)::bit(384)")
+            cur.execute("ANALYZE dishes; ANALYZE nutrients; ANALYZE embeddings")
+            cur.execute(BUMP_CATALOG_VERSION)
+        conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the database with a synthetic benchmark catalog.")
+    parser.add_argument("--size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reset", action="store_true", help="required: truncates dishes, nutrients and embeddings")
+    args = parser.parse_args()
+    if not args.reset:
+        parser.error("seeding replaces the whole catalog; pass --reset to confirm")
+    t0 = time.perf_counter()
+    catalog = make_catalog(args.size, args.seed)
+    print(f"Generated {args.size} dishes in {time.perf_counter() - t0:.1f}s.")
+    seed(catalog, _dsn())
+    print(f"Seeded in {time.perf_counter() - t0:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
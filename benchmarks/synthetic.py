@@ -0,0 +1,151 @@
+"""Deterministic synthetic catalog and an offline stand-in for the sentence encoder."""
+import uuid
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from app.db.models import NUTRIENT_FIELDS
+from app.services.mixture_service import PRIOR_MACROS, parse_macro_priors
+from app.services.vector_index import EMBEDDING_DIM
+
+BASES = [
+    "pad thai", "ramen", "pho", "tikka masala", "korma", "vindaloo", "biryani", "burrito", "tacos",
+    "quesadilla", "enchiladas", "lasagna", "risotto", "carbonara", "bolognese", "pizza", "calzone",
+    "paella", "shakshuka", "falafel wrap", "shawarma", "kebab", "gyro", "moussaka", "bibimbap",
+    "bulgogi", "kimchi stew", "fried rice", "lo mein", "dumplings", "bao", "sushi roll", "poke bowl",
+    "teriyaki bowl", "katsu curry", "udon", "laksa", "rendang", "nasi goreng", "satay", "green curry",
+    "red curry", "massaman curry", "jambalaya", "gumbo", "chili", "burger", "club sandwich", "caesar salad",
+    "cobb salad", "greek salad", "chowder", "goulash", "schnitzel", "pierogi", "borscht", "tagine",
+    "couscous", "jollof rice", "injera platter",
+]
+PROTEINS = ["chicken", "beef", "pork", "lamb", "shrimp", "tofu", "salmon", "tuna", "duck", "turkey",
+            "egg", "paneer", "chickpea", "mushroom", "vegetable"]
+MODIFIERS = ["spicy", "creamy", "grilled", "crispy", "smoked", "garlic", "lemon", "herb", "honey",
+             "sesame", "coconut", "ginger", "peanut", "black pepper", "sweet chili", "miso", "chipotle",
+             "tandoori", "cajun", "pesto", "truffle", "basil", "curry", "mango", "soy glazed", "szechuan",
+             "buffalo", "bbq", "lime", "roasted", "braised", "stir fried", "baked", "steamed", "pan seared",
+             "slow cooked", "home style", "street style", "classic", "loaded"]
+STYLES = ["", "mini", "family size", "restaurant style", "light", "double", "deluxe", "rustic",
+          "village", "market", "royal", "house", "express", "hearty", "golden", "midnight",
+          "sunday", "garden", "coastal", "mountain"]
+CUISINES = ["thai", "japanese", "indian", "mexican", "italian", "spanish", "middle eastern", "greek",
+            "korean", "chinese", "malaysian", "indonesian", "american", "german", "eastern european",
+            "north african", "west african", "ethiopian", "vietnamese", "cajun"]
+# dishes.style values: from a name's style words, else a fixed share of the rest
+STYLE_WORDS = {"restaurant style": "restaurant", "home style": "home", "street style": "street food"}
+SERVING_STYLES = ["restaurant", "home", "street food"] + [""] * 7
+
+
+class HashingEncoder:
+    """Offline stand-in for SentenceTransformer: sums seeded random vectors of character trigrams.
+
+    Texts sharing words (or most of a misspelled word's trigrams) land close together,
+    which is enough structure for retrieval benchmarks without downloading a model.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self._words: Dict[str, np.ndarray] = {}
+
+    def word_vector(self, word: str) -> np.ndarray:
+        v = self._words.get(word)
+        if v is None:
+            v = np.zeros(self.dim, dtype=np.float32)
+            padded = f"  {word} "
+            for i in range(len(padded) - 2):
+                rng = np.random.default_rng(zlib.crc32(padded[i:i + 3].encode()))
+                v += rng.standard_normal(self.dim, dtype=np.float32)
+            v /= max(float(np.linalg.norm(v)), 1e-6)
+            self._words[word] = v
+        return v
+
+    def encode(self, texts: Sequence[str], normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            for w in t.lower().split():
+                out[i] += self.word_vector(w)
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-6)
+        return out
+
+
+class Catalog(NamedTuple):
+    dish_ids: np.ndarray
+    names: np.ndarray
+    cuisines: List[str]
+    aliases: List[List[str]]
+    vectors: np.ndarray
+    nutrients: np.ndarray
+    priors: List[Optional[dict]]
+    styles: Optional[List[str]] = None
+
+    def prior_matrix(self) -> np.ndarray:
+        return np.asarray([parse_macro_priors(p) for p in self.priors], dtype=np.float32).reshape(-1, len(PRIOR_MACROS))
+
+
+def dish_name(i: int) -> str:
+    """The i-th name in a fixed mixed-radix enumeration; unique for every i."""
+    i, base = divmod(i, len(BASES))
+    i, protein = divmod(i, len(PROTEINS))
+    i, mod = divmod(i, len(MODIFIERS))
+    i, style = divmod(i, len(STYLES))
+    words = [STYLES[style], MODIFIERS[mod], PROTEINS[protein], BASES[base]]
+    name = " ".join(w for w in words if w)
+    return f"{name} no {i + 1}" if i else name
+
+
+def dish_style(name: str) -> str:
+    for words, style in STYLE_WORDS.items():
+        if words in name:
+            return style
+    return SERVING_STYLES[zlib.crc32(name.encode()) % len(SERVING_STYLES)]
+
+
+def make_catalog(n: int, seed: int = 0, encoder: Optional[HashingEncoder] = None, chunk: int = 50_000) -> Catalog:
+    rng = np.random.default_rng(seed)
+    encoder = encoder or HashingEncoder()
+    names = [dish_name(i) for i in range(n)]
+    prefix = int(rng.integers(0, 2**63)) << 64
+    dish_ids = np.asarray([str(uuid.UUID(int=prefix | i)) for i in range(n)], dtype=str)
+    cuisines = [CUISINES[zlib.crc32(name.split()[-1].encode()) % len(CUISINES)] for name in names]
+    aliases = [[name.replace(" ", "")] if i % 10 == 0 else [] for i, name in enumerate(names)]
+
+    vectors = np.empty((n, encoder.dim), dtype=np.float32)
+    for start in range(0, n, chunk):
+        block = encoder.encode(names[start:start + chunk])
+        block += rng.normal(scale=0.05, size=block.shape).astype(np.float32)
+        vectors[start:start + chunk] = block / np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-6)
+
+    kcal = rng.uniform(150, 1100, size=n)
+    dens = rng.gamma(2.0, size=(n, 6)) * np.array([0.02, 0.05, 0.02, 0.004, 0.01, 1.5])
+    nutrients = np.column_stack([kcal, dens * kcal[:, None]]).astype(np.float32)
+    nutrients[rng.random(nutrients.shape) < 0.05] = np.nan
+    nutrients[:, 0] = kcal
+    priors = [{"protein": 30, "carbs": 45, "fat": 25} if i % 7 == 0 else None for i in range(n)]
+    assert nutrients.shape[1] == len(NUTRIENT_FIELDS)
+    styles = [dish_style(name) for name in names]
+    return Catalog(dish_ids, np.asarray(names, dtype=str), cuisines, aliases, vectors, nutrients, priors, styles)
+
+
+def _typo(name: str, rng: np.random.Generator) -> str:
+    i = int(rng.integers(1, max(2, len(name) - 1)))
+    if rng.random() < 0.5:
+        return name[:i] + name[i + 1:]
+    return name[:i - 1] + name[i] + name[i - 1] + name[i + 1:]
+
+
+def make_queries(catalog: Catalog, n: int, seed: int = 1) -> List[str]:
+    """A fixed mix of query kinds: 40% exact names, 30% one-edit typos, 30% unseen phrasings."""
+    rng = np.random.default_rng(seed)
+    size = len(catalog.names)
+    out = []
+    for _ in range(n):
+        r = rng.random()
+        if r < 0.4:
+            out.append(str(catalog.names[rng.integers(size)]))
+        elif r < 0.7:
+            out.append(_typo(str(catalog.names[rng.integers(size)]), rng))
+        else:
+            out.append(f"{rng.choice(PROTEINS)} {rng.choice(BASES)} with {rng.choice(MODIFIERS)} sauce")
+    return out
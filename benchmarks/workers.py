@@ -0,0 +1,123 @@
+"""Memory per API worker when the catalog snapshot and the encoder are shared.
+
+Saves a synthetic snapshot, serves the hashing encoder on a Unix socket, then starts
+1, 2, 4... worker processes that each load the snapshot and label a batch of queries
+the way an API worker would. Reports each worker's private memory (USS) and its
+proportional share of the shared pages (PSS): with a mapped snapshot USS should stay
+flat as workers are added, while ``--copy`` loads private copies for comparison.
+
+    python -m benchmarks.workers --size 200000 --workers 1 2 4
+"""
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from app.services.vector_index import VectorIndex
+from app.utils.embedding_server import EmbeddingServer, serve_in_thread
+from benchmarks.synthetic import HashingEncoder, make_catalog, make_queries
+
+
+def memory_mb() -> Dict[str, float]:
+    """Rss, Pss and private (Private_Clean + Private_Dirty) from /proc/self/smaps_rollup."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss": fields["Rss"], "pss": fields["Pss"], "uss": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def _worker(path: str, sock: str, queries: List[str], copy: bool, lexical: bool, ready, results) -> None:
+    from app.core.settings import settings
+
+    settings.RETRIEVAL_BACKEND = "numpy"
+    settings.VECTOR_INDEX_PATH = path
+    settings.EMBED_SERVER_SOCKET = sock
+    settings.EMBED_CACHE_PATH = ""
+    settings.AUDIT_LOG_ENABLED = False
+    settings.CATALOG_FEED = False
+    settings.LABEL_CACHE_MAX_ENTRIES = 0
+    settings.LEXICAL_INDEX = lexical
+
+    from app.schemas.label import LabelRequest
+    from app.services import catalog, lexical_index, vector_index
+    from app.services.label_service import label_batch
+
+    if copy:
+        vector_index._index = VectorIndex.load(path, mmap=False)
+    else:
+        vector_index.load_index(path)
+    if lexical:
+        catalog.refresh_catalog()
+        lexical_index.load_lexical_index(catalog.get_watcher().version)
+    for start in range(0, len(queries), 64):
+        label_batch([LabelRequest(dish_name=q, calories=500) for q in queries[start:start + 64]])
+    results.put(memory_mb())
+    ready.wait()  # stay alive until every worker has measured, so the pages stay shared
+
+
+def run(args) -> List[Dict]:
+    encoder = HashingEncoder()
+    catalog = make_catalog(args.size, args.seed, encoder)
+    queries = make_queries(catalog, args.queries, args.seed + 1)
+    out = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index")
+        VectorIndex(catalog.dish_ids, catalog.names, catalog.vectors, catalog.nutrients, catalog.aliases,
+                    catalog.prior_matrix()).save(path)
+        del catalog
+        sock = os.path.join(tmp, "embed.sock")
+        server = EmbeddingServer(sock, lambda texts: encoder.encode(texts))
+        serve_in_thread(server)
+        ctx = mp.get_context("spawn")
+        try:
+            for n in args.workers:
+                ready, results = ctx.Event(), ctx.Queue()
+                procs = [ctx.Process(target=_worker, args=(path, sock, queries, args.copy, args.lexical, ready, results))
+                         for _ in range(n)]
+                t0 = time.perf_counter()
+                for p in procs:
+                    p.start()
+                mem = [results.get(timeout=600) for _ in procs]
+                ready.set()
+                for p in procs:
+                    p.join()
+                row = {
+                    "workers": n,
+                    "uss_mb": float(np.mean([m["uss"] for m in mem])),
+                    "pss_mb": float(np.mean([m["pss"] for m in mem])),
+                    "rss_mb": float(np.mean([m["rss"] for m in mem])),
+                    "total_pss_mb": float(sum(m["pss"] for m in mem)),
+                    "elapsed_s": time.perf_counter() - t0,
+                }
+                out.append(row)
+                print(f"{n:>7} {row['uss_mb']:>12.0f} {row['pss_mb']:>12.0f} {row['rss_mb']:>12.0f} "
+                      f"{row['total_pss_mb']:>10.0f}")
+        finally:
+            server.shutdown()
+            server.server_close()
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker memory with a shared snapshot and encoder.")
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--copy", action="store_true", help="load private copies instead of mapping the snapshot")
+    parser.add_argument("--lexical", action=argparse.BooleanOptionalAction, default=True,
+                        help="build the in-process lexical index in each worker")
+    args = parser.parse_args()
+    print(f"{'workers':>7} {'USS/worker':>12} {'PSS/worker':>12} {'RSS/worker':>12} {'total PSS':>10}  (MB)")
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# scripts/ann_index.py
+#
+# Manage the pgvector ANN index on embeddings:
+#
+#   status   -- rows, index method/options/size and the query parameters in effect
+#   build    -- build an HNSW or ivfflat index concurrently and swap it in
+#   reindex  -- rebuild the current index with options re-derived from the row count,
+#               e.g. after a bulk ingest (ivfflat centroids are trained at build time)
+#   sweep    -- recall@k against exact search vs latency for a range of ef_search/probes
+#
+#   python -m scripts.ann_index build --method ivfflat
+#   python -m scripts.ann_index sweep --queries 200 --k 10 --out sweep.json
+#
+# API connections read the index options when they connect, so a new index is picked
+# up as the pool recycles connections (DB_POOL_RECYCLE) or on restart.
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import psycopg
+from sqlalchemy.engine import make_url
+
+from app.core.settings import settings
+from app.db.ann_index import (
+    INDEX_META_QUERY, METHODS, OPCLASSES, PRECISION_COLUMNS, create_index_sql, hnsw_ef_search, index_name,
+    ivfflat_lists, ivfflat_probes, parse_index_meta,
+)
+
+# column -> (query vector expression, distance operator)
+QUERY_EXPR = {
+    "vector": ("CAST(%(qv)s AS vector)", "<=>"),
+    "vector_half": ("CAST(%(qv)s AS halfvec(384))", "<=>"),
+    "vector_bits": ("binary_quantize(CAST(%(qv)s AS vector))::bit(384)", "<~>"),
+}
+
+HNSW_GRID = [10, 20, 40, 64, 100, 160, 250, 400]
+
+
+def _dsn() -> str:
+    return make_url(settings.DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def _default_column() -> str:
+    return PRECISION_COLUMNS.get(settings.EMBEDDING_PRECISION, "vector")
+
+
+def _rows(conn, column: str) -> int:
+    return conn.execute(f"SELECT count(*) FROM embeddings WHERE {column} IS NOT NULL").fetchone()[0]
+
+
+def _meta(conn, name: str):
+    return conn.execute(INDEX_META_QUERY, (name,)).fetchone()
+
+
+def status(column: str) -> None:
+    with psycopg.connect(_dsn(), autocommit=True) as conn:
+        rows = _rows(conn, column)
+        name = index_name(column)
+        meta = _meta(conn, name)
+        print(f"embeddings.{column}: {rows} rows; ivfflat would use lists = {ivfflat_lists(rows)}")
+        if meta is None:
+            print(f"{name}: missing")
+            return
+        (size,) = conn.execute("SELECT pg_size_pretty(pg_relation_size(%s::regclass))", (name,)).fetchone() or ("?",)
+        params = parse_index_meta(meta)
+        print(f"{name}: {meta[0]} {meta[1] or []}, {size}")
+        if params.method == "ivfflat":
+            print(f"ivfflat.probes = {params.probes} of {params.lists} lists (target recall {settings.VECTOR_TARGET_RECALL})")
+        elif params.method == "hnsw":
+            print(f"hnsw.ef_search = {params.ef_search} (target recall {settings.VECTOR_TARGET_RECALL})")
+
+
+def build(column: str, method: str, lists: Optional[int] = None, maintenance_work_mem: str = "1GB",
+          parallel_workers: int = 2) -> None:
+    """Build a new index concurrently, then swap names so readers never see it missing."""
+    name = index_name(column)
+    new, old = name + "_new", name + "_old"
+    with psycopg.connect(_dsn(), autocommit=True) as conn:
+        rows = _rows(conn, column)
+        if method == "ivfflat" and rows < 1000:
+            print(f"warning: ivfflat trains its centroids on {rows} rows; rebuild after loading the catalog")
+        conn.execute(f"SET maintenance_work_mem = '{maintenance_work_mem}'")
+        conn.execute(f"SET max_parallel_maintenance_workers = {int(parallel_workers)}")
+        # a failed concurrent build leaves an invalid index behind
+        conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {new}")
+        conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {old}")
+        sql = create_index_sql(column, method, rows, name=new, lists=lists)
+        print(sql)
+        t0 = time.perf_counter()
+        conn.execute(sql)
+        print(f"Built {new} over {rows} rows in {time.perf_counter() - t0:.1f}s.")
+        with conn.transaction():
+            conn.execute(f"ALTER INDEX IF EXISTS {name} RENAME TO {old}")
+            conn.execute(f"ALTER INDEX {new} RENAME TO {name}")
+        conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {old}")
+    print(f"{name} is now {method}.")
+
+
+def reindex(column: str, maintenance_work_mem: str, parallel_workers: int) -> None:
+    with psycopg.connect(_dsn(), autocommit=True) as conn:
+        meta = _meta(conn, index_name(column))
+    method = meta[0] if meta is not None and meta[0] in METHODS else settings.VECTOR_INDEX_METHOD
+    build(column, method, None, maintenance_work_mem, parallel_workers)
+
+
+def _sample_queries(conn, column: str, n: int, seed: int) -> List[str]:
+    """Stored vectors plus noise, so a query is near but not identical to a catalog row."""
+    rows = conn.execute(
+        f"SELECT vector::real[] FROM embeddings WHERE vector IS NOT NULL AND {column} IS NOT NULL "
+        "ORDER BY md5(dish_id::text || %s) LIMIT %s",
+        (str(seed), n),
+    ).fetchall()
+    rng = np.random.default_rng(seed)
+    out = []
+    for (v,) in rows:
+        v = np.asarray(v, dtype=np.float32)
+        v = v / max(float(np.linalg.norm(v)), 1e-6) + rng.normal(scale=0.02, size=v.shape).astype(np.float32)
+        out.append("[" + ",".join(f"{x:.6f}" for x in v) + "]")
+    return out
+
+
+def _search(conn, column: str, qv: str, k: int, settings_sql: List[str]) -> List:
+    expr, op = QUERY_EXPR[column]
+    with conn.transaction():
+        for s in settings_sql:
+            conn.execute(s)
+        return [r[0] for r in conn.execute(
+            f"SELECT dish_id FROM embeddings WHERE {column} IS NOT NULL ORDER BY {column} {op} {expr} LIMIT %(k)s",
+            {"qv": qv, "k": k},
+        ).fetchall()]
+
+
+def sweep(column: str, n: int, k: int, seed: int) -> Dict:
+    # autocommit, so each _search transaction scopes its SET LOCAL
+    with psycopg.connect(_dsn(), autocommit=True) as conn:
+        meta = _meta(conn, index_name(column))
+        params = parse_index_meta(meta)
+        if params.method is None:
+            raise SystemExit(f"{index_name(column)} is missing; build it first")
+        queries = _sample_queries(conn, column, n, seed)
+        # ground truth: the same ORDER BY as a sequential scan
+        exact = [set(_search(conn, column, q, k, ["SET LOCAL enable_indexscan = off"])) for q in queries]
+        if params.method == "hnsw":
+            grid = [("hnsw.ef_search", v) for v in HNSW_GRID if v >= k]
+        else:
+            grid = [("ivfflat.probes", v) for v in sorted({1, 2, 4, 8, 16, 32, 64, 128, params.lists}) if v <= params.lists]
+        points: List[Dict[str, Any]] = []
+        for guc, value in grid:
+            latencies, hits = [], 0
+            for q, want in zip(queries, exact):
+                t0 = time.perf_counter()
+                got = _search(conn, column, q, k, [f"SET LOCAL {guc} = {value}"])
+                latencies.append(time.perf_counter() - t0)
+                hits += len(want.intersection(got))
+            ms = 1000 * np.asarray(latencies)
+            points.append({
+                "param": guc, "value": value, "recall": hits / max(1, k * len(queries)),
+                "p50_ms": float(np.percentile(ms, 50)), "p99_ms": float(np.percentile(ms, 99)),
+            })
+    target = settings.VECTOR_TARGET_RECALL
+    if params.method == "hnsw":
+        derived = ("hnsw.ef_search", hnsw_ef_search(target, k))
+    else:
+        derived = ("ivfflat.probes", ivfflat_probes(params.lists, target))
+    print(f"{index_name(column)}: {params.method} {meta[1] or []}, {len(queries)} queries, recall@{k}")
+    print(f"{'param':>16} {'value':>6} {'recall':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for p in points:
+        bar = "#" * int(round(40 * p["recall"]))
+        print(f"{p['param']:>16} {p['value']:>6} {p['recall']:>7.3f} {p['p50_ms']:>8.2f} {p['p99_ms']:>8.2f}  {bar}")
+    best = next((p for p in points if p["recall"] >= target), None)
+    print(f"currently derived from VECTOR_TARGET_RECALL={target}: {derived[0]} = {derived[1]}")
+    if best is not None:
+        pin = "VECTOR_HNSW_EF_SEARCH" if params.method == "hnsw" else "VECTOR_IVFFLAT_PROBES"
+        print(f"smallest setting measured at recall >= {target}: {best['param']} = {best['value']}; "
+              f"pin it with {pin}={best['value']}")
+    return {"index": index_name(column), "method": params.method, "options": meta[1], "k": k,
+            "queries": len(queries), "target_recall": target, "points": points}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the pgvector ANN index on embeddings.")
+    parser.add_argument("--column", choices=list(OPCLASSES), default=_default_column())
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status")
+    for cmd in ("build", "reindex"):
+        p = sub.add_parser(cmd)
+        if cmd == "build":
+            p.add_argument("--method", choices=METHODS, default=settings.VECTOR_INDEX_METHOD)
+            p.add_argument("--lists", type=int, help="ivfflat lists (default: derived from the row count)")
+        p.add_argument("--maintenance-work-mem", default="1GB")
+        p.add_argument("--parallel-workers", type=int, default=2)
+    p = sub.add_parser("sweep")
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--k", type=int, default=settings.TOP_K)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", help="write the recall/latency points as JSON")
+    args = parser.parse_args()
+
+    if args.cmd == "status":
+        status(args.column)
+    elif args.cmd == "build":
+        build(args.column, args.method, args.lists, args.maintenance_work_mem, args.parallel_workers)
+    elif args.cmd == "reindex":
+        reindex(args.column, args.maintenance_work_mem, args.parallel_workers)
+    else:
+        result = sweep(args.column, args.queries, args.k, args.seed)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# scripts/bench_audit.py
+# Request-path cost of audit logging: time AuditLogger.submit per call while the writer
+# thread drains into a no-op sink (or a real COPY with --db), against a baseline loop.
+import argparse
+import time
+
+import numpy as np
+
+from app.db.session import psycopg_dsn
+from app.schemas.label import Candidate, LabelResponse, Nutrients
+from app.services.audit_log import AuditLogger, PsycopgWriter
+
+
+def sample_response() -> LabelResponse:
+    return LabelResponse(
+        nutrients=Nutrients(calories=620.0, protein_g=31.0, carbs_g=55.0, fat_g=28.0, fiber_g=4.0,
+                            sugar_g=9.0, sodium_mg=1200.0),
+        confidence=0.87,
+        assumptions="benchmark",
+        candidates=[Candidate(dish_id=f"id-{i}", name=f"dish {i}", sim=0.9 - 0.05 * i, weight=0.2)
+                    for i in range(5)],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--policy", default="drop", choices=["drop", "block", "spill"])
+    parser.add_argument("--db", action="store_true", help="COPY into audit_logs instead of a no-op sink")
+    args = parser.parse_args()
+
+    writer = PsycopgWriter(psycopg_dsn()) if args.db else (lambda rows: None)
+    audit = AuditLogger(writer, max_queue=args.n, policy=args.policy)
+    resp = sample_response()
+    lat = np.empty(args.n)
+    for i in range(args.n):
+        t0 = time.perf_counter()
+        audit.submit("chicken tikka masala", 620.0, resp)
+        lat[i] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    audit.close(timeout=600)
+    drain = time.perf_counter() - t0
+
+    us = 1e6 * lat
+    print(f"submit: mean {us.mean():.2f} us, p50 {np.percentile(us, 50):.2f} us, "
+          f"p99 {np.percentile(us, 99):.2f} us, max {us.max():.1f} us over {args.n} calls")
+    print(f"writer drained the remaining queue in {drain:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# scripts/bench_mixture.py
+# Per-solve cost of the batched NNLS mixture versus a loop of scipy.optimize.nnls.
+import argparse
+import time
+
+import numpy as np
+from scipy.optimize import nnls
+
+from app.services.mixture_service import mixture_weights_batch, nnls_batch
+
+
+def synthetic_grid(batch: int, k: int, rng: np.random.Generator):
+    kcal = rng.uniform(200, 900, size=(batch, k, 1))
+    dens = rng.gamma(2.0, size=(batch, k, 6)) * np.array([0.02, 0.05, 0.02, 0.004, 0.01, 1.5])
+    profiles = np.concatenate([kcal, dens * kcal], axis=2)
+    profiles[rng.random(profiles.shape) < 0.05] = np.nan
+    profiles[..., 0] = kcal[..., 0]
+    sims = np.sort(rng.uniform(0.4, 1.0, size=(batch, k)), axis=1)[:, ::-1]
+    return profiles, sims, np.ones((batch, k), dtype=bool)
+
+
+def timeit(fn, repeat: int, *args) -> float:
+    fn(*args)
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def nnls_loop(A: np.ndarray, y: np.ndarray) -> list:
+    return [nnls(A[i], y[i]) for i in range(len(A))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 64, 1024])
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10, 20, 30, 40, 50])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'k':>4} {'batch':>6} {'weights us/solve':>17} {'nnls_batch us/solve':>20} {'scipy loop us/solve':>20}")
+    for k in args.k:
+        for b in args.batch:
+            profiles, sims, mask = synthetic_grid(b, k, rng)
+            A = rng.normal(size=(b, 7 + k, k))
+            y = rng.normal(size=(b, 7 + k))
+            t_full = timeit(mixture_weights_batch, args.repeat, profiles, sims, mask)
+            t_batch = timeit(nnls_batch, args.repeat, A, y)
+            t_loop = timeit(nnls_loop, args.repeat, A, y)
+            print(f"{k:>4} {b:>6} {1e6 * t_full / b:>17.1f} {1e6 * t_batch / b:>20.1f} {1e6 * t_loop / b:>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
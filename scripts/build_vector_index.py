@@ -0,0 +1,21 @@
+# scripts/build_vector_index.py
+import argparse
+import time
+
+from app.core.settings import settings
+from app.services.vector_index import build_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot dish embeddings into a memory-mapped index.")
+    parser.add_argument("--path", default=settings.VECTOR_INDEX_PATH)
+    args = parser.parse_args()
+
+    t0 = time.time()
+    index = build_snapshot(args.path)
+    mb = index.vectors.nbytes / 1e6
+    print(f"Wrote {len(index)} dishes ({mb:.1f} MB of vectors) to {args.path} in {time.time() - t0:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
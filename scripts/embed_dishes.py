@@ -1,58 +1,253 @@
 # scripts/embed_dishes.py
+#
+# Backfill embedding vectors as a three-stage pipeline so the database and the encoder
+# are busy at the same time:
+#
+#   reader thread  -- keyset pages of (dish_id, text) ordered by dish_id
+#   encoder pool   -- N threads or processes, each encoding whole pages
+#   writer (main)  -- binary COPY into a staging table + one UPDATE ... FROM per page
+#
+# Pages are written in dish_id order and the last written dish_id is checkpointed after
+# each commit, so a killed run resumes where it stopped (also with --reembed).
+#
+# The compact column for EMBEDDING_PRECISION (vector_half or vector_bits) is derived from
+# the float32 vector in the same UPDATE; --requantize fills it for vectors already stored.
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import threading
 import time
-from typing import List
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional
 
 import numpy as np
-from sqlalchemy.orm import Session
-from sqlalchemy import select
+import psycopg
+from pgvector.psycopg import register_vector
+from sqlalchemy.engine import make_url
 
-from app.db.session import engine
-from app.utils.embeddings import get_model
-from app.db.models import Embedding  # assumes you created ORM models as in Prompt A
+from app.core.settings import settings
+from app.db.models import BUMP_CATALOG_VERSION
+from app.utils.embeddings import get_model, model_key
 
 
 BATCH_SIZE = 256
+CHECKPOINT_PATH = "data/embed_dishes.ckpt"
 
-def encode_texts(texts: List[str]) -> List[List[float]]:
+PAGE_QUERY = """
+    SELECT dish_id, text FROM embeddings
+     WHERE dish_id > %(after)s::uuid {pending}
+     ORDER BY dish_id
+     LIMIT %(limit)s
+"""
+
+CREATE_STAGE = """
+    CREATE TEMP TABLE IF NOT EXISTS stage_vectors (dish_id uuid, vector vector(384))
+    ON COMMIT DELETE ROWS
+"""
+
+# precision -> (column, SQL deriving it from a float32 vector expression)
+COMPACT_COLUMNS = {
+    "halfvec": ("vector_half", "{v}::halfvec(384)"),
+    "binary": ("vector_bits", "binary_quantize({v})::bit(384)"),
+}
+
+APPLY_STAGE = """
+    UPDATE embeddings e SET vector = s.vector{compact}
+      FROM stage_vectors s
+     WHERE e.dish_id = s.dish_id
+"""
+
+REQUANTIZE_PAGE = """
+    UPDATE embeddings e SET {column} = {expr}
+      FROM (SELECT dish_id FROM embeddings
+             WHERE dish_id > %(after)s::uuid AND vector IS NOT NULL
+             ORDER BY dish_id LIMIT %(limit)s) p
+     WHERE e.dish_id = p.dish_id
+    RETURNING e.dish_id
+"""
+
+MIN_UUID = "00000000-0000-0000-0000-000000000000"
+
+
+def encode_texts(texts: List[str]) -> np.ndarray:
     model = get_model()  # singleton loader
-    vecs = model.encode(texts, normalize_embeddings=False)
-    # Ensure python lists of float (pgvector likes plain lists)
-    if isinstance(vecs, np.ndarray):
-        return [v.astype(np.float32).tolist() for v in vecs]
-    return [list(map(float, v)) for v in vecs]
+    vecs = model.encode(texts, normalize_embeddings=False, batch_size=len(texts))
+    return np.asarray(vecs, dtype=np.float32)
+
+
+def _init_process_worker(threads: int) -> None:
+    import torch
+
+    torch.set_num_threads(threads)
+    get_model()
+
+
+def _dsn() -> str:
+    return make_url(settings.DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def read_checkpoint(path: str, mode: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    if state.get("mode") != mode or state.get("model") != model_key():
+        return None
+    return state.get("last_dish_id")
+
+
+def write_checkpoint(path: str, mode: str, last_dish_id: str) -> None:
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"mode": mode, "model": model_key(), "last_dish_id": last_dish_id}, f)
+    os.replace(tmp, path)
+
+
+def reader(after: str, reembed: bool, batch_size: int, pool, out: queue.Queue, stop: threading.Event):
+    query = PAGE_QUERY.format(pending="" if reembed else "AND vector IS NULL")
+    try:
+        with psycopg.connect(_dsn(), autocommit=True) as conn:
+            while not stop.is_set():
+                rows = conn.execute(query, {"after": after, "limit": batch_size}).fetchall()
+                if not rows:
+                    break
+                ids = [r[0] for r in rows]
+                texts = [r[1] or "" for r in rows]
+                # blocks when encoders fall behind, bounding memory
+                out.put((ids, pool.submit(encode_texts, texts)))
+                after = str(ids[-1])
+    except Exception as e:
+        failed: Future = Future()
+        failed.set_exception(e)
+        out.put(([], failed))
+    finally:
+        out.put(None)
+
+
+def apply_stage_sql(precision: str) -> str:
+    if precision not in COMPACT_COLUMNS:
+        return APPLY_STAGE.format(compact="")
+    column, expr = COMPACT_COLUMNS[precision]
+    return APPLY_STAGE.format(compact=f", {column} = {expr.format(v='s.vector')}")
+
+
+def requantize(batch_size: int = 10_000) -> None:
+    """Fill the compact column for EMBEDDING_PRECISION from the stored float32 vectors."""
+    precision = settings.EMBEDDING_PRECISION
+    if precision not in COMPACT_COLUMNS:
+        print(f"EMBEDDING_PRECISION={precision} has no database column; nothing to do.")
+        return
+    column, expr = COMPACT_COLUMNS[precision]
+    sql = REQUANTIZE_PAGE.format(column=column, expr=expr.format(v="e.vector"))
+    after, total = MIN_UUID, 0
+    with psycopg.connect(_dsn()) as conn:
+        while True:
+            ids = [r[0] for r in conn.execute(sql, {"after": after, "limit": batch_size}).fetchall()]
+            if not ids:
+                break
+            conn.execute(BUMP_CATALOG_VERSION)
+            conn.commit()
+            after = str(max(ids))
+            total += len(ids)
+            print(f"Requantized {total} rows into {column}.")
+
+
+def write_page(conn: psycopg.Connection, ids: list, vecs: np.ndarray) -> None:
+    with conn.cursor() as cur:
+        with cur.copy("COPY stage_vectors (dish_id, vector) FROM STDIN WITH (FORMAT BINARY)") as copy:
+            copy.set_types(["uuid", "vector"])
+            for dish_id, v in zip(ids, vecs):
+                copy.write_row((dish_id, v))
+        cur.execute(apply_stage_sql(settings.EMBEDDING_PRECISION))
+        cur.execute(BUMP_CATALOG_VERSION)
+    conn.commit()
+
+
+def batch_embed(
+    workers: int = 1,
+    batch_size: int = BATCH_SIZE,
+    processes: bool = False,
+    reembed: bool = False,
+    checkpoint: str = CHECKPOINT_PATH,
+):
+    mode = "reembed" if reembed else "missing"
+    after = read_checkpoint(checkpoint, mode)
+    if after:
+        print(f"Resuming {mode} run after dish_id {after}.")
+
+    if processes:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        # spawn: the reader thread is already running when workers start
+        pool: Executor = ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_process_worker,
+            initargs=(threads,),
+        )
+    else:
+        get_model()
+        pool = ThreadPoolExecutor(workers)
+
+    pages: queue.Queue = queue.Queue(maxsize=2 * workers)
+    stop = threading.Event()
+    t = threading.Thread(target=reader, args=(after or MIN_UUID, reembed, batch_size, pool, pages, stop), daemon=True)
 
-def batch_embed():
     total = 0
     start_all = time.time()
-
-    while True:
-        with Session(engine, expire_on_commit=False) as session:
-            rows: List[Embedding] = (
-                session.execute(
-                    select(Embedding)
-                    .where(Embedding.vector.is_(None))
-                    .limit(BATCH_SIZE)
-                )
-                .scalars()
-                .all()
-            )
-
-            if not rows:
+    try:
+        with psycopg.connect(_dsn()) as conn:
+            register_vector(conn)
+            conn.execute(CREATE_STAGE)
+            conn.commit()
+            t.start()
+            while True:
+                item = pages.get()
+                if item is None:
+                    break
+                ids, fut = item
+                vecs = fut.result()
+                write_page(conn, ids, vecs)
+                write_checkpoint(checkpoint, mode, str(ids[-1]))
+                total += len(ids)
                 elapsed = time.time() - start_all
-                print(f"No pending rows. Embedded {total} rows in {elapsed:.2f}s.")
-                return
+                print(f"Updated {total} rows ({total / max(elapsed, 1e-6):.1f} rows/s end-to-end).")
+    finally:
+        stop.set()
+        # drain so a reader blocked on a full queue can exit
+        while t.is_alive():
+            try:
+                pages.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        pool.shutdown(cancel_futures=True)
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    elapsed = time.time() - start_all
+    print(f"No pending rows. Embedded {total} rows in {elapsed:.2f}s ({total / max(elapsed, 1e-6):.1f} rows/s).")
+
 
-            texts = [r.text or "" for r in rows]
-            t0 = time.time()
-            vec_lists = encode_texts(texts)
-            for r, v in zip(rows, vec_lists):
-                r.vector = v  # pgvector Vector(384) column; list[float] is fine
+def main():
+    parser = argparse.ArgumentParser(description="Backfill dish embedding vectors.")
+    parser.add_argument("--workers", type=int, default=1, help="number of concurrent encoders")
+    parser.add_argument("--processes", action="store_true", help="encode in worker processes instead of threads")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--reembed", action="store_true", help="re-encode every row, e.g. after a model change")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--requantize", action="store_true",
+                        help="only derive the EMBEDDING_PRECISION column from stored vectors")
+    args = parser.parse_args()
+    if args.requantize:
+        requantize()
+        return
+    batch_embed(args.workers, args.batch_size, args.processes, args.reembed, args.checkpoint)
 
-            session.commit()
-            dt = time.time() - t0
-            total += len(rows)
-            rate = len(rows) / max(dt, 1e-6)
-            print(f"Updated {len(rows)} rows this batch in {dt:.2f}s ({rate:.1f} rows/s). Total={total}")
 
 if __name__ == "__main__":
-    batch_embed()
+    main()
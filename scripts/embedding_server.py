@@ -0,0 +1,46 @@
+# scripts/embedding_server.py
+#
+# The one process per host that loads the sentence encoder when the API runs several
+# workers. Workers started with EMBED_SERVER_SOCKET pointing at the same path send their
+# encodes here; texts from all workers are batched together.
+#
+#   python -m scripts.embedding_server --socket /run/embed/embed.sock
+#   EMBED_SERVER_SOCKET=/run/embed/embed.sock uvicorn app.main:app --workers 4
+import argparse
+import logging
+import signal
+import time
+
+from app.core.settings import settings
+from app.utils import embeddings
+from app.utils.embedding_server import EmbeddingServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve query embeddings to API workers over a Unix socket.")
+    parser.add_argument("--socket", default=settings.EMBED_SERVER_SOCKET or "data/embed.sock")
+    parser.add_argument("--max-batch-size", type=int, default=settings.EMBED_BATCH_MAX_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=settings.EMBED_BATCH_MAX_WAIT_MS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    t0 = time.time()
+    # always the local model, whatever EMBED_SERVER_SOCKET says in this environment
+    embeddings._model = embeddings.load_model()
+    embeddings.warm_up(args.max_batch_size)
+    print(f"Loaded {settings.EMBEDDING_MODEL} ({settings.EMBEDDING_BACKEND}) in {time.time() - t0:.1f}s.")
+
+    server = EmbeddingServer(args.socket, embeddings._encode_batch, args.max_batch_size, args.max_wait_ms)
+    # SIGTERM (docker stop) unwinds like Ctrl-C so the socket file is removed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"Serving embeddings on {args.socket}.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
+import argparse
 import csv
+import itertools
 import os
 import sys
+import time
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
-from app.db.models import Dish, Nutrients, Embedding
+from app.db.models import BUMP_CATALOG_VERSION, Dish, Nutrients, Embedding
+from app.services.partitions import normalize_facet
 
 # Load DATABASE_URL from environment
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -14,10 +19,42 @@ if not DATABASE_URL:
 engine = create_engine(DATABASE_URL, future=True)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+NUMERIC_COLUMNS = ("kcal", "protein_g", "carbs_g", "fat_g", "fiber_g", "sugar_g", "sodium_mg")
+
+def parse_float(v):
+    if v is None:
+        return None
+    v = v.strip()
+    if not v:
+        return None
+    try:
+        return float(v)
+    except ValueError:
+        return None
+
+def parse_aliases(v):
+    return v.split(";") if v else None
+
+def parse_facet(v):
+    # cuisine and style are stored as search filters compare them
+    return normalize_facet(v) or None
+
+def embedding_text(name, cuisine, aliases):
+    return f"{name}. Cuisine: {cuisine}. Aliases: {aliases}"
+
+def parse_row(row):
+    row = dict(row)
+    for k in NUMERIC_COLUMNS:
+        if k in row:
+            row[k] = parse_float(row[k])
+    return row
+
 def upsert_dish(session, row):
     name_lower = row["name"].lower()
     cuisine = row.get("cuisine")
-    aliases = row.get("aliases", "").split(";") if row.get("aliases") else None
+    facet = parse_facet(cuisine)
+    style = parse_facet(row.get("style"))
+    aliases = parse_aliases(row.get("aliases"))
 
     # Check if dish exists
     dish = session.query(Dish).filter(text("lower(name) = :name_lower")).params(name_lower=name_lower).one_or_none()
@@ -25,12 +62,13 @@ def upsert_dish(session, row):
     if dish:
         # Update existing dish
         dish.name = row["name"]
-        dish.cuisine = cuisine
+        dish.cuisine = facet
+        dish.style = style
         dish.aliases = aliases
         updated = True
     else:
         # Insert new dish
-        dish = Dish(name=row["name"], cuisine=cuisine, aliases=aliases)
+        dish = Dish(name=row["name"], cuisine=facet, style=style, aliases=aliases)
         session.add(dish)
         updated = False
 
@@ -61,38 +99,196 @@ def upsert_dish(session, row):
         )
         session.add(nutrients)
 
-    # Upsert embedding
-    embedding_text = f"{row['name']}. Cuisine: {cuisine}. Aliases: {aliases}"
+    # Upsert embedding; a changed text invalidates the stored vector so it gets re-embedded
+    embedding_text_ = embedding_text(row["name"], cuisine, aliases)
     embedding = session.query(Embedding).filter_by(dish_id=dish.dish_id).one_or_none()
     if embedding:
-        embedding.text = embedding_text
+        if embedding.text != embedding_text_:
+            embedding.text = embedding_text_
+            embedding.vector = None
     else:
-        embedding = Embedding(dish_id=dish.dish_id, text=embedding_text)
+        embedding = Embedding(dish_id=dish.dish_id, text=embedding_text_)
         session.add(embedding)
 
     return updated
 
+# --- bulk mode ------------------------------------------------------------------------
+# Each chunk is COPYed into a temp staging table and merged with three set-based upserts
+# keyed on lower(name) (see migration 0002), then committed. Within a chunk the last row
+# for a name wins, as it would when upserting row by row.
+
+STAGE_COLUMNS = ("ord", "name", "cuisine", "style", "aliases") + NUMERIC_COLUMNS + ("source", "embed_text")
+
+CREATE_STAGE = """
+    CREATE TEMP TABLE IF NOT EXISTS stage_dishes (
+        ord bigint, name text, cuisine text, style text, aliases text[],
+        kcal float8, protein_g float8, carbs_g float8, fat_g float8,
+        fiber_g float8, sugar_g float8, sodium_mg float8,
+        source text, embed_text text
+    ) ON COMMIT DELETE ROWS
+"""
+
+CREATE_IDS = """
+    CREATE TEMP TABLE IF NOT EXISTS stage_ids (
+        key text PRIMARY KEY, dish_id uuid, inserted boolean
+    ) ON COMMIT DELETE ROWS
+"""
+
+MERGE_DISHES = """
+    WITH merged AS (
+        INSERT INTO dishes (name, cuisine, style, aliases)
+        SELECT DISTINCT ON (lower(name)) name, cuisine, style, aliases
+          FROM stage_dishes
+         ORDER BY lower(name), ord DESC
+        ON CONFLICT ((lower(name))) DO UPDATE
+           SET name = EXCLUDED.name, cuisine = EXCLUDED.cuisine, style = EXCLUDED.style,
+               aliases = EXCLUDED.aliases
+        RETURNING dish_id, name, (xmax = 0) AS inserted
+    )
+    INSERT INTO stage_ids (key, dish_id, inserted)
+    SELECT lower(name), dish_id, inserted FROM merged
+"""
+
+MERGE_NUTRIENTS = """
+    INSERT INTO nutrients (dish_id, kcal, protein_g, carbs_g, fat_g, fiber_g, sugar_g, sodium_mg, source)
+    SELECT DISTINCT ON (lower(s.name)) i.dish_id, s.kcal, s.protein_g, s.carbs_g, s.fat_g,
+           s.fiber_g, s.sugar_g, s.sodium_mg, s.source
+      FROM stage_dishes s
+      JOIN stage_ids i ON i.key = lower(s.name)
+     ORDER BY lower(s.name), s.ord DESC
+    ON CONFLICT (dish_id) DO UPDATE
+       SET kcal = EXCLUDED.kcal, protein_g = EXCLUDED.protein_g, carbs_g = EXCLUDED.carbs_g,
+           fat_g = EXCLUDED.fat_g, fiber_g = EXCLUDED.fiber_g, sugar_g = EXCLUDED.sugar_g,
+           sodium_mg = EXCLUDED.sodium_mg, source = EXCLUDED.source
+"""
+
+MERGE_EMBEDDINGS = """
+    INSERT INTO embeddings (dish_id, text)
+    SELECT DISTINCT ON (lower(s.name)) i.dish_id, s.embed_text
+      FROM stage_dishes s
+      JOIN stage_ids i ON i.key = lower(s.name)
+     ORDER BY lower(s.name), s.ord DESC
+    ON CONFLICT (dish_id) DO UPDATE
+       SET text = EXCLUDED.text,
+           vector = CASE WHEN embeddings.text IS DISTINCT FROM EXCLUDED.text
+                         THEN NULL ELSE embeddings.vector END
+"""
+
+def parse_chunk(header, rows, start):
+    """Turn raw CSV rows into staging tuples, converting each column once for the chunk."""
+    cols = {name: [r[i] if i < len(r) else "" for r in rows] for i, name in enumerate(header)}
+    n = len(rows)
+    names = cols["name"]
+    cuisines = cols.get("cuisine", [None] * n)
+    facets = [parse_facet(v) for v in cuisines]
+    styles = [parse_facet(v) for v in cols.get("style", [""] * n)]
+    aliases = [parse_aliases(v) for v in cols.get("aliases", [""] * n)]
+    numeric = [[parse_float(v) for v in cols.get(c, [""] * n)] for c in NUMERIC_COLUMNS]
+    sources = cols.get("source", [None] * n)
+    texts = [embedding_text(nm, cu, al) for nm, cu, al in zip(names, cuisines, aliases)]
+    out = []
+    for i in range(n):
+        if numeric[0][i] is None:
+            raise ValueError(f"row {start + i + 1}: kcal is required, got {cols.get('kcal', [''] * n)[i]!r}")
+        out.append((start + i, names[i], facets[i], styles[i], aliases[i])
+                   + tuple(col[i] for col in numeric) + (sources[i], texts[i]))
+    return out
+
+def checkpoint_path(csv_file):
+    return csv_file + ".ingest.ckpt"
+
+def read_checkpoint(csv_file):
+    try:
+        with open(checkpoint_path(csv_file)) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+def write_checkpoint(csv_file, done):
+    tmp = checkpoint_path(csv_file) + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(str(done))
+    os.replace(tmp, checkpoint_path(csv_file))
+
+def bulk_ingest(csv_file, chunk_size, resume):
+    import psycopg
+
+    url = make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+    skip = read_checkpoint(csv_file) if resume else 0
+    inserted, updated, done = 0, 0, skip
+    t0 = time.time()
+
+    with psycopg.connect(url) as conn, open(csv_file, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        if skip:
+            print(f"Resuming after {skip} rows.")
+            for _ in itertools.islice(reader, skip):
+                pass
+        with conn.cursor() as cur:
+            cur.execute(CREATE_STAGE)
+            cur.execute(CREATE_IDS)
+        conn.commit()
+
+        while True:
+            rows = list(itertools.islice(reader, chunk_size))
+            if not rows:
+                break
+            staged = parse_chunk(header, rows, done)
+            with conn.cursor() as cur:
+                with cur.copy(f"COPY stage_dishes ({', '.join(STAGE_COLUMNS)}) FROM STDIN") as copy:
+                    for rec in staged:
+                        copy.write_row(rec)
+                cur.execute(MERGE_DISHES)
+                cur.execute("SELECT count(*) FILTER (WHERE inserted) FROM stage_ids")
+                new = cur.fetchone()[0]
+                cur.execute(MERGE_NUTRIENTS)
+                cur.execute(MERGE_EMBEDDINGS)
+                cur.execute(BUMP_CATALOG_VERSION)
+            conn.commit()
+
+            done += len(rows)
+            inserted += new
+            updated += len(rows) - new
+            write_checkpoint(csv_file, done)
+            elapsed = time.time() - t0
+            rate = (done - skip) / max(elapsed, 1e-6)
+            print(f"{done} rows committed ({rate:.0f} rows/s). Inserted: {inserted}, Updated: {updated}")
+
+    if os.path.exists(checkpoint_path(csv_file)):
+        os.remove(checkpoint_path(csv_file))
+    return inserted, updated
+
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python -m scripts.ingest_seed <csv_file>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(usage="python -m scripts.ingest_seed <csv_file> [--bulk]")
+    parser.add_argument("csv_file")
+    parser.add_argument("--bulk", action="store_true", help="stream the CSV through COPY in chunks")
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--resume", action="store_true", help="continue a bulk run from its checkpoint")
+    args = parser.parse_args()
 
-    csv_file = sys.argv[1]
+    csv_file = args.csv_file
     inserted, updated = 0, 0
 
     with engine.begin() as conn:
         conn.execute(text("CREATE EXTENSION IF NOT EXISTS pgcrypto;"))
         conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector;"))
 
+    if args.bulk:
+        inserted, updated = bulk_ingest(csv_file, args.chunk_size, args.resume)
+        print(f"Inserted: {inserted}, Updated: {updated}")
+        return
+
     with SessionLocal() as session:
         with open(csv_file, newline="", encoding="utf-8") as f:
             reader = csv.DictReader(f)
             for row in reader:
-                row = {k: (float(v) if v.replace(".", "").isdigit() else v) for k, v in row.items()}
+                row = parse_row(row)
                 if upsert_dish(session, row):
                     updated += 1
                 else:
                     inserted += 1
+            session.execute(text(BUMP_CATALOG_VERSION))
             session.commit()
 
     print(f"Inserted: {inserted}, Updated: {updated}")
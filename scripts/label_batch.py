@@ -0,0 +1,344 @@
+# scripts/label_batch.py
+#
+# Label a whole menu file offline, without HTTP or response models. Input is CSV (with a
+# header) or JSONL with dish_name, calories and optionally top_k, use_mixture, cuisine and
+# prefer_restaurant_style. Rows are read in chunks and labeled by a pool of worker
+# processes with the same batched code path as POST /label/batch; results are written in
+# input order as they complete, so memory stays bounded by --chunk-size x --workers.
+#
+# With RETRIEVAL_BACKEND=numpy every worker maps the one snapshot under VECTOR_INDEX_PATH.
+# Workers share one encoder: EMBED_SERVER_SOCKET if set, otherwise this process loads the
+# model and serves it to them over a temporary socket.
+#
+#   python -m scripts.label_batch menus.csv labels.jsonl --workers 4
+#   python -m scripts.label_batch menus.csv labels.jsonl --workers 4 --resume
+#   python -m scripts.label_batch menus.jsonl labels.parquet   # needs pyarrow
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from app.core.settings import settings
+from app.db.models import NUTRIENT_FIELDS
+
+NUTRIENT_COLUMNS = ("calories",) + NUTRIENT_FIELDS[1:]
+OUTPUT_COLUMNS = ("row", "dish_name") + NUTRIENT_COLUMNS + ("confidence", "matched", "dish_id", "candidates", "error")
+
+
+class Row(NamedTuple):
+    """One input row; has the attributes label_service.label_entries reads."""
+    row: int
+    dish_name: str
+    calories: float
+    top_k: int
+    use_mixture: bool
+    cuisine: Optional[str] = None
+    prefer_restaurant_style: bool = False
+
+
+def _bool(v) -> bool:
+    if isinstance(v, bool):
+        return v
+    return str(v).strip().lower() in ("1", "true", "t", "yes", "y")
+
+
+def parse_row(n: int, rec: Dict) -> Tuple[Optional[Row], Optional[str]]:
+    """(Row, None), or (None, reason) for a row the API would reject."""
+    name = str(rec.get("dish_name") or "").strip()
+    if not name:
+        return None, "missing dish_name"
+    try:
+        calories = float(rec.get("calories", ""))
+    except (TypeError, ValueError):
+        return None, "calories is not a number"
+    if not calories > 0:
+        return None, "calories must be > 0"
+    try:
+        top_k = int(rec.get("top_k") or 5)
+    except (TypeError, ValueError):
+        return None, "top_k is not an integer"
+    use_mixture = rec.get("use_mixture")
+    return Row(
+        n, name, calories, max(1, top_k), True if use_mixture in (None, "") else _bool(use_mixture),
+        str(rec.get("cuisine") or "").strip() or None, _bool(rec.get("prefer_restaurant_style") or False),
+    ), None
+
+
+def read_rows(path: str, offset: int = 0) -> Iterator[Tuple[int, Dict]]:
+    """(row number, record) for each input row from ``offset`` on, streamed."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if _format(path) == "csv":
+            records: Iterable[Dict] = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        yield from itertools.islice(enumerate(records), offset, None)
+
+
+def _format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    return {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".json": "jsonl", ".parquet": "parquet"}.get(ext, "csv")
+
+
+# --- labeling (runs in the workers) ----------------------------------------------------
+
+def configure(backend: str, socket: str, audit: bool) -> None:
+    settings.RETRIEVAL_BACKEND = backend
+    settings.EMBED_SERVER_SOCKET = socket
+    settings.AUDIT_LOG_ENABLED = audit
+    # one consistent catalog for the whole job
+    settings.CATALOG_FEED = False
+
+
+def _init_worker(backend: str, socket: str, audit: bool) -> None:
+    configure(backend, socket, audit)
+    if settings.LEXICAL_INDEX:
+        from app.services.lexical_index import load_lexical_index
+
+        load_lexical_index()
+    if audit:
+        from multiprocessing.util import Finalize
+
+        from app.services.audit_log import close_audit_logger
+
+        # pool workers skip atexit; this flushes the worker's audit queue when it exits
+        Finalize(None, close_audit_logger, exitpriority=10)
+
+
+def label_chunk(chunk: List[Tuple[int, Dict]]) -> List[Dict]:
+    """Output records for a chunk of input rows, in order."""
+    from app.services.label_service import FALLBACK_PER_KCAL, label_entries
+    from app.services.scaling_service import scale_nutrient_matrix
+
+    parsed = [parse_row(n, rec) for n, rec in chunk]
+    rows = [r for r, _ in parsed if r is not None]
+    entries: list = label_entries(rows) if rows else []
+    calories = np.array([r.calories for r in rows], dtype=np.float64)
+    matched = np.array([e is not None and e.profile is not None for e in entries], dtype=bool)
+    values = FALLBACK_PER_KCAL[None, :] * calories[:, None]
+    if matched.any():
+        profiles = np.stack([e.profile for e, m in zip(entries, matched) if m])
+        values[matched] = scale_nutrient_matrix(profiles, calories[matched])
+
+    out, it = [], iter(zip(rows, entries, values.tolist(), matched.tolist()))
+    for (n, rec), (row, error) in zip(chunk, parsed):
+        if row is None:
+            out.append({"row": n, "dish_name": rec.get("dish_name"), "error": error})
+            continue
+        _, entry, vals, ok = next(it)
+        rec_out = {"row": n, "dish_name": row.dish_name}
+        rec_out.update((c, None if v != v else v) for c, v in zip(NUTRIENT_COLUMNS, vals))
+        cands = [list(c) for c in entry.candidates] if ok else []
+        rec_out.update(confidence=entry.confidence if ok else 0.5, matched=ok,
+                       dish_id=cands[0][0] if cands else None, candidates=cands, error=None)
+        out.append(rec_out)
+    if settings.AUDIT_LOG_ENABLED and rows:
+        audit_rows(rows, entries)
+    return out
+
+
+def audit_rows(rows: List[Row], entries) -> None:
+    """Record the labels of a chunk in audit_logs, as POST /label/batch would serve them."""
+    from app.services.audit_log import get_audit_logger
+    from app.schemas.label import LabelRequest
+    from app.services.label_service import _render
+
+    audit = get_audit_logger()
+    if audit is None:
+        return
+    reqs = [LabelRequest(dish_name=r.dish_name, calories=r.calories) for r in rows]
+    for row, resp in zip(rows, _render(reqs, entries)):
+        audit.submit(row.dish_name, row.calories, resp)
+
+
+# --- output ----------------------------------------------------------------------------
+
+class CsvSink:
+    def __init__(self, path: str, append: bool):
+        self.f = open(path, "a" if append else "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.f, OUTPUT_COLUMNS, extrasaction="ignore")
+        if not append:
+            self.writer.writeheader()
+
+    def write(self, records: List[Dict]) -> None:
+        for r in records:
+            if r.get("candidates") is not None:
+                r = dict(r, candidates=json.dumps(r["candidates"]))
+            self.writer.writerow(r)
+        self.f.flush()
+
+    def close(self) -> None:
+        self.f.close()
+
+
+class JsonlSink:
+    def __init__(self, path: str, append: bool):
+        self.f = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, records: List[Dict]) -> None:
+        self.f.write("".join(json.dumps(r) + "\n" for r in records))
+        self.f.flush()
+
+    def close(self) -> None:
+        self.f.close()
+
+
+class ParquetSink:
+    """One row group per chunk; Parquet files cannot be appended to, so no --resume."""
+
+    def __init__(self, path: str, append: bool):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("writing Parquet needs pyarrow (pip install pyarrow); use .csv or .jsonl")
+        if append:
+            raise SystemExit("Parquet output cannot be resumed in place; pass --offset and a new output file")
+        self.pa = pa
+        self.schema = pa.schema(
+            [("row", pa.int64()), ("dish_name", pa.string())]
+            + [(c, pa.float64()) for c in NUTRIENT_COLUMNS]
+            + [("confidence", pa.float64()), ("matched", pa.bool_()), ("dish_id", pa.string()),
+               ("candidates", pa.string()), ("error", pa.string())]
+        )
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, records: List[Dict]) -> None:
+        rows = [dict(r, candidates=json.dumps(r["candidates"]) if r.get("candidates") is not None else None)
+                for r in records]
+        self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+SINKS: Dict[str, Callable[[str, bool], Union[CsvSink, JsonlSink, ParquetSink]]] = {
+    "csv": CsvSink, "jsonl": JsonlSink, "parquet": ParquetSink,
+}
+
+
+def rows_written(path: str) -> int:
+    """Complete rows already in a CSV/JSONL output; a torn last line is cut off."""
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+    text = data[:end].decode("utf-8")
+    if _format(path) == "csv":
+        return max(0, sum(1 for _ in csv.reader(text.splitlines(keepends=True))) - 1)
+    return sum(1 for line in text.splitlines() if line.strip())
+
+
+# --- driver ----------------------------------------------------------------------------
+
+def _chunks(rows: Iterator, size: int) -> Iterator[List]:
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _ordered(pool: ProcessPoolExecutor, chunks: Iterator[List], depth: int) -> Iterator[List[Dict]]:
+    """pool.map that reads ahead at most ``depth`` chunks instead of the whole input."""
+    pending: deque = deque()
+    for chunk in chunks:
+        pending.append(pool.submit(label_chunk, chunk))
+        if len(pending) >= depth:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def run(args) -> Dict:
+    offset, append = args.offset, False
+    if args.resume and os.path.exists(args.output) and _format(args.output) != "parquet":
+        offset, append = args.offset + rows_written(args.output), True
+    sink = SINKS[_format(args.output)](args.output, append)
+    chunks = _chunks(read_rows(args.input, offset), args.chunk_size)
+
+    configure(args.backend, settings.EMBED_SERVER_SOCKET, args.audit)
+    done = errors = fallbacks = 0
+    t0 = last = time.perf_counter()
+    server = tmp = pool = None
+    try:
+        if args.workers <= 1:
+            _init_worker(args.backend, settings.EMBED_SERVER_SOCKET, args.audit)
+            results: Iterator[List[Dict]] = map(label_chunk, chunks)
+        else:
+            socket = settings.EMBED_SERVER_SOCKET
+            if not socket:
+                from app.utils import embeddings
+                from app.utils.embedding_server import EmbeddingServer, serve_in_thread
+
+                tmp = tempfile.TemporaryDirectory()
+                socket = os.path.join(tmp.name, "embed.sock")
+                embeddings._model = embeddings.load_model()
+                server = EmbeddingServer(socket, embeddings._encode_batch)
+                serve_in_thread(server)
+            if args.backend == "numpy":
+                from app.services.vector_index import load_index
+
+                load_index()  # build the snapshot once, before the workers map it
+            pool = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_worker, initargs=(args.backend, socket, args.audit))
+            results = _ordered(pool, chunks, 2 * args.workers)
+        for records in results:
+            sink.write(records)
+            done += len(records)
+            errors += sum(1 for r in records if r.get("error"))
+            fallbacks += sum(1 for r in records if r.get("matched") is False)
+            now = time.perf_counter()
+            if args.report_s > 0 and now - last >= args.report_s:
+                last = now
+                print(f"{offset + done} rows ({done / (now - t0):.0f} rows/s)", file=sys.stderr, flush=True)
+    finally:
+        sink.close()
+        if args.audit:
+            from app.services.audit_log import close_audit_logger
+
+            close_audit_logger()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        if tmp is not None:
+            tmp.cleanup()
+    elapsed = time.perf_counter() - t0
+    return {"offset": offset, "rows": done, "errors": errors, "fallbacks": fallbacks,
+            "elapsed_s": elapsed, "rows_per_s": done / elapsed if elapsed > 0 else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Label a CSV/JSONL file of dishes offline.")
+    parser.add_argument(
+        "input", help="CSV with a header, or JSONL: dish_name, calories[, top_k, use_mixture, cuisine, prefer_restaurant_style]"
+    )
+    parser.add_argument("output", help=".csv, .jsonl or .parquet")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    parser.add_argument("--offset", type=int, default=0, help="skip this many input rows")
+    parser.add_argument("--resume", action="store_true", help="append after the rows already in the output (counted from --offset)")
+    parser.add_argument("--backend", default=settings.RETRIEVAL_BACKEND, choices=("numpy", "pgvector"))
+    parser.add_argument("--audit", action="store_true", help="record labels in audit_logs like the API")
+    parser.add_argument("--report-s", type=float, default=10.0, help="progress interval on stderr (0 = off)")
+    args = parser.parse_args()
+
+    stats = run(args)
+    print(f"Labeled {stats['rows']} rows from row {stats['offset']} in {stats['elapsed_s']:.1f}s "
+          f"({stats['rows_per_s']:.0f} rows/s); {stats['errors']} rejected, {stats['fallbacks']} unmatched.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# scripts/load_test.py
+# Closed-loop HTTP load test: N clients each send their next request as soon as the last
+# one returns, for a fixed duration per concurrency level. Run it once against the sync
+# build and once against the async build, then compare the saved results:
+#
+#   python -m scripts.load_test --url http://localhost:8000 --label async --out async.json
+#   python -m scripts.load_test --compare sync.json async.json
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+DISHES = ["pad thai", "chicken tikka masala", "ramen", "pho", "falafel wrap", "beef burrito",
+          "margherita pizza", "caesar salad", "bibimbap", "shakshuka", "green curry", "lasagna"]
+
+
+def _label_request(rng: random.Random):
+    return "POST", "/label", {"json": {"dish_name": rng.choice(DISHES), "calories": rng.randint(200, 900)}}
+
+
+def _search_request(rng: random.Random):
+    return "GET", "/dishes/search", {"params": {"q": rng.choice(DISHES), "k": 10}}
+
+
+ENDPOINTS = {"label": _label_request, "search": _search_request}
+
+
+async def run_level(url: str, endpoint: str, concurrency: int, duration: float) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker(seed: int):
+            nonlocal errors
+            rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                method, path, kwargs = ENDPOINTS[endpoint](rng)
+                t0 = time.perf_counter()
+                try:
+                    r = await client.request(method, path, **kwargs)
+                    ok = r.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - t0)
+                else:
+                    errors += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+    ms = 1000 * np.array(latencies) if latencies else np.zeros(1)
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def print_table(label: str, results: List[Dict]) -> None:
+    print(f"== {label}")
+    print(f"{'endpoint':>8} {'clients':>7} {'rps':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for r in results:
+        print(f"{r['endpoint']:>8} {r['concurrency']:>7} {r['rps']:>9.1f} {r['p50_ms']:>9.1f} "
+              f"{r['p99_ms']:>9.1f} {r['errors']:>7}")
+
+
+def compare(paths: List[str]) -> None:
+    runs = []
+    for p in paths:
+        with open(p) as f:
+            runs.append(json.load(f))
+    base = {(r["endpoint"], r["concurrency"]): r for r in runs[0]["results"]}
+    for run in runs:
+        print_table(run["label"], run["results"])
+    for run in runs[1:]:
+        print(f"== {run['label']} vs {runs[0]['label']}")
+        for r in run["results"]:
+            b = base.get((r["endpoint"], r["concurrency"]))
+            if b and b["rps"] and b["p99_ms"]:
+                print(f"{r['endpoint']:>8} {r['concurrency']:>7}  rps x{r['rps'] / b['rps']:.2f}"
+                      f"  p99 x{r['p99_ms'] / b['p99_ms']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /label and /dishes/search.")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--label", default="run", help="name of this run in the saved results")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per concurrency level")
+    parser.add_argument("--out", help="write results as JSON for --compare")
+    parser.add_argument("--compare", nargs="+", metavar="RESULTS", help="compare saved runs, first is the baseline")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare)
+        return
+
+    results = []
+    for endpoint in args.endpoints:
+        for c in args.concurrency:
+            results.append(asyncio.run(run_level(args.url, endpoint, c, args.duration)))
+            print_table(args.label, results[-1:])
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"label": args.label, "url": args.url, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()